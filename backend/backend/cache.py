@@ -0,0 +1,229 @@
+"""
+Versioned caching helpers.
+
+Every cached response is keyed on the versions (generation counters) of
+the namespaces it depends on, e.g. `recipes` or `tags`. Writes bump the
+versions instead of deleting cache entries, so stale entries are never
+read again and are simply evicted by the cache backend. The time of the
+last bump of each namespace is kept as well and serves as its
+`Last-Modified` stamp.
+
+The versions and the times are kept in the `versions` cache, which must
+be shared by every process (a database table by default): the
+per-process snapshots and indexes are rebuilt when a version changes,
+so a bump made by a management command, a background task or another
+worker has to reach all of them.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.checks import Error, Tags, register
+from django.db import transaction
+from django.utils.connection import ConnectionProxy
+from django.utils.http import urlencode
+
+VERSIONS_CACHE_ALIAS = 'versions'
+PROCESS_LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.dummy.DummyCache',
+    'django.core.cache.backends.locmem.LocMemCache',
+)
+VERSION_KEY_PREFIX = 'version'
+MODIFIED_KEY_PREFIX = 'modified'
+RESPONSE_KEY_PREFIX = 'response'
+
+versions_cache = ConnectionProxy(caches, VERSIONS_CACHE_ALIAS)
+
+
+@register(Tags.caches)
+def check_versions_cache(app_configs, **kwargs):
+    """
+    Check that the versions cache is configured and shared by the
+    processes.
+
+    Args:
+        app_configs (list): The checked apps (unused).
+        **kwargs: Other keyword arguments of the checks.
+
+    Returns:
+        list: The errors found.
+    """
+    config = settings.CACHES.get(VERSIONS_CACHE_ALIAS)
+    if config is None:
+        return [
+            Error(
+                f'The {VERSIONS_CACHE_ALIAS!r} cache is not configured.',
+                id='backend.E001',
+            )
+        ]
+    if config['BACKEND'] in PROCESS_LOCAL_CACHE_BACKENDS:
+        return [
+            Error(
+                f'The {VERSIONS_CACHE_ALIAS!r} cache is not shared by the '
+                f'processes, so cache versions bumped in one process are '
+                f'never seen by the others.',
+                hint='Use the database, Redis or Memcached cache backend.',
+                id='backend.E002',
+            )
+        ]
+    return []
+
+
+def get_version_key(namespace):
+    """
+    Get the cache key that stores the version of a namespace.
+
+    Args:
+        namespace (str): The namespace name.
+
+    Returns:
+        str: The cache key.
+    """
+    return f'{VERSION_KEY_PREFIX}:{namespace}'
+
+
+def get_modified_key(namespace):
+    """
+    Get the cache key that stores the last modification time of a
+    namespace.
+
+    Args:
+        namespace (str): The namespace name.
+
+    Returns:
+        str: The cache key.
+    """
+    return f'{MODIFIED_KEY_PREFIX}:{namespace}'
+
+
+def get_user_namespace(user):
+    """
+    Get the namespace of the per-user state (favorites, shopping cart,
+    subscriptions and profile) of a user.
+
+    Args:
+        user (User): The user.
+
+    Returns:
+        str: The namespace name.
+    """
+    return f'user:{user.pk}'
+
+
+def _get_or_seed(values, keys, seed):
+    """
+    Get the values of cache keys read from the versions cache, seeding
+    the missing ones.
+
+    Args:
+        values (dict): The values read, by key.
+        keys (list): The keys.
+        seed (callable): The function returning the value of a missing
+        key.
+
+    Returns:
+        list: The values, in the order of the keys.
+    """
+    for key in keys:
+        if key not in values:
+            value = seed()
+            versions_cache.add(key, value, timeout=None)
+            values[key] = versions_cache.get(key, value)
+    return [values[key] for key in keys]
+
+
+def get_versions(*namespaces):
+    """
+    Get the current versions of the given namespaces.
+
+    Missing versions (never set or evicted) are seeded with the current
+    time in nanoseconds, so a reset counter never matches entries that
+    were cached under an earlier value.
+
+    Args:
+        *namespaces (str): The namespace names.
+
+    Returns:
+        list: The versions, in the order of the namespaces.
+    """
+    keys = [get_version_key(namespace) for namespace in namespaces]
+    return _get_or_seed(versions_cache.get_many(keys), keys, time.time_ns)
+
+
+def get_versions_and_last_modified(*namespaces):
+    """
+    Get the current versions and the last modification time of the given
+    namespaces with a single read of the versions cache.
+
+    Missing versions are seeded as in `get_versions`; namespaces without
+    a stored time (never bumped or evicted) are considered modified now.
+
+    Args:
+        *namespaces (str): The namespace names.
+
+    Returns:
+        tuple: The list of versions, in the order of the namespaces, and
+        the latest modification time as a UNIX timestamp.
+    """
+    version_keys = [get_version_key(namespace) for namespace in namespaces]
+    modified_keys = [get_modified_key(namespace) for namespace in namespaces]
+    values = versions_cache.get_many(version_keys + modified_keys)
+    return (
+        _get_or_seed(values, version_keys, time.time_ns),
+        max(_get_or_seed(values, modified_keys, time.time), default=0),
+    )
+
+
+def bump_version(namespace):
+    """
+    Bump the version of a namespace once the current transaction commits.
+
+    Bumping after the commit guarantees that a response rendered from the
+    old data can't be cached under the new version.
+
+    Args:
+        namespace (str): The namespace name.
+    """
+    transaction.on_commit(lambda: _bump_version(namespace))
+
+
+def _bump_version(namespace):
+    key = get_version_key(namespace)
+    try:
+        versions_cache.incr(key)
+    except ValueError:
+        versions_cache.add(key, time.time_ns(), timeout=None)
+    versions_cache.set(get_modified_key(namespace), time.time(), timeout=None)
+
+
+def get_response_cache_key(request, namespaces):
+    """
+    Build the cache key of a response.
+
+    The key includes the versions of the namespaces, the host, the path
+    and the query string with its parameters sorted.
+
+    Args:
+        request (Request): The request.
+        namespaces (tuple): The namespaces the response depends on.
+
+    Returns:
+        str: The cache key.
+    """
+    versions = get_versions(*namespaces)
+    query_string = urlencode(
+        sorted(
+            (key, sorted(values))
+            for key, values in request.query_params.lists()
+        ),
+        doseq=True,
+    )
+    digest = hashlib.md5(
+        f'{request.get_host()}{request.path}?{query_string}'.encode()
+    ).hexdigest()
+    return '{}:{}:{}'.format(
+        RESPONSE_KEY_PREFIX,
+        '.'.join(str(version) for version in versions),
+        digest,
+    )
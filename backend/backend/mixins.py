@@ -1,44 +1,423 @@
-from django.shortcuts import get_object_or_404
+import hashlib
+
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.http import Http404
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
 from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+from backend.cache import (bump_version, get_response_cache_key,
+                           get_user_namespace, get_versions_and_last_modified)
+from backend.pagination import CustomCursorPagination
+from backend.snapshots import get_snapshot, snapshot_response
+
+UNIQUE_VIOLATION = '23505'
+FOREIGN_KEY_VIOLATION = '23503'
+
+
+def get_integrity_error_code(error):
+    """
+    Get the SQLSTATE code of an integrity error.
+
+    PostgreSQL drivers report the code itself; for SQLite, which only
+    reports a message, the code is derived from the message.
+
+    Args:
+        error (IntegrityError): The error raised by the database.
+
+    Returns:
+        str or None: The SQLSTATE code, or None if it's unknown.
+    """
+    cause = error.__cause__
+    code = getattr(cause, 'pgcode', None) or getattr(cause, 'sqlstate', None)
+    if code is not None:
+        return code
+    message = str(error)
+    if message.startswith('UNIQUE constraint failed'):
+        return UNIQUE_VIOLATION
+    if message.startswith('FOREIGN KEY constraint failed'):
+        return FOREIGN_KEY_VIOLATION
+    return None
 
 
 class CreateDeleteMixin:
     """
     A mixin class that provides `create_item` and `delete_item` methods.
     These methods are used to create and delete instances of specified models.
+
+    Both run a single write statement and rely on the unique constraints
+    of the models instead of checking for existing instances first, so
+    concurrent duplicate requests get the same answers as sequential ones.
+
+    Models with `counter_target` and `counter_field` attributes have the
+    counter of the object they point to (e.g. `Recipe.favorites_count`
+    for Favorite) updated in the same transaction as the write.
     """
 
+    @staticmethod
+    def update_counter(model, target_id, delta):
+        """
+        Add a delta to the counter a model keeps on the object its
+        `counter_target` foreign key points to. A counter that has
+        drifted below the delta is not decremented.
+
+        Args:
+            model (Model): The Django model class.
+            target_id (int): The primary key of the counted object.
+            delta (int): The change of the counter.
+        """
+        related_model = model._meta.get_field(
+            model.counter_target
+        ).related_model
+        related_model.objects.filter(
+            pk=target_id, **{f'{model.counter_field}__gte': -delta}
+        ).update(**{model.counter_field: F(model.counter_field) + delta})
+
     def create_item(self, serializer_class, data, request):
         """
         Creates an instance of a specified model using the given serializer
         class and data.
 
+        The instance is saved in a savepoint together with the update of
+        the counter; a violation of the unique constraint is reported with
+        the serializer's `unique_error_message`, and a violation of a
+        foreign key, i.e. the related object has been deleted after the
+        validation, as not found.
+
         Args:
             serializer_class (Serializer): The serializer class to be used.
             data (dict): The data to be passed to the serializer.
             request (Request): The HTTP request object.
 
+        Raises:
+            ValidationError: If the instance already exists.
+            Http404: If a related object doesn't exist anymore.
+
         Returns:
             Response: Response with a status of 201 (created).
         """
         serializer = serializer_class(data=data, context={'request': request})
         serializer.is_valid(raise_exception=True)
-        serializer.save()
+        try:
+            with transaction.atomic():
+                instance = serializer.save()
+                if hasattr(instance, 'counter_target'):
+                    self.update_counter(
+                        type(instance),
+                        getattr(instance, f'{instance.counter_target}_id'),
+                        1,
+                    )
+        except IntegrityError as error:
+            code = get_integrity_error_code(error)
+            if code == FOREIGN_KEY_VIOLATION:
+                raise Http404
+            if code != UNIQUE_VIOLATION:
+                raise
+            raise ValidationError(
+                {
+                    api_settings.NON_FIELD_ERRORS_KEY: [
+                        serializer.unique_error_message
+                    ]
+                },
+                code='unique',
+            )
+        bump_version(get_user_namespace(self.request.user))
         return Response(status=status.HTTP_201_CREATED)
 
     def delete_item(self, model, **kwargs):
         """
         Deletes an instance of a specified model given its
-        identifying attributes.
+        identifying attributes, with a single DELETE statement, and
+        decrements the counter in the same transaction.
 
         Args:
             model (Model): The Django model class.
             **kwargs: The attributes identifying the model
-            instance to be deleted.
+            instance to be deleted, including its `counter_target`
+            if the model keeps a counter.
+
+        Raises:
+            Http404: If no instance has been deleted.
 
         Returns:
             Response: Response with a status of 204 (no content).
         """
-        get_object_or_404(model, **kwargs).delete()
+        with transaction.atomic():
+            deleted, _ = model.objects.filter(**kwargs).delete()
+            if not deleted:
+                raise Http404
+            if hasattr(model, 'counter_target'):
+                self.update_counter(model, kwargs[model.counter_target], -1)
+        bump_version(get_user_namespace(self.request.user))
         return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class CounterAdminMixin:
+    """
+    A mixin class for the admin models of the models keeping a counter
+    (see `CreateDeleteMixin`), which updates the counters with the
+    instances added, changed and deleted in the admin interface.
+    """
+
+    def save_model(self, request, obj, form, change):
+        model = type(obj)
+        field = f'{model.counter_target}_id'
+        with transaction.atomic():
+            if change:
+                CreateDeleteMixin.update_counter(
+                    model,
+                    model.objects.values_list(field, flat=True).get(
+                        pk=obj.pk
+                    ),
+                    -1,
+                )
+            super().save_model(request, obj, form, change)
+            CreateDeleteMixin.update_counter(model, getattr(obj, field), 1)
+
+    def delete_model(self, request, obj):
+        model = type(obj)
+        with transaction.atomic():
+            super().delete_model(request, obj)
+            CreateDeleteMixin.update_counter(
+                model, getattr(obj, f'{model.counter_target}_id'), -1
+            )
+
+    def delete_queryset(self, request, queryset):
+        model = queryset.model
+        with transaction.atomic():
+            target_ids = list(
+                queryset.values_list(f'{model.counter_target}_id', flat=True)
+            )
+            super().delete_queryset(request, queryset)
+            for target_id in target_ids:
+                CreateDeleteMixin.update_counter(model, target_id, -1)
+
+
+class CursorPaginationMixin:
+    """
+    A mixin class that lets clients opt in to cursor pagination.
+
+    The view keeps its regular `pagination_class`; requests with
+    `?pagination=cursor` (or an existing `cursor` parameter, as in the
+    `next`/`previous` links) are paginated with `cursor_pagination_class`
+    instead.
+    """
+
+    cursor_pagination_class = CustomCursorPagination
+    cursor_query_value = 'cursor'
+
+    def get_pagination_class(self):
+        """
+        Get the pagination class requested by the client.
+
+        Returns:
+            type: The pagination class, or None if pagination is disabled.
+        """
+        if self.pagination_class is None:
+            return None
+        query_params = self.request.query_params
+        if (
+            query_params.get('pagination') == self.cursor_query_value
+            or self.cursor_pagination_class.cursor_query_param in query_params
+        ):
+            return self.cursor_pagination_class
+        return self.pagination_class
+
+    @property
+    def paginator(self):
+        """
+        The paginator instance associated with the view, or `None`.
+        """
+        if not hasattr(self, '_paginator'):
+            pagination_class = self.get_pagination_class()
+            self._paginator = pagination_class() if pagination_class else None
+        return self._paginator
+
+
+class AnonymousCacheMixin:
+    """
+    A mixin class that caches the `list` and `retrieve` responses served
+    to anonymous users.
+
+    Responses are keyed on the full query string and on the versions of
+    `cache_namespaces`, which are bumped by the model signals, so a write
+    makes every dependent entry unreachable. Eviction (LRU/TTL) is left to
+    the configured cache backend.
+
+    Attributes:
+        cache_namespaces (tuple): The namespaces the responses depend on.
+    """
+
+    cache_namespaces = ()
+
+    def get_cached_response(self, handler, request, *args, **kwargs):
+        """
+        Serve the response from the cache, or render and cache it.
+
+        Args:
+            handler (callable): The view method rendering the response.
+            request (Request): The HTTP request object.
+
+        Returns:
+            Response: The cached or the freshly rendered response.
+        """
+        if not request.user.is_anonymous:
+            return handler(request, *args, **kwargs)
+        key = get_response_cache_key(request, self.cache_namespaces)
+        data = cache.get(key)
+        if data is not None:
+            return Response(data)
+        response = handler(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            cache.set(key, response.data)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.get_cached_response(
+            super().list, request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_cached_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+
+class ConditionalGetMixin:
+    """
+    A mixin class that adds weak `ETag` and `Last-Modified` validators to
+    the `list` and `retrieve` responses and answers `If-None-Match` /
+    `If-Modified-Since` requests with 304 before any serialization.
+
+    The validators are derived from the versions of `cache_namespaces`
+    and, for authenticated users, of their own state (favorites, shopping
+    cart, subscriptions), so per-user fields like `is_favorited` are
+    covered as well.
+
+    The `ETag` is weak, since the identity, gzip and brotli bodies of a
+    snapshot (see `SnapshotListMixin`) share it while a strong validator
+    must differ for every byte representation.
+
+    Attributes:
+        cache_namespaces (tuple): The namespaces the responses depend on.
+    """
+
+    cache_namespaces = ()
+
+    def get_validator_namespaces(self, request):
+        """
+        Get the namespaces the validators of the response depend on.
+
+        Args:
+            request (Request): The HTTP request object.
+
+        Returns:
+            list: The namespace names.
+        """
+        namespaces = list(self.cache_namespaces)
+        if request.user.is_authenticated:
+            namespaces.append(get_user_namespace(request.user))
+        return namespaces
+
+    def get_validator_state(self, request, *args, **kwargs):
+        """
+        Get the state the validators are computed from.
+
+        Args:
+            request (Request): The HTTP request object.
+
+        Returns:
+            tuple: The list of versions and the last modification time
+            as a UNIX timestamp, or None to skip conditional handling.
+        """
+        namespaces = self.get_validator_namespaces(request)
+        return get_versions_and_last_modified(*namespaces)
+
+    def get_conditional_response(self, handler, request, *args, **kwargs):
+        """
+        Answer a conditional request with 304 or render the response with
+        the validators attached.
+
+        Args:
+            handler (callable): The view method rendering the response.
+            request (Request): The HTTP request object.
+
+        Returns:
+            HttpResponse: The 304 response or the rendered response.
+        """
+        state = self.get_validator_state(request, *args, **kwargs)
+        if state is None:
+            return handler(request, *args, **kwargs)
+        versions, last_modified = state
+        etag = 'W/"{}"'.format(
+            hashlib.sha1(
+                '|'.join(
+                    [
+                        str(request.user.pk),
+                        request.get_full_path(),
+                        *(str(version) for version in versions),
+                    ]
+                ).encode()
+            ).hexdigest()
+        )
+        response = get_conditional_response(
+            request, etag=etag, last_modified=int(last_modified)
+        )
+        if response is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        patch_vary_headers(response, ('Authorization',))
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.get_conditional_response(
+            super().list, request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_conditional_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+
+class SnapshotListMixin:
+    """
+    A mixin class that serves the unfiltered `list` response from a
+    pre-rendered, pre-compressed snapshot.
+
+    The snapshot is rendered once per version of `snapshot_namespace` and
+    negotiated on `Accept-Encoding`. Requests with query parameters are
+    rendered as usual.
+
+    Attributes:
+        snapshot_namespace (str): The cache namespace the list depends on.
+    """
+
+    snapshot_namespace = None
+
+    def render_snapshot(self):
+        """
+        Render the unfiltered list to JSON.
+
+        Returns:
+            bytes: The JSON body.
+        """
+        serializer = self.get_serializer(self.get_queryset(), many=True)
+        return JSONRenderer().render(serializer.data)
+
+    def list(self, request, *args, **kwargs):
+        if request.query_params:
+            return super().list(request, *args, **kwargs)
+        return snapshot_response(
+            request,
+            get_snapshot(self.snapshot_namespace, self.render_snapshot),
+        )
@@ -1,4 +1,156 @@
-from rest_framework.pagination import PageNumberPagination
+import datetime
+import json
+
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.paginator import EmptyPage, Page, PageNotAnInteger, Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (Cursor, CursorPagination,
+                                       PageNumberPagination)
+from rest_framework.response import Response
+
+
+class ApproximatePage(Page):
+    """
+    Page of a paginator whose count is an estimate, which knows whether
+    a next page exists from the rows fetched.
+
+    Attributes:
+        next_page_exists (bool): Whether a row follows the page.
+    """
+
+    def __init__(self, object_list, number, paginator, next_page_exists):
+        super().__init__(object_list, number, paginator)
+        self.next_page_exists = next_page_exists
+
+    def has_next(self):
+        return self.next_page_exists
+
+    def end_index(self):
+        return self.start_index() + len(self) - 1
+
+
+class ApproximateCountPaginator(Paginator):
+    """
+    Paginator that takes the row count of large unfiltered querysets from
+    the PostgreSQL planner statistics instead of running `COUNT(*)`.
+
+    The estimate is only reported as `count`: when it is used, the page
+    numbers aren't checked against the estimated number of pages, and
+    every page fetches one row more than it holds to tell whether a next
+    page exists.
+
+    Attributes:
+        count_is_approximate (bool): Whether `count` is an estimate.
+    """
+
+    def get_estimated_count(self):
+        """
+        Get the planner's row estimate for the queryset's table.
+
+        The estimate is only used for PostgreSQL querysets without
+        filters, distinct or slicing, and only when it is at least
+        `settings.APPROXIMATE_COUNT_THRESHOLD`.
+
+        Returns:
+            int or None: The estimated count, or None if an exact count
+            is required.
+        """
+        queryset = self.object_list
+        query = getattr(queryset, 'query', None)
+        if (
+            query is None
+            or query.where
+            or query.distinct
+            or query.is_sliced
+            or connections[queryset.db].vendor != 'postgresql'
+        ):
+            return None
+        with connections[queryset.db].cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class '
+                'WHERE oid = %s::regclass',
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+        if row is None or row[0] < settings.APPROXIMATE_COUNT_THRESHOLD:
+            return None
+        return row[0]
+
+    @cached_property
+    def estimated_count(self):
+        """The estimated number of objects, or None to count them."""
+        return self.get_estimated_count()
+
+    @property
+    def count_is_approximate(self):
+        return self.estimated_count is not None
+
+    @cached_property
+    def count(self):
+        """
+        The total number of objects, estimated for large unfiltered
+        querysets.
+        """
+        if self.estimated_count is None:
+            return super().count
+        return self.estimated_count
+
+    def validate_number(self, number):
+        """
+        Validate the page number, without an upper bound when the count
+        is an estimate.
+
+        Args:
+            number (int or str): The 1-based page number.
+
+        Raises:
+            PageNotAnInteger: If the number isn't an integer.
+            EmptyPage: If the number is out of range.
+
+        Returns:
+            int: The page number.
+        """
+        if not self.count_is_approximate:
+            return super().validate_number(number)
+        try:
+            if isinstance(number, float) and not number.is_integer():
+                raise ValueError
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger(_('That page number is not an integer'))
+        if number < 1:
+            raise EmptyPage(_('That page number is less than 1'))
+        return number
+
+    def page(self, number):
+        """
+        Get a page, fetching one extra row to find out whether the next
+        page exists when the count is an estimate.
+
+        Args:
+            number (int or str): The 1-based page number.
+
+        Raises:
+            InvalidPage: If the number is invalid or past the last row.
+
+        Returns:
+            Page: The page.
+        """
+        number = self.validate_number(number)
+        if not self.count_is_approximate:
+            return super().page(number)
+        bottom = (number - 1) * self.per_page
+        rows = list(self.object_list[bottom: bottom + self.per_page + 1])
+        if not rows and number > 1:
+            raise EmptyPage(_('That page contains no results'))
+        return ApproximatePage(
+            rows[:self.per_page], number, self, len(rows) > self.per_page
+        )
 
 
 class CustomPageNumberPagination(PageNumberPagination):
@@ -8,3 +160,208 @@ class CustomPageNumberPagination(PageNumberPagination):
     """
 
     page_size_query_param = 'limit'
+
+
+class ApproximateCountPagination(CustomPageNumberPagination):
+    """
+    Page number pagination that reports an estimated `count` for large
+    unfiltered listings.
+
+    Small or filtered querysets are still counted exactly. The response
+    has a `count_is_approximate` flag so that clients can present the
+    number accordingly (e.g. "~12,000 recipes").
+    """
+
+    django_paginator_class = ApproximateCountPaginator
+
+    def get_paginated_response(self, data):
+        return Response(
+            {
+                'count': self.page.paginator.count,
+                'count_is_approximate': (
+                    self.page.paginator.count_is_approximate
+                ),
+                'next': self.get_next_link(),
+                'previous': self.get_previous_link(),
+                'results': data,
+            }
+        )
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema['properties']['count_is_approximate'] = {
+            'type': 'boolean',
+            'example': False,
+        }
+        return response_schema
+
+
+class CustomCursorPagination(CursorPagination):
+    """
+    Cursor (keyset) pagination class that uses the `limit` query parameter
+    to specify the page size.
+
+    Pages are fetched with an indexed range condition on the ordering
+    fields instead of `OFFSET`, and no `COUNT(*)` is run, so every page
+    costs the same as the first one. The last field of `ordering` is a
+    unique tiebreaker that keeps the cursors stable.
+
+    Unlike the base class, which keys the cursors on the first ordering
+    field alone and skips its ties with an offset capped at
+    `offset_cutoff`, the cursors hold the values of all the ordering
+    fields of the last row, so pages through any number of ties cost
+    the same.
+    """
+
+    page_size_query_param = 'limit'
+    ordering = ('id',)
+
+    def get_position_filter(self, position, reverse):
+        """
+        Build the condition selecting the rows that follow a position.
+
+        For the ordering `(a, -b, c)` and the position `(x, y, z)` it is
+        `a > x OR (a = x AND b < y) OR (a = x AND b = y AND c > z)`,
+        with the comparisons flipped when paging backwards.
+
+        Args:
+            position (list): The values of the ordering fields.
+            reverse (bool): Whether the rows are read backwards.
+
+        Returns:
+            Q: The filter condition.
+        """
+        condition = Q()
+        equal = {}
+        for order, value in zip(self.ordering, position):
+            field_name = order.lstrip('-')
+            lookup = '__lt' if order.startswith('-') != reverse else '__gt'
+            condition |= Q(**equal, **{field_name + lookup: value})
+            equal[field_name] = value
+        return condition
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        reverse = self.cursor is not None and self.cursor.reverse
+        current_position = self.cursor and self.cursor.position
+        if reverse:
+            queryset = queryset.order_by(
+                *(
+                    order[1:] if order.startswith('-') else '-' + order
+                    for order in self.ordering
+                )
+            )
+        else:
+            queryset = queryset.order_by(*self.ordering)
+        if current_position is not None:
+            try:
+                position = json.loads(current_position)
+                if (
+                    not isinstance(position, list)
+                    or len(position) != len(self.ordering)
+                ):
+                    raise ValueError
+                queryset = queryset.filter(
+                    self.get_position_filter(position, reverse)
+                )
+            except (TypeError, ValueError, DjangoValidationError):
+                raise NotFound(self.invalid_cursor_message)
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        has_following_position = len(results) > len(self.page)
+        if reverse:
+            self.page.reverse()
+            self.has_next = current_position is not None
+            self.has_previous = has_following_position
+        else:
+            self.has_next = has_following_position
+            self.has_previous = current_position is not None
+        self.next_position = self.previous_position = current_position
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        position = (
+            self._get_position_from_instance(self.page[-1], self.ordering)
+            if self.page
+            else self.next_position
+        )
+        return self.encode_cursor(
+            Cursor(offset=0, reverse=False, position=position)
+        )
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        position = (
+            self._get_position_from_instance(self.page[0], self.ordering)
+            if self.page
+            else self.previous_position
+        )
+        return self.encode_cursor(
+            Cursor(offset=0, reverse=True, position=position)
+        )
+
+    def _get_position_from_instance(self, instance, ordering):
+        values = []
+        for order in ordering:
+            field_name = order.lstrip('-')
+            if isinstance(instance, dict):
+                value = instance[field_name]
+            else:
+                value = getattr(instance, field_name)
+            if isinstance(value, datetime.datetime):
+                value = value.isoformat()
+            values.append(value)
+        return json.dumps(values)
+
+
+class RecipeCursorPagination(CustomCursorPagination):
+    """
+    Cursor pagination class for recipes, keyed on the default recipe
+    ordering (`name`) with `id` as a tiebreaker.
+    """
+
+    ordering = ('name', 'id')
+
+
+class PopularRecipeCursorPagination(CustomCursorPagination):
+    """
+    Cursor pagination class for recipes ordered by popularity, most
+    popular first, with `id` as a tiebreaker, keyed on the popularity
+    index.
+    """
+
+    ordering = ('-popularity_score', '-id')
+
+
+class SearchRecipeCursorPagination(CustomCursorPagination):
+    """
+    Cursor pagination class for searched recipes, keyed on the search
+    rank annotated by the search, best matches first, then on the
+    ordering of the regular pages, so both list the matches in the same
+    order.
+    """
+
+    ordering = ('-rank', 'name', 'id')
+
+
+class FeedCursorPagination(CustomCursorPagination):
+    """
+    Cursor pagination class for the following timeline, keyed on the
+    publication time of the entries, newest first, with `id` as a
+    tiebreaker, so every page is a range scan of the timeline index.
+    Entries backfilled together share their time, so the tiebreaker is
+    part of the cursors.
+    """
+
+    ordering = ('-created_at', '-id')
@@ -0,0 +1,67 @@
+"""
+Request parsers.
+
+`MultiPartJSONParser` lets the endpoints that take nested JSON accept
+`multipart/form-data` as well, so files can be uploaded as binary parts
+streamed to disk by the upload handlers instead of base64 strings inside
+the JSON body.
+"""
+import json
+
+from django.utils.datastructures import MultiValueDict
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import DataAndFiles, MultiPartParser
+
+
+class MultiPartJSONParser(MultiPartParser):
+    """
+    Multipart parser that accepts JSON alongside the files.
+
+    The fields come either as a single `data` part holding a JSON object,
+    or as separate parts, whose values holding a JSON array or object are
+    decoded. A field sent as several parts becomes a list, and so does a
+    single part of the fields listed in the `multipart_list_fields`
+    attribute of the view, e.g. a lone `tags=1`. The files are returned as
+    part of the data, since the request would merge them into a plain
+    dict as lists of values.
+    """
+
+    def decode(self, value):
+        """
+        Decode a field value holding a JSON array or object.
+
+        Args:
+            value (str): The value of a form field.
+
+        Returns:
+            The decoded value, or the value itself if it isn't JSON.
+
+        Raises:
+            ParseError: If the value looks like JSON but isn't valid.
+        """
+        if not value.lstrip().startswith(('[', '{')):
+            return value
+        try:
+            return json.loads(value)
+        except ValueError as error:
+            raise ParseError(f'JSON parse error - {error}')
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parsed = super().parse(stream, media_type, parser_context)
+        if 'data' in parsed.data:
+            data = self.decode(parsed.data['data'])
+            if not isinstance(data, dict):
+                raise ParseError('The data part must hold a JSON object.')
+        else:
+            view = (parser_context or {}).get('view')
+            list_fields = getattr(view, 'multipart_list_fields', ())
+            data = {}
+            for key, values in parsed.data.lists():
+                values = [self.decode(value) for value in values]
+                if len(values) == 1 and (
+                    key not in list_fields or isinstance(values[0], list)
+                ):
+                    values = values[0]
+                data[key] = values
+        data.update(parsed.files.dict())
+        return DataAndFiles(data, MultiValueDict())
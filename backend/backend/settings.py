@@ -24,6 +24,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'django_extensions',
     'rest_framework',
     'rest_framework.authtoken',
@@ -102,6 +103,32 @@ STATIC_ROOT = 'backend_static/static'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'foodgram'),
+        'TIMEOUT': int(os.getenv('CACHE_TIMEOUT', 300)),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', 1000)),
+        },
+    },
+    'versions': {
+        'BACKEND': os.getenv(
+            'VERSIONS_CACHE_BACKEND',
+            'django.core.cache.backends.db.DatabaseCache',
+        ),
+        'LOCATION': os.getenv('VERSIONS_CACHE_LOCATION', 'cache_versions'),
+        'TIMEOUT': None,
+        'OPTIONS': {
+            'MAX_ENTRIES': int(
+                os.getenv('VERSIONS_CACHE_MAX_ENTRIES', 100000)
+            ),
+        },
+    },
+}
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 AUTH_USER_MODEL = 'users.User'
 REST_FRAMEWORK = {
@@ -112,7 +139,7 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
     ],
-    'DEFAULT_PAGINATION_CLASS': 'backend.pagination.CustomPageNumberPagination',
+    'DEFAULT_PAGINATION_CLASS': 'backend.pagination.ApproximateCountPagination',
     'PAGE_SIZE': 6,
 }
 
@@ -152,6 +179,87 @@ MIN_COOKING_TIME = 1
 MAX_COOKING_TIME = 20161
 MIN_AMOUNT = 1
 MAX_AMOUNT = 10000
+# --------------------------------------------------------------- #
+# Минимальное число строк, с которого для нефильтрованных списков #
+# отдаётся оценка количества из статистики PostgreSQL             #
+# --------------------------------------------------------------- #
+APPROXIMATE_COUNT_THRESHOLD = int(
+    os.getenv('APPROXIMATE_COUNT_THRESHOLD', 10000)
+)
+# --------------------------------------------------------------- #
+# Максимальное число подсказок при поиске ингредиентов по имени   #
+# --------------------------------------------------------------- #
+INGREDIENT_SEARCH_LIMIT = 20
+# --------------------------------------------------------------- #
+# Конфигурация полнотекстового поиска рецептов в PostgreSQL       #
+# --------------------------------------------------------------- #
+SEARCH_CONFIG = 'russian'
+# --------------------------------------------------------------- #
+# Число строк, читаемых за раз при выгрузке списка покупок        #
+# --------------------------------------------------------------- #
+EXPORT_CHUNK_SIZE = 2000
+# --------------------------------------------------------------- #
+# Число потоков для фоновых задач в каждом процессе               #
+# --------------------------------------------------------------- #
+BACKGROUND_WORKERS = int(os.getenv('BACKGROUND_WORKERS', 2))
+# --------------------------------------------------------------- #
+# Время жизни выгрузок списка покупок и предельное время их       #
+# подготовки, в секундах                                          #
+# --------------------------------------------------------------- #
+EXPORT_JOB_TTL = int(os.getenv('EXPORT_JOB_TTL', 3600))
+EXPORT_JOB_TIMEOUT = int(os.getenv('EXPORT_JOB_TIMEOUT', 600))
+# --------------------------------------------------------------- #
+# Наибольшая сторона загружаемых изображений рецептов, размеры    #
+# их уменьшенных вариантов в пикселях и качество сжатия           #
+# --------------------------------------------------------------- #
+RECIPE_IMAGE_MAX_SIZE = 2048
+RECIPE_IMAGE_RENDITIONS = {'card': 480, 'detail': 1280}
+RECIPE_IMAGE_QUALITY = 85
+# --------------------------------------------------------------- #
+# Ограничения загружаемых изображений рецептов: размер файла в    #
+# байтах и число пикселей                                         #
+# --------------------------------------------------------------- #
+RECIPE_IMAGE_MAX_UPLOAD_SIZE = 20 * 1024 * 1024
+RECIPE_IMAGE_MAX_PIXELS = 40_000_000
+# --------------------------------------------------------------- #
+# Наибольшее число рецептов в одном запросе к массовым            #
+# эндпоинтам избранного и списка покупок                          #
+# --------------------------------------------------------------- #
+BULK_RECIPES_MAX_SIZE = 100
+# --------------------------------------------------------------- #
+# Ленты подписок: наибольшее число подписчиков, получающих новый  #
+# рецепт автора, размер пакета вставки записей и число последних  #
+# рецептов автора, добавляемых в ленту при подписке               #
+# --------------------------------------------------------------- #
+FEED_FANOUT_MAX_FOLLOWERS = int(os.getenv('FEED_FANOUT_MAX_FOLLOWERS', 10000))
+FEED_FANOUT_BATCH_SIZE = 1000
+FEED_BACKFILL_SIZE = 50
+# --------------------------------------------------------------- #
+# Число хранимых похожих рецептов, мера сходства наборов          #
+# ингредиентов (cosine или jaccard) и доля рецептов, начиная с    #
+# которой ингредиент считается общим и не учитывается             #
+# --------------------------------------------------------------- #
+SIMILAR_RECIPES_COUNT = 10
+SIMILAR_RECIPES_METRIC = 'cosine'
+SIMILAR_RECIPES_MAX_INGREDIENT_SHARE = 0.05
+# --------------------------------------------------------------- #
+# Популярность рецептов: период полураспада вклада добавлений в   #
+# избранное и список покупок в днях, окно учёта в днях, веса      #
+# добавлений, наименьший интервал между пересчётами в секундах и  #
+# размер пакета обновления                                        #
+# --------------------------------------------------------------- #
+POPULARITY_HALF_LIFE_DAYS = 7
+POPULARITY_WINDOW_DAYS = 56
+POPULARITY_FAVORITE_WEIGHT = 1.0
+POPULARITY_SHOPPING_CART_WEIGHT = 0.5
+POPULARITY_UPDATE_INTERVAL = int(os.getenv('POPULARITY_UPDATE_INTERVAL', 600))
+POPULARITY_BATCH_SIZE = 1000
+# --------------------------------------------------------------- #
+# Загружаемые файлы сразу пишутся во временные файлы на диске     #
+# --------------------------------------------------------------- #
+FILE_UPLOAD_HANDLERS = [
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
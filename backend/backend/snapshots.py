@@ -0,0 +1,120 @@
+"""
+Pre-rendered response snapshots.
+
+A snapshot is the JSON body of a rarely changing response, rendered once
+per version of its cache namespace and kept per process together with
+its gzip and brotli compressed variants. Serving a snapshot costs no
+database or serializer work.
+"""
+import gzip
+import threading
+from dataclasses import dataclass
+
+import brotli
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+
+from backend.cache import get_versions
+
+ENCODINGS = ('br', 'gzip')
+
+_lock = threading.Lock()
+_snapshots = {}
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    """
+    A rendered response body and its compressed variants.
+
+    Attributes:
+        version (int): The namespace version the body was rendered at.
+        bodies (dict): The bodies by content encoding (`identity`, `gzip`
+        and `br`).
+    """
+
+    version: int
+    bodies: dict
+
+    @classmethod
+    def build(cls, version, body):
+        return cls(
+            version=version,
+            bodies={
+                'identity': body,
+                'gzip': gzip.compress(body, compresslevel=9),
+                'br': brotli.compress(body, mode=brotli.MODE_TEXT),
+            },
+        )
+
+
+def get_snapshot(namespace, render):
+    """
+    Get the snapshot of a namespace, rendering it if the namespace version
+    changed since it was built.
+
+    Args:
+        namespace (str): The cache namespace the body depends on.
+        render (callable): Returns the JSON body as bytes.
+
+    Returns:
+        Snapshot: The up-to-date snapshot.
+    """
+    version = get_versions(namespace)[0]
+    snapshot = _snapshots.get(namespace)
+    if snapshot is not None and snapshot.version == version:
+        return snapshot
+    with _lock:
+        snapshot = _snapshots.get(namespace)
+        if snapshot is None or snapshot.version != version:
+            snapshot = Snapshot.build(version, render())
+            _snapshots[namespace] = snapshot
+    return snapshot
+
+
+def get_accepted_encoding(request):
+    """
+    Choose the best content encoding accepted by the client.
+
+    Args:
+        request (HttpRequest): The HTTP request.
+
+    Returns:
+        str: `br`, `gzip` or `identity`.
+    """
+    accepted = set()
+    for item in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        coding, _, params = item.strip().partition(';')
+        quality = params.strip().partition('q=')[2]
+        try:
+            if quality and float(quality) <= 0:
+                continue
+        except ValueError:
+            continue
+        accepted.add(coding.strip().lower())
+    for encoding in ENCODINGS:
+        if encoding in accepted or '*' in accepted:
+            return encoding
+    return 'identity'
+
+
+def snapshot_response(request, snapshot):
+    """
+    Build the response serving a snapshot in the best accepted encoding.
+
+    Args:
+        request (HttpRequest): The HTTP request.
+        snapshot (Snapshot): The snapshot to serve.
+
+    Returns:
+        HttpResponse: The JSON response.
+    """
+    encoding = get_accepted_encoding(request)
+    response = HttpResponse(
+        snapshot.bodies[encoding], content_type='application/json'
+    )
+    if encoding != 'identity':
+        response['Content-Encoding'] = encoding
+    response['Content-Length'] = len(snapshot.bodies[encoding])
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
@@ -0,0 +1,61 @@
+"""
+In-process background tasks.
+
+Tasks run on a small thread pool shared by the worker process, so slow
+work such as rendering exports doesn't hold the request worker. The
+number of threads is bounded by `settings.BACKGROUND_WORKERS`; tasks
+submitted while every thread is busy wait in the queue.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, connections, transaction
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_executor = None
+
+
+def get_executor():
+    """
+    Get the thread pool of the process, creating it on the first call.
+
+    Returns:
+        ThreadPoolExecutor: The thread pool.
+    """
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.BACKGROUND_WORKERS,
+                thread_name_prefix='background',
+            )
+        return _executor
+
+
+def _run(func, args, kwargs):
+    close_old_connections()
+    try:
+        func(*args, **kwargs)
+    except Exception:
+        logger.exception('Background task %s failed', func.__name__)
+    finally:
+        connections.close_all()
+
+
+def run_in_background(func, *args, **kwargs):
+    """
+    Run a function on the thread pool once the current transaction is
+    committed, so the task sees the rows the request has written.
+
+    Args:
+        func (callable): The function to run.
+        *args: The positional arguments of the function.
+        **kwargs: The keyword arguments of the function.
+    """
+    transaction.on_commit(
+        lambda: get_executor().submit(_run, func, args, kwargs)
+    )
@@ -1,11 +1,54 @@
+from contextlib import contextmanager
+
 from django.contrib import admin
 from django.contrib.admin import register
+from django.db import transaction
+
+from backend.mixins import CounterAdminMixin
+from recipes.models import (ExportJob, Favorite, FeedEntry, Ingredient, Recipe,
+                            RecipeIngredient, ShoppingCartIngredient,
+                            ShoppingList, SimilarRecipe, Tag)
 
-from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
-                            ShoppingList, Tag)
+admin.site.register(ExportJob)
+admin.site.register(FeedEntry)
+admin.site.register(SimilarRecipe)
 
-admin.site.register(Favorite)
-admin.site.register(ShoppingList)
+
+def get_ingredient_amounts(recipe_id):
+    """
+    Get the amounts of a recipe's ingredients.
+
+    Args:
+        recipe_id (int): The ID of the recipe.
+
+    Returns:
+        dict: The amounts by ingredient id.
+    """
+    return dict(
+        RecipeIngredient.objects.filter(recipe_id=recipe_id).values_list(
+            'ingredient_id', 'amount'
+        )
+    )
+
+
+@contextmanager
+def sync_shopping_carts(recipe_ids):
+    """
+    Apply the changes of the recipes' ingredients made inside the block
+    to the aggregated ingredients of the shopping carts containing them.
+
+    Args:
+        recipe_ids (iterable): The ids of the changed recipes.
+    """
+    old_amounts = {
+        recipe_id: get_ingredient_amounts(recipe_id)
+        for recipe_id in set(recipe_ids)
+    }
+    yield
+    for recipe_id, amounts in old_amounts.items():
+        ShoppingCartIngredient.objects.change_recipe_ingredients(
+            Recipe(pk=recipe_id), amounts, get_ingredient_amounts(recipe_id)
+        )
 
 
 class RecipeIngredientInline(admin.TabularInline):
@@ -34,23 +77,25 @@ class RecipeAdmin(admin.ModelAdmin):
         inlines (list): The inline models to include.
     """
 
-    list_display = ('id', 'name', 'author', 'cooking_time', 'favorites_count')
+    list_display = (
+        'id',
+        'name',
+        'author',
+        'cooking_time',
+        'favorites_count',
+        'in_carts_count',
+    )
     search_fields = ('name', 'author')
     list_filter = ('author', 'name')
     inlines = [RecipeIngredientInline]
 
-    @admin.display(description='счётчик избранного')
-    def favorites_count(self, recipe):
+    def save_related(self, request, form, formsets, change):
         """
-        Display the count of favorites for a recipe.
-
-        Args:
-            recipe (Recipe): The Recipe object.
-
-        Returns:
-            int: The count of favorites.
+        Save the ingredients and the tags of the recipe, and update the
+        shopping carts containing it with the change of its ingredients.
         """
-        return recipe.favorite.count()
+        with sync_shopping_carts([form.instance.pk] if change else []):
+            super().save_related(request, form, formsets, change)
 
 
 @register(Ingredient)
@@ -102,3 +147,107 @@ class RecipeIngredientAdmin(admin.ModelAdmin):
     list_display = ('id', 'recipe', 'ingredient', 'amount')
     search_fields = ('recipe', 'ingredient')
     list_filter = ('recipe', 'ingredient')
+
+    def save_model(self, request, obj, form, change):
+        recipe_ids = [obj.recipe_id]
+        if change:
+            recipe_ids += RecipeIngredient.objects.filter(
+                pk=obj.pk
+            ).values_list('recipe_id', flat=True)
+        with sync_shopping_carts(recipe_ids):
+            super().save_model(request, obj, form, change)
+
+    def delete_model(self, request, obj):
+        with sync_shopping_carts([obj.recipe_id]):
+            super().delete_model(request, obj)
+
+    @transaction.atomic
+    def delete_queryset(self, request, queryset):
+        with sync_shopping_carts(queryset.values_list('recipe_id', flat=True)):
+            super().delete_queryset(request, queryset)
+
+
+@register(Favorite)
+class FavoriteAdmin(CounterAdminMixin, admin.ModelAdmin):
+    """
+    Admin model for Favorite.
+
+    The favorite counters of the recipes are updated with the added,
+    changed and deleted favorites.
+
+    Attributes:
+        list_display (tuple): The fields to display in the list view.
+        list_filter (tuple): The fields to use for filtering in the
+        admin interface.
+    """
+
+    list_display = ('id', 'user', 'recipe')
+    list_filter = ('user',)
+
+
+@register(ShoppingList)
+class ShoppingListAdmin(CounterAdminMixin, admin.ModelAdmin):
+    """
+    Admin model for ShoppingList.
+
+    The aggregated shopping cart ingredients of the users and the
+    shopping cart counters of the recipes are updated with the added,
+    changed and deleted shopping cart entries.
+
+    Attributes:
+        list_display (tuple): The fields to display in the list view.
+        list_filter (tuple): The fields to use for filtering in the
+        admin interface.
+    """
+
+    list_display = ('id', 'user', 'recipe')
+    list_filter = ('user',)
+
+    def save_model(self, request, obj, form, change):
+        if change:
+            old = ShoppingList.objects.select_related('user').get(pk=obj.pk)
+            ShoppingCartIngredient.objects.remove_recipes(
+                old.user, [old.recipe_id]
+            )
+        super().save_model(request, obj, form, change)
+        ShoppingCartIngredient.objects.add_recipes(obj.user, [obj.recipe_id])
+
+    def delete_model(self, request, obj):
+        ShoppingCartIngredient.objects.remove_recipes(
+            obj.user, [obj.recipe_id]
+        )
+        super().delete_model(request, obj)
+
+    @transaction.atomic
+    def delete_queryset(self, request, queryset):
+        for shopping_list in queryset.select_related('user'):
+            ShoppingCartIngredient.objects.remove_recipes(
+                shopping_list.user, [shopping_list.recipe_id]
+            )
+        super().delete_queryset(request, queryset)
+
+
+@register(ShoppingCartIngredient)
+class ShoppingCartIngredientAdmin(admin.ModelAdmin):
+    """
+    Read-only admin model for ShoppingCartIngredient, which is derived
+    from the shopping carts and is rebuilt with the
+    `rebuild_shopping_lists` command.
+
+    Attributes:
+        list_display (tuple): The fields to display in the list view.
+        list_filter (tuple): The fields to use for filtering in the
+        admin interface.
+    """
+
+    list_display = ('id', 'user', 'ingredient', 'total_amount', 'recipe_count')
+    list_filter = ('user',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
@@ -12,3 +12,6 @@ class RecipesConfig(AppConfig):
 
     name = 'recipes'
     verbose_name = 'Рецепты'
+
+    def ready(self):
+        from recipes import signals  # noqa: F401
@@ -0,0 +1,229 @@
+"""
+Shopping list exports.
+
+Every text exporter is a generator over the (name, measurement_unit,
+amount) rows of the list, yielding the document in small chunks, so it
+can be fed from a server-side cursor to a streaming response without
+holding the whole list in memory.
+
+Heavy renders can also run as export jobs on the background thread pool,
+which write the document to the media storage for the client to poll.
+"""
+import csv
+import hashlib
+import json
+import logging
+import tempfile
+import uuid
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Callable
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+
+from backend.tasks import run_in_background
+from recipes.models import ExportJob, ShoppingCartIngredient
+from recipes.pdf import SPOOL_MAX_SIZE, ShoppingListPDF
+
+logger = logging.getLogger(__name__)
+
+
+class Echo:
+    """A file-like object that returns what is written to it."""
+
+    def write(self, value):
+        return value
+
+
+def export_csv(items):
+    """
+    Export the shopping list as CSV with a header row.
+
+    Args:
+        items (iterable): Tuples of (name, measurement_unit, amount).
+
+    Yields:
+        str: The lines of the document.
+    """
+    writer = csv.writer(Echo())
+    yield writer.writerow(('name', 'measurement_unit', 'amount'))
+    for item in items:
+        yield writer.writerow(item)
+
+
+def export_text(items):
+    """
+    Export the shopping list as plain text, one ingredient per line.
+
+    Args:
+        items (iterable): Tuples of (name, measurement_unit, amount).
+
+    Yields:
+        str: The lines of the document.
+    """
+    for name, unit, amount in items:
+        yield f'• {name} ({unit}) — {amount}\n'
+
+
+def export_json(items):
+    """
+    Export the shopping list as a JSON array of objects.
+
+    Args:
+        items (iterable): Tuples of (name, measurement_unit, amount).
+
+    Yields:
+        str: The parts of the document.
+    """
+    separator = '['
+    for name, unit, amount in items:
+        yield separator + json.dumps(
+            {'name': name, 'measurement_unit': unit, 'amount': amount},
+            ensure_ascii=False,
+        )
+        separator = ','
+    yield '[]' if separator == '[' else ']'
+
+
+@dataclass(frozen=True)
+class ExportFormat:
+    """
+    A text format of the shopping list export.
+
+    Attributes:
+        content_type (str): The content type of the response.
+        extension (str): The file name extension.
+        export (callable): The generator producing the document.
+    """
+
+    content_type: str
+    extension: str
+    export: Callable
+
+
+EXPORT_FORMATS = {
+    'csv': ExportFormat('text/csv; charset=utf-8', 'csv', export_csv),
+    'txt': ExportFormat('text/plain; charset=utf-8', 'txt', export_text),
+    'json': ExportFormat('application/json', 'json', export_json),
+}
+
+
+def render_to_file(user, export_format):
+    """
+    Render the user's shopping list into a spooled temporary file.
+
+    Args:
+        user (User): The owner of the shopping cart.
+        export_format (str): The export format.
+
+    Returns:
+        SpooledTemporaryFile: The file, positioned at its start.
+    """
+    items = ShoppingCartIngredient.objects.shopping_list(user)
+    if export_format == ExportJob.Format.PDF:
+        return ShoppingListPDF('Список покупок').render_to_file(items)
+    output = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    export = EXPORT_FORMATS[export_format].export
+    rows = items.iterator(chunk_size=settings.EXPORT_CHUNK_SIZE)
+    for chunk in export(rows):
+        output.write(chunk.encode())
+    output.seek(0)
+    return output
+
+
+def get_fingerprint(user, export_format):
+    """
+    Hash the export format and the contents of the user's shopping cart.
+
+    Args:
+        user (User): The owner of the shopping cart.
+        export_format (str): The export format.
+
+    Returns:
+        str: The hex digest of the hash.
+    """
+    digest = hashlib.sha256(export_format.encode())
+    rows = (
+        ShoppingCartIngredient.objects.filter(user=user)
+        .order_by('ingredient_id')
+        .values_list('ingredient_id', 'total_amount')
+    )
+    for ingredient_id, total_amount in rows.iterator(
+        chunk_size=settings.EXPORT_CHUNK_SIZE
+    ):
+        digest.update(f'{ingredient_id}:{total_amount};'.encode())
+    return digest.hexdigest()
+
+
+def start_export_job(user, export_format):
+    """
+    Get the export job of the user's shopping cart in a format, creating
+    and scheduling it unless an identical job can be shared.
+
+    Args:
+        user (User): The owner of the shopping cart.
+        export_format (str): The export format.
+
+    Returns:
+        tuple: The job and whether it has been created.
+    """
+    fingerprint = get_fingerprint(user, export_format)
+    with transaction.atomic():
+        ExportJob.objects.filter(
+            user=user, fingerprint=fingerprint
+        ).replaceable().delete_with_files()
+        job, created = ExportJob.objects.get_or_create(
+            user=user,
+            fingerprint=fingerprint,
+            defaults={
+                'format': export_format,
+                'expires_at': timezone.now()
+                + timedelta(seconds=settings.EXPORT_JOB_TTL),
+            },
+        )
+        if created:
+            run_in_background(render_export_job, job.pk)
+    return job, created
+
+
+def render_export_job(job_id):
+    """
+    Render an export job into the media storage.
+
+    The expired jobs are removed with their files first. A job is claimed
+    by moving it from the pending state, so it is rendered at most once,
+    and the file is dropped if the job has been replaced meanwhile.
+
+    Args:
+        job_id (int): The id of the job.
+    """
+    ExportJob.objects.expired().delete_with_files()
+    claimed = ExportJob.objects.filter(
+        pk=job_id, status=ExportJob.Status.PENDING
+    ).update(status=ExportJob.Status.RUNNING)
+    if not claimed:
+        return
+    job = ExportJob.objects.select_related('user').get(pk=job_id)
+    try:
+        output = render_to_file(job.user, job.format)
+        with output:
+            job.file.save(
+                f'{uuid.uuid4().hex}.{job.format}', File(output), save=False
+            )
+    except Exception:
+        logger.exception('Export job %s failed', job_id)
+        job.status = ExportJob.Status.FAILED
+    else:
+        job.status = ExportJob.Status.DONE
+    finished_at = timezone.now()
+    updated = ExportJob.objects.filter(pk=job_id).update(
+        file=job.file.name,
+        status=job.status,
+        finished_at=finished_at,
+        expires_at=finished_at + timedelta(seconds=settings.EXPORT_JOB_TTL),
+    )
+    if not updated and job.file:
+        job.file.delete(save=False)
@@ -0,0 +1,111 @@
+"""
+Following timelines.
+
+Every user has a feed of the recipes published by the authors they
+follow. The entries are written when a recipe is created (fan-out on
+write) on the background thread pool, so reading a timeline is a single
+range scan of the user's entries instead of a join of the subscriptions
+and the recipes.
+
+The fan-out of a recipe reaches at most
+`settings.FEED_FANOUT_MAX_FOLLOWERS` followers, the most recently active
+ones first, which bounds the work done for authors with a huge audience.
+A new subscription backfills the latest recipes of the author, and
+unsubscribing removes them from the timeline.
+"""
+from django.conf import settings
+from django.db.models import F
+
+from recipes.models import FeedEntry, Recipe
+from users.models import Subscription
+
+
+def insert_entries(entries):
+    """
+    Insert feed entries in batches, skipping the existing ones.
+
+    Args:
+        entries (list): The FeedEntry objects.
+    """
+    FeedEntry.objects.bulk_create(
+        entries,
+        batch_size=settings.FEED_FANOUT_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def fan_out_recipe(recipe_id):
+    """
+    Add a new recipe to the timelines of its author's followers.
+
+    Args:
+        recipe_id (int): The id of the recipe.
+
+    Returns:
+        int: The number of timelines the recipe has been added to.
+    """
+    recipe = (
+        Recipe.objects.filter(pk=recipe_id)
+        .values('author_id', 'created_at')
+        .first()
+    )
+    if recipe is None:
+        return 0
+    followers = list(
+        Subscription.objects.filter(following_id=recipe['author_id'])
+        .order_by(
+            F('follower__last_login').desc(nulls_last=True), 'follower_id'
+        )
+        .values_list('follower_id', flat=True)[
+            : settings.FEED_FANOUT_MAX_FOLLOWERS
+        ]
+    )
+    insert_entries(
+        [
+            FeedEntry(
+                user_id=follower_id,
+                recipe_id=recipe_id,
+                author_id=recipe['author_id'],
+                created_at=recipe['created_at'],
+            )
+            for follower_id in followers
+        ]
+    )
+    return len(followers)
+
+
+def backfill_feed(user, author):
+    """
+    Add the latest recipes of an author to a new follower's timeline.
+
+    Args:
+        user (User): The follower.
+        author (User): The followed author.
+    """
+    recipes = (
+        Recipe.objects.filter(author=author)
+        .order_by('-created_at', '-id')
+        .values_list('pk', 'created_at')[: settings.FEED_BACKFILL_SIZE]
+    )
+    insert_entries(
+        [
+            FeedEntry(
+                user=user,
+                recipe_id=recipe_id,
+                author=author,
+                created_at=created_at,
+            )
+            for recipe_id, created_at in recipes
+        ]
+    )
+
+
+def prune_feed(user, author):
+    """
+    Remove the recipes of an author from a former follower's timeline.
+
+    Args:
+        user (User): The former follower.
+        author (User): The author.
+    """
+    FeedEntry.objects.filter(user=user, author=author).delete()
@@ -0,0 +1,42 @@
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from drf_extra_fields.fields import Base64FieldMixin, Base64ImageField
+from PIL import Image
+
+
+class RecipeImageField(Base64ImageField):
+    """
+    Image field accepting a base64 string or an uploaded file.
+
+    Multipart uploads arrive as files streamed to disk by the upload
+    handlers; base64 strings in JSON bodies are still supported for the
+    existing clients. Images above `settings.RECIPE_IMAGE_MAX_UPLOAD_SIZE`
+    bytes or `settings.RECIPE_IMAGE_MAX_PIXELS` pixels are rejected before
+    they are decoded.
+    """
+
+    default_error_messages = {
+        'too_large': 'Размер изображения не должен превышать {max_size} МБ.',
+        'too_many_pixels': (
+            'Изображение не должно содержать больше {max_pixels} пикселей.'
+        ),
+    }
+
+    def to_internal_value(self, data):
+        max_size = settings.RECIPE_IMAGE_MAX_UPLOAD_SIZE
+        if isinstance(data, UploadedFile):
+            if data.size > max_size:
+                self.fail('too_large', max_size=max_size // 1024 // 1024)
+            file = super(Base64FieldMixin, self).to_internal_value(data)
+        else:
+            if isinstance(data, str) and len(data) * 3 // 4 > max_size:
+                self.fail('too_large', max_size=max_size // 1024 // 1024)
+            file = super().to_internal_value(data)
+        file.seek(0)
+        with Image.open(file) as image:
+            width, height = image.size
+        if width * height > settings.RECIPE_IMAGE_MAX_PIXELS:
+            self.fail(
+                'too_many_pixels', max_pixels=settings.RECIPE_IMAGE_MAX_PIXELS
+            )
+        return file
@@ -1,28 +1,86 @@
 from django_filters.rest_framework import FilterSet, filters
 
-from recipes.models import Ingredient, Recipe, Tag
+from recipes.models import Ingredient, Recipe
+from recipes.search import search_recipes
+from recipes.tag_map import get_tag_choices, get_tag_map
 
 
 class RecipeFilter(FilterSet):
     """FilterSet for filtering recipes."""
 
-    tags = filters.ModelMultipleChoiceFilter(
-        queryset=Tag.objects.all(),
-        field_name='tags__slug',
-        to_field_name='slug',
+    tags = filters.MultipleChoiceFilter(
+        choices=get_tag_choices,
+        method='get_tags',
+    )
+    tags_match = filters.ChoiceFilter(
+        choices=(('any', 'Любой из тегов'), ('all', 'Все теги')),
+        method='get_tags_match',
     )
     is_favorited = filters.BooleanFilter(method='get_is_favorited')
     is_in_shopping_cart = filters.BooleanFilter(
         method='get_is_in_shopping_cart'
     )
+    search = filters.CharFilter(method='get_search')
+    ordering = filters.ChoiceFilter(
+        choices=(('popular', 'Популярные'),),
+        method='get_ordering',
+    )
 
     class Meta:
         model = Recipe
-        fields = ('author', 'tags', 'is_favorited', 'is_in_shopping_cart')
+        fields = (
+            'author',
+            'tags',
+            'tags_match',
+            'is_favorited',
+            'is_in_shopping_cart',
+            'search',
+            'ordering',
+        )
+
+    def get_tags(self, queryset, name, value):
+        """Filter recipes by tag slugs.
+
+        The slugs are resolved to ids from the in-memory tag map. The
+        recipes having any of the tags are returned, or the recipes
+        having all of them with `tags_match=all`.
+
+        Args:
+            queryset (QuerySet): The initial queryset.
+            name (str): The field name.
+            value (list): The tag slugs.
+
+        Returns:
+            QuerySet: The filtered queryset.
+
+        """
+        tag_map = get_tag_map()
+        return queryset.tagged(
+            [tag_map[slug] for slug in value if slug in tag_map],
+            match_all=self.form.cleaned_data.get('tags_match') == 'all',
+        )
+
+    def get_tags_match(self, queryset, name, value):
+        """Leave the queryset unchanged.
+
+        `tags_match` only selects how `tags` are matched.
+
+        Args:
+            queryset (QuerySet): The initial queryset.
+            name (str): The field name.
+            value (str): `any` or `all`.
+
+        Returns:
+            QuerySet: The initial queryset.
+
+        """
+        return queryset
 
     def get_is_favorited(self, queryset, name, value):
         """Filter recipes based on whether they are favorited by the user.
 
+        Relies on the flags annotated by `RecipeQuerySet.with_user_flags`.
+
         Args:
             queryset (QuerySet): The initial queryset.
             name (str): The field name.
@@ -33,13 +91,15 @@ class RecipeFilter(FilterSet):
 
         """
         if self.request.user.is_authenticated and value:
-            return queryset.filter(favorite__user=self.request.user)
+            return queryset.filter(is_favorited=True)
         return queryset
 
     def get_is_in_shopping_cart(self, queryset, name, value):
         """Filter recipes based on whether they are in the
         user's shopping cart.
 
+        Relies on the flags annotated by `RecipeQuerySet.with_user_flags`.
+
         Args:
             queryset (QuerySet): The initial queryset.
             name (str): The field name.
@@ -50,7 +110,46 @@ class RecipeFilter(FilterSet):
 
         """
         if self.request.user.is_authenticated and value:
-            return queryset.filter(shoppinglist__user=self.request.user)
+            return queryset.filter(is_in_shopping_cart=True)
+        return queryset
+
+    def get_search(self, queryset, name, value):
+        """Filter recipes by a search query over the name and description.
+
+        The results are ranked, best matches first.
+
+        Args:
+            queryset (QuerySet): The initial queryset.
+            name (str): The field name.
+            value (str): The search query.
+
+        Returns:
+            QuerySet: The filtered queryset.
+
+        """
+        value = value.strip()
+        if not value:
+            return queryset
+        return search_recipes(queryset, value)
+
+    def get_ordering(self, queryset, name, value):
+        """Order recipes by the given criterion.
+
+        `popular` puts the most popular recipes first, according to
+        their precomputed `popularity_score`. The ordering is applied
+        after the other filters and replaces the search ranking.
+
+        Args:
+            queryset (QuerySet): The initial queryset.
+            name (str): The field name.
+            value (str): The ordering criterion.
+
+        Returns:
+            QuerySet: The ordered queryset.
+
+        """
+        if value == 'popular':
+            return queryset.order_by('-popularity_score', '-id')
         return queryset
 
 
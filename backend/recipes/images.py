@@ -0,0 +1,178 @@
+"""
+Recipe image processing.
+
+Uploads are normalized before they are stored: the EXIF orientation is
+applied and the image is scaled down to `settings.RECIPE_IMAGE_MAX_SIZE`.
+The renditions listed in `settings.RECIPE_IMAGE_RENDITIONS` are generated
+from the stored image on the background thread pool, in the format of
+the original and in WebP, and recorded in `Recipe.image_renditions`
+together with the name of the image they were made from.
+"""
+import io
+import os
+import uuid
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from backend.cache import bump_version
+from recipes.models import Recipe
+
+RENDITIONS_DIRECTORY = 'recipes/renditions'
+FORMATS = {'JPEG': 'jpg', 'PNG': 'png', 'WEBP': 'webp'}
+
+
+def encode_image(image, image_format):
+    """
+    Encode an image for storage.
+
+    Args:
+        image (Image): The image.
+        image_format (str): The PIL format name.
+
+    Returns:
+        bytes: The encoded image.
+    """
+    if image_format == 'JPEG' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    output = io.BytesIO()
+    image.save(
+        output,
+        image_format,
+        quality=settings.RECIPE_IMAGE_QUALITY,
+        optimize=True,
+    )
+    return output.getvalue()
+
+
+def get_storage_format(image):
+    """
+    Get the format an image is stored in: PNG for images with
+    transparency, JPEG otherwise.
+
+    Args:
+        image (Image): The image.
+
+    Returns:
+        str: The PIL format name.
+    """
+    if image.mode in ('RGBA', 'LA') or 'transparency' in image.info:
+        return 'PNG'
+    return 'JPEG'
+
+
+def normalize_image(file):
+    """
+    Apply the EXIF orientation of an uploaded image and scale it down to
+    the maximum size.
+
+    JPEG images are decoded at the smallest scale still covering the
+    maximum size, which bounds the memory used by large photos.
+
+    Args:
+        file (File): The uploaded image.
+
+    Returns:
+        ContentFile: The normalized image with a generated name.
+    """
+    file.seek(0)
+    with Image.open(file) as original:
+        original.draft(
+            original.mode,
+            (settings.RECIPE_IMAGE_MAX_SIZE, settings.RECIPE_IMAGE_MAX_SIZE),
+        )
+        image = ImageOps.exif_transpose(original)
+        image.thumbnail(
+            (settings.RECIPE_IMAGE_MAX_SIZE, settings.RECIPE_IMAGE_MAX_SIZE)
+        )
+        image_format = get_storage_format(image)
+        return ContentFile(
+            encode_image(image, image_format),
+            name=f'{uuid.uuid4().hex}.{FORMATS[image_format]}',
+        )
+
+
+def needs_renditions(recipe):
+    """
+    Check whether the renditions of a recipe are missing or were made
+    from another image.
+
+    Args:
+        recipe (Recipe): The recipe.
+
+    Returns:
+        bool: True if the renditions must be generated.
+    """
+    return bool(recipe.image) and (
+        recipe.image_renditions.get('source') != recipe.image.name
+    )
+
+
+def generate_renditions(recipe_id):
+    """
+    Generate the renditions of a recipe image and store their names.
+
+    The names are only stored if the recipe still has the same image,
+    and the files of the previous renditions are deleted.
+
+    Args:
+        recipe_id (int): The id of the recipe.
+
+    Returns:
+        bool: True if the renditions have been stored.
+    """
+    recipe = Recipe.objects.filter(pk=recipe_id).only(
+        'image', 'image_renditions'
+    ).first()
+    if recipe is None or not needs_renditions(recipe):
+        return False
+    stem = os.path.splitext(os.path.basename(recipe.image.name))[0]
+    renditions = {'source': recipe.image.name}
+    with recipe.image.open('rb') as file, Image.open(file) as original:
+        original.load()
+        image_format = get_storage_format(original)
+        for name, size in settings.RECIPE_IMAGE_RENDITIONS.items():
+            image = original.copy()
+            image.thumbnail((size, size))
+            for key, rendition_format in (
+                (name, image_format),
+                (f'{name}_webp', 'WEBP'),
+            ):
+                renditions[key] = default_storage.save(
+                    f'{RENDITIONS_DIRECTORY}/{stem}_{name}.'
+                    f'{FORMATS[rendition_format]}',
+                    ContentFile(encode_image(image, rendition_format)),
+                )
+    stored = Recipe.objects.filter(
+        pk=recipe_id, image=recipe.image.name
+    ).update(image_renditions=renditions, updated_at=timezone.now())
+    stale = recipe.image_renditions if stored else renditions
+    for key, path in stale.items():
+        if key != 'source':
+            default_storage.delete(path)
+    if stored:
+        bump_version('recipes')
+    return bool(stored)
+
+
+def get_rendition_urls(recipe):
+    """
+    Get the URLs of the renditions of a recipe image.
+
+    Args:
+        recipe (Recipe): The recipe.
+
+    Returns:
+        dict: The URLs by rendition name, empty until the renditions of
+        the current image are generated.
+    """
+    if needs_renditions(recipe):
+        return {}
+    return {
+        key: default_storage.url(path)
+        for key, path in recipe.image_renditions.items()
+        if key != 'source'
+    }
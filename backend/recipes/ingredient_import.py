@@ -0,0 +1,243 @@
+"""
+Bulk ingredient import.
+
+The CSV and JSON files are read as streams of (name, measurement_unit)
+rows, so the memory use doesn't grow with the file size. The rows are
+inserted in batches that skip the ingredients already present, which
+makes repeated imports of the same file a no-op. On PostgreSQL the rows
+can instead be copied into a temporary staging table with `COPY` and
+merged into the ingredient table with a single statement.
+"""
+import csv
+import io
+import json
+import re
+from itertools import islice
+
+from django.conf import settings
+from django.db import connection
+
+from recipes.models import Ingredient
+
+READ_SIZE = 64 * 1024
+SEPARATORS = re.compile(r'[\s,]*')
+
+
+class InvalidRow(ValueError):
+    """Raised for a row that can't be imported as an ingredient."""
+
+
+def read_csv(file):
+    """
+    Read the ingredients from a CSV file of (name, measurement_unit) rows.
+
+    Args:
+        file (file): A text file object.
+
+    Yields:
+        tuple: The (name, measurement_unit) rows, or InvalidRow for the
+        malformed ones.
+    """
+    for row in csv.reader(file):
+        if not row:
+            continue
+        if len(row) != 2:
+            yield InvalidRow(f'Строка {row!r}: ожидается два столбца')
+            continue
+        yield row[0], row[1]
+
+
+def read_json(file):
+    """
+    Read the ingredients from a JSON array of objects with the `name` and
+    `measurement_unit` keys.
+
+    The array is decoded one element at a time from a buffer refilled
+    from the file, so the file is never loaded as a whole.
+
+    Args:
+        file (file): A text file object.
+
+    Yields:
+        tuple: The (name, measurement_unit) rows, or InvalidRow for the
+        malformed ones.
+
+    Raises:
+        ValueError: If the file is not a JSON array.
+    """
+    decoder = json.JSONDecoder()
+    buffer, position, started = '', 0, False
+    while True:
+        position = SEPARATORS.match(buffer, position).end()
+        if position == len(buffer):
+            buffer, position = file.read(READ_SIZE), 0
+            if not buffer:
+                raise ValueError('Неожиданный конец файла JSON')
+            continue
+        if not started:
+            if buffer[position] != '[':
+                raise ValueError('Ожидается массив JSON')
+            position, started = position + 1, True
+            continue
+        if buffer[position] == ']':
+            return
+        try:
+            item, position = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            chunk = file.read(READ_SIZE)
+            if not chunk:
+                raise
+            buffer, position = buffer[position:] + chunk, 0
+            continue
+        try:
+            yield item['name'], item['measurement_unit']
+        except (KeyError, TypeError):
+            yield InvalidRow(
+                f'Элемент {item!r}: ожидаются name и measurement_unit'
+            )
+
+
+READERS = {'csv': read_csv, 'json': read_json}
+
+
+def clean_rows(rows, on_error):
+    """
+    Strip the values of the rows and drop the invalid ones.
+
+    Args:
+        rows (iterable): The rows produced by a reader.
+        on_error (callable): Called with the description of every
+        invalid row.
+
+    Yields:
+        tuple: The valid (name, measurement_unit) rows.
+    """
+    for row in rows:
+        if isinstance(row, InvalidRow):
+            on_error(str(row))
+            continue
+        name, unit = (str(value).strip() for value in row)
+        if not name or not unit:
+            on_error(f'Строка {row!r}: пустое значение')
+        elif (
+            len(name) > settings.MAX_INGREDIENT_NAME_LENGTH
+            or len(unit) > settings.MAX_INGREDIENT_MEASUREMENT_UNIT_LENGTH
+        ):
+            on_error(f'Строка {row!r}: слишком длинное значение')
+        else:
+            yield name, unit
+
+
+def batched(rows, size):
+    """
+    Split the rows into lists of at most `size` items.
+
+    Args:
+        rows (iterable): The rows.
+        size (int): The batch size.
+
+    Yields:
+        list: The batches.
+    """
+    rows = iter(rows)
+    batch = list(islice(rows, size))
+    while batch:
+        yield batch
+        batch = list(islice(rows, size))
+
+
+def insert_batches(rows, batch_size, progress=None):
+    """
+    Insert the rows in batches, skipping the existing ingredients.
+
+    Args:
+        rows (iterable): The (name, measurement_unit) rows.
+        batch_size (int): The number of rows per INSERT statement.
+        progress (callable): Called with the number of rows processed
+        after every batch (optional).
+
+    Returns:
+        int: The number of rows processed.
+    """
+    processed = 0
+    for batch in batched(rows, batch_size):
+        Ingredient.objects.bulk_create(
+            [
+                Ingredient(name=name, measurement_unit=unit)
+                for name, unit in batch
+            ],
+            ignore_conflicts=True,
+        )
+        processed += len(batch)
+        if progress is not None:
+            progress(processed)
+    return processed
+
+
+class CSVStream(io.RawIOBase):
+    """
+    A readable binary stream of the rows encoded as CSV, fed to `COPY`.
+
+    Args:
+        rows (iterable): The (name, measurement_unit) rows.
+        batch_size (int): The number of rows encoded at a time.
+        progress (callable): Called with the number of rows encoded
+        after every batch (optional).
+    """
+
+    def __init__(self, rows, batch_size, progress=None):
+        self.batches = batched(rows, batch_size)
+        self.progress = progress
+        self.processed = 0
+        self.buffer = b''
+
+    def readable(self):
+        return True
+
+    def readinto(self, target):
+        while not self.buffer:
+            batch = next(self.batches, None)
+            if batch is None:
+                return 0
+            output = io.StringIO()
+            csv.writer(output).writerows(batch)
+            self.buffer = output.getvalue().encode()
+            self.processed += len(batch)
+            if self.progress is not None:
+                self.progress(self.processed)
+        size = min(len(target), len(self.buffer))
+        target[:size] = self.buffer[:size]
+        self.buffer = self.buffer[size:]
+        return size
+
+
+def copy_rows(rows, batch_size, progress=None):
+    """
+    Copy the rows into a staging table and merge them into the
+    ingredient table, skipping the existing ingredients. PostgreSQL only.
+
+    Args:
+        rows (iterable): The (name, measurement_unit) rows.
+        batch_size (int): The number of rows encoded at a time.
+        progress (callable): Called with the number of rows processed
+        after every batch (optional).
+
+    Returns:
+        int: The number of rows processed.
+    """
+    table = connection.ops.quote_name(Ingredient._meta.db_table)
+    stream = CSVStream(rows, batch_size, progress)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'CREATE TEMPORARY TABLE ingredient_import '
+            '(name text, measurement_unit text) ON COMMIT DROP'
+        )
+        cursor.copy_expert(
+            'COPY ingredient_import FROM STDIN WITH (FORMAT csv)', stream
+        )
+        cursor.execute(
+            f'INSERT INTO {table} (name, measurement_unit) '
+            f'SELECT DISTINCT name, measurement_unit FROM ingredient_import '
+            f'ON CONFLICT (name, measurement_unit) DO NOTHING'
+        )
+    return stream.processed
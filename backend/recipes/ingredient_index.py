@@ -0,0 +1,128 @@
+"""
+In-memory prefix index for the ingredient autocomplete.
+
+The index is built lazily from the database on first use and is kept per
+process. It is rebuilt when the version of the `ingredients` cache
+namespace changes, which happens on every ingredient write.
+"""
+import re
+import threading
+from array import array
+from bisect import bisect_left
+
+from backend.cache import get_versions
+from recipes.models import Ingredient
+
+WORD_START_RE = re.compile(r'(?<=[\s\-(,./«"])\w')
+
+_lock = threading.Lock()
+_index = None
+_index_version = None
+
+
+class IngredientIndex:
+    """
+    Case-folded, sorted prefix index of ingredient names.
+
+    Entries are stored column-wise: ids and unit numbers in typed arrays,
+    the measurement units deduplicated in a tuple. Prefix lookups are
+    binary searches over the sorted case-folded names. A second sorted
+    list holds the name suffixes that start at inner words, so queries
+    also match e.g. "перец" in "черный перец".
+
+    Args:
+        rows (iterable): Tuples of (id, name, measurement_unit).
+    """
+
+    def __init__(self, rows):
+        units = {}
+        entries = sorted(
+            (name.casefold(), pk, name, units.setdefault(unit, len(units)))
+            for pk, name, unit in rows
+        )
+        self._keys = [entry[0] for entry in entries]
+        self._ids = array('q', (entry[1] for entry in entries))
+        self._names = [entry[2] for entry in entries]
+        self._unit_numbers = array('H', (entry[3] for entry in entries))
+        self._units = tuple(units)
+        word_entries = sorted(
+            (key[match.start():], position)
+            for position, key in enumerate(self._keys)
+            for match in WORD_START_RE.finditer(key)
+        )
+        self._word_keys = [entry[0] for entry in word_entries]
+        self._word_positions = array(
+            'l', (entry[1] for entry in word_entries)
+        )
+
+    def __len__(self):
+        return len(self._keys)
+
+    def _get_entry(self, position):
+        return {
+            'id': self._ids[position],
+            'name': self._names[position],
+            'measurement_unit': self._units[self._unit_numbers[position]],
+        }
+
+    def search(self, query, limit):
+        """
+        Find the ingredients matching a query.
+
+        Names starting with the query come first, in alphabetical order,
+        followed by names where an inner word starts with the query.
+
+        Args:
+            query (str): The search query.
+            limit (int): The maximum number of results.
+
+        Returns:
+            list: The matching ingredients as dicts with the `id`, `name`
+            and `measurement_unit` keys.
+        """
+        query = query.strip().casefold()
+        if not query or limit <= 0:
+            return []
+        positions = []
+        start = bisect_left(self._keys, query)
+        for position in range(start, len(self._keys)):
+            if len(positions) >= limit:
+                break
+            if not self._keys[position].startswith(query):
+                break
+            positions.append(position)
+        seen = set(positions)
+        start = bisect_left(self._word_keys, query)
+        for word_position in range(start, len(self._word_keys)):
+            if len(positions) >= limit:
+                break
+            if not self._word_keys[word_position].startswith(query):
+                break
+            position = self._word_positions[word_position]
+            if position not in seen:
+                seen.add(position)
+                positions.append(position)
+        return [self._get_entry(position) for position in positions]
+
+
+def get_ingredient_index():
+    """
+    Get the ingredient index of the process, building it on first use and
+    rebuilding it after ingredient writes.
+
+    Returns:
+        IngredientIndex: The up-to-date index.
+    """
+    global _index, _index_version
+    version = get_versions('ingredients')[0]
+    if _index is not None and _index_version == version:
+        return _index
+    with _lock:
+        if _index is None or _index_version != version:
+            _index = IngredientIndex(
+                Ingredient.objects.values_list(
+                    'id', 'name', 'measurement_unit'
+                ).iterator()
+            )
+            _index_version = version
+    return _index
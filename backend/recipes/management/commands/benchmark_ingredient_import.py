@@ -0,0 +1,106 @@
+import csv
+import io
+import json
+import os
+import tempfile
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+
+from recipes.ingredient_import import READERS
+
+
+class Command(BaseCommand):
+    help = (
+        'Measures the throughput of import_ingredients on a synthetic '
+        'file. The imports run in dry-run mode and are rolled back'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rows',
+            type=int,
+            default=1_000_000,
+            help='Number of rows in the synthetic file',
+        )
+        parser.add_argument(
+            '--formats',
+            nargs='+',
+            choices=READERS,
+            default=list(READERS),
+            help='File formats to measure',
+        )
+        parser.add_argument(
+            '--batch-sizes',
+            type=int,
+            nargs='+',
+            default=[1000, 5000],
+            help='Batch sizes to measure',
+        )
+        parser.add_argument(
+            '--copy',
+            action='store_true',
+            help='Also measure the COPY path (PostgreSQL only)',
+        )
+
+    def generate(self, directory, rows, file_format):
+        path = os.path.join(directory, f'ingredients.{file_format}')
+        with open(path, 'w', newline='', encoding='utf-8') as file:
+            if file_format == 'csv':
+                writer = csv.writer(file)
+                for number in range(rows):
+                    writer.writerow((f'ингредиент {number}', 'г'))
+            else:
+                file.write('[')
+                for number in range(rows):
+                    if number:
+                        file.write(', ')
+                    json.dump(
+                        {
+                            'name': f'ингредиент {number}',
+                            'measurement_unit': 'г',
+                        },
+                        file,
+                        ensure_ascii=False,
+                    )
+                file.write(']')
+        return path
+
+    def measure(self, rows, label, path, **options):
+        started = time.perf_counter()
+        call_command(
+            'import_ingredients',
+            path,
+            dry_run=True,
+            stdout=io.StringIO(),
+            **options,
+        )
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'{label:<28} {elapsed:7.1f} s, '
+                f'{rows / elapsed:9.0f} rows/s'
+            )
+        )
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        with tempfile.TemporaryDirectory() as directory:
+            for file_format in options['formats']:
+                path = self.generate(directory, rows, file_format)
+                size = os.path.getsize(path) / 1024 / 1024
+                self.stdout.write(
+                    f'{file_format}: {rows} rows, {size:.0f} MiB'
+                )
+                for batch_size in options['batch_sizes']:
+                    self.measure(
+                        rows,
+                        f'{file_format} batches of {batch_size}',
+                        path,
+                        batch_size=batch_size,
+                    )
+                if options['copy']:
+                    self.measure(
+                        rows, f'{file_format} COPY', path, copy=True
+                    )
@@ -0,0 +1,87 @@
+import random
+import statistics
+import time
+import tracemalloc
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.ingredient_index import IngredientIndex
+from recipes.models import Ingredient
+
+
+class Command(BaseCommand):
+    help = (
+        'Compares the in-memory ingredient index with the ORM '
+        '`istartswith` lookup on the ingredient autocomplete queries'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--queries',
+            type=int,
+            default=200,
+            help='Number of random autocomplete queries',
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=5, help='Runs of every query'
+        )
+        parser.add_argument('--seed', type=int, default=0)
+
+    def measure(self, func, queries, repeat):
+        timings = []
+        for query in queries:
+            for _ in range(repeat):
+                started = time.perf_counter()
+                func(query)
+                timings.append(time.perf_counter() - started)
+        timings.sort()
+        return (
+            statistics.mean(timings) * 1000,
+            timings[int(len(timings) * 0.95) - 1] * 1000,
+        )
+
+    def handle(self, *args, **options):
+        rows = list(
+            Ingredient.objects.values_list('id', 'name', 'measurement_unit')
+        )
+        if not rows:
+            raise CommandError(
+                'No ingredients found, run import_ingredients first'
+            )
+        rng = random.Random(options['seed'])
+        queries = []
+        for _ in range(options['queries']):
+            name = rng.choice(rows)[1]
+            queries.append(name[: rng.randint(1, min(4, len(name)))])
+        limit = settings.INGREDIENT_SEARCH_LIMIT
+
+        tracemalloc.start()
+        started = time.perf_counter()
+        index = IngredientIndex(rows)
+        build_time = (time.perf_counter() - started) * 1000
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        self.stdout.write(
+            f'Index of {len(index)} ingredients built in '
+            f'{build_time:.1f} ms, {memory / 1024:.0f} KiB'
+        )
+
+        def orm_search(query):
+            return list(
+                Ingredient.objects.filter(name__istartswith=query).values(
+                    'id', 'name', 'measurement_unit'
+                )
+            )
+
+        def index_search(query):
+            return index.search(query, limit)
+
+        for label, func in (('ORM', orm_search), ('index', index_search)):
+            mean, p95 = self.measure(func, queries, options['repeat'])
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f'{label:>6}: mean {mean:.3f} ms, p95 {p95:.3f} ms '
+                    f'per query'
+                )
+            )
@@ -0,0 +1,114 @@
+import base64
+import io
+import json
+import os
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import override_settings
+from PIL import Image
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from recipes.models import Ingredient, Tag
+from recipes.views import RecipeViewSet
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Measures the time and the peak Python heap of creating a recipe '
+        'with a large photo sent as base64 JSON and as multipart. The '
+        'recipes are rolled back'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--width', type=int, default=4000, help='Width of the photo'
+        )
+        parser.add_argument(
+            '--height', type=int, default=3000, help='Height of the photo'
+        )
+
+    def make_photo(self, width, height):
+        image = Image.frombytes(
+            'RGB', (width, height), os.urandom(width * height * 3)
+        )
+        output = io.BytesIO()
+        image.save(output, 'JPEG', quality=95)
+        return output.getvalue()
+
+    def measure(self, label, request, user):
+        force_authenticate(request, user=user)
+        view = RecipeViewSet.as_view({'post': 'create'})
+        tracemalloc.start()
+        started = time.perf_counter()
+        response = view(request)
+        elapsed = (time.perf_counter() - started) * 1000
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'{label:<10} {response.status_code} {elapsed:8.0f} ms, '
+                f'peak {peak / 1024 / 1024:6.1f} MiB'
+            )
+        )
+
+    def handle(self, *args, **options):
+        photo = self.make_photo(options['width'], options['height'])
+        self.stdout.write(f'Photo: {len(photo) / 1024 / 1024:.1f} MiB')
+        factory = APIRequestFactory()
+        with override_settings(ALLOWED_HOSTS=['testserver']):
+            with transaction.atomic():
+                user = User.objects.create_user(
+                    username='benchmark_upload',
+                    email='benchmark_upload@example.com',
+                    password='benchmark',
+                )
+                tag = Tag.objects.create(
+                    name='benchmark_upload',
+                    color='#000000',
+                    slug='benchmark_upload',
+                )
+                ingredient = Ingredient.objects.create(
+                    name='benchmark_upload', measurement_unit='г'
+                )
+                fields = {
+                    'text': 'text',
+                    'cooking_time': 10,
+                    'tags': [tag.pk],
+                    'ingredients': [{'id': ingredient.pk, 'amount': 1}],
+                }
+                image = base64.b64encode(photo).decode()
+                self.measure(
+                    'base64',
+                    factory.post(
+                        '/api/recipes/',
+                        {
+                            **fields,
+                            'name': 'benchmark base64',
+                            'image': f'data:image/jpeg;base64,{image}',
+                        },
+                        format='json',
+                    ),
+                    user,
+                )
+                del image
+                file = io.BytesIO(photo)
+                file.name = 'photo.jpg'
+                self.measure(
+                    'multipart',
+                    factory.post(
+                        '/api/recipes/',
+                        {
+                            'data': json.dumps(
+                                {**fields, 'name': 'benchmark multipart'}
+                            ),
+                            'image': file,
+                        },
+                        format='multipart',
+                    ),
+                    user,
+                )
+                transaction.set_rollback(True)
@@ -0,0 +1,101 @@
+import random
+import time
+import tracemalloc
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+
+from recipes.exports import EXPORT_FORMATS
+from recipes.pdf import ShoppingListPDF, register_fonts
+
+
+class Command(BaseCommand):
+    help = (
+        'Measures the render time and peak memory of the shopping list '
+        'exports for synthetic carts'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--recipes',
+            type=int,
+            nargs='+',
+            default=[10, 100, 1000],
+            help='Cart sizes (numbers of recipes) to render',
+        )
+        parser.add_argument(
+            '--ingredients-per-recipe',
+            type=int,
+            default=10,
+            help='Number of ingredients in every synthetic recipe',
+        )
+        parser.add_argument(
+            '--catalogue-size',
+            type=int,
+            default=2188,
+            help='Number of distinct ingredients to draw from',
+        )
+        parser.add_argument(
+            '--formats',
+            nargs='+',
+            choices=['pdf', *EXPORT_FORMATS],
+            default=['pdf', *EXPORT_FORMATS],
+            help='Export formats to measure',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+
+    def make_cart(self, rng, recipes, per_recipe, catalogue_size):
+        totals = Counter()
+        for _ in range(recipes):
+            for number in rng.sample(range(catalogue_size), per_recipe):
+                totals[number] += rng.randint(1, 500)
+        return [
+            (
+                f'ингредиент номер {number} с достаточно длинным названием',
+                'г',
+                amount,
+            )
+            for number, amount in sorted(totals.items())
+        ]
+
+    def render_pdf(self, renderer, items):
+        pdf = renderer.render_to_file(items)
+        size = pdf.seek(0, 2)
+        pdf.close()
+        return size
+
+    def render_text(self, export_format, items):
+        return sum(
+            len(chunk.encode())
+            for chunk in EXPORT_FORMATS[export_format].export(iter(items))
+        )
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        register_fonts()
+        renderer = ShoppingListPDF('Список покупок')
+        for recipes in options['recipes']:
+            items = self.make_cart(
+                rng,
+                recipes,
+                options['ingredients_per_recipe'],
+                options['catalogue_size'],
+            )
+            for export_format in options['formats']:
+                tracemalloc.start()
+                started = time.perf_counter()
+                if export_format == 'pdf':
+                    size = self.render_pdf(renderer, items)
+                else:
+                    size = self.render_text(export_format, items)
+                elapsed = (time.perf_counter() - started) * 1000
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                self.stdout.write(
+                    self.style.SUCCESS(
+                        f'{export_format:>4} {recipes:>5} recipes, '
+                        f'{len(items):>5} lines: {elapsed:8.1f} ms, '
+                        f'peak {peak / 1024:8.0f} KiB, '
+                        f'size {size / 1024:6.0f} KiB'
+                    )
+                )
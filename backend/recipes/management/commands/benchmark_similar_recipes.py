@@ -0,0 +1,113 @@
+import time
+import tracemalloc
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from recipes.similarity import METRICS, build_matrix, compute_neighbours
+
+
+class Command(BaseCommand):
+    help = (
+        'Measures the runtime and the peak memory of the similar recipes '
+        'computation on synthetic recipes. The database is not used'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--recipes',
+            type=int,
+            default=100_000,
+            help='Number of synthetic recipes',
+        )
+        parser.add_argument(
+            '--ingredients',
+            type=int,
+            default=2000,
+            help='Number of distinct ingredients',
+        )
+        parser.add_argument(
+            '--per-recipe',
+            type=int,
+            default=10,
+            help='Number of ingredients per recipe',
+        )
+        parser.add_argument(
+            '--neighbours',
+            type=int,
+            default=10,
+            help='Number of neighbours kept per recipe',
+        )
+        parser.add_argument(
+            '--max-share',
+            type=float,
+            default=settings.SIMILAR_RECIPES_MAX_INGREDIENT_SHARE,
+            help='Share of the recipes above which an ingredient is '
+            'left out as too common',
+        )
+        parser.add_argument(
+            '--metrics',
+            nargs='+',
+            choices=METRICS,
+            default=list(METRICS),
+            help='Similarity measures to measure',
+        )
+        parser.add_argument(
+            '--block-sizes',
+            type=int,
+            nargs='+',
+            default=[500, 2000],
+            help='Block sizes to measure',
+        )
+
+    def generate(self, recipes, ingredients, per_recipe):
+        """
+        Generate (recipe_id, ingredient_id) pairs with a skewed ingredient
+        popularity, so that common ingredients are shared by many recipes
+        as in a real catalogue.
+        """
+        generator = np.random.default_rng(0)
+        weights = 1 / np.arange(1, ingredients + 1)
+        ingredient_ids = generator.choice(
+            ingredients,
+            size=(recipes, per_recipe),
+            p=weights / weights.sum(),
+        )
+        recipe_ids = np.repeat(np.arange(recipes), per_recipe)
+        return np.column_stack((recipe_ids, ingredient_ids.ravel()))
+
+    def measure(self, matrix, metric, block_size, k):
+        tracemalloc.start()
+        started_at = time.perf_counter()
+        kept = 0
+        for _, (rows, _, _) in compute_neighbours(
+            matrix, np.arange(matrix.shape[0]), k, metric, block_size
+        ):
+            kept += len(rows)
+        elapsed = time.perf_counter() - started_at
+        peak = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+        tracemalloc.stop()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'{metric:<8} blocks of {block_size:<6} {elapsed:7.1f} s, '
+                f'peak {peak:7.0f} MiB, {kept} neighbours'
+            )
+        )
+
+    def handle(self, *args, **options):
+        pairs = self.generate(
+            options['recipes'], options['ingredients'], options['per_recipe']
+        )
+        started_at = time.perf_counter()
+        _, matrix = build_matrix(pairs, options['max_share'])
+        self.stdout.write(
+            f'{matrix.shape[0]} recipes × {matrix.shape[1]} ingredients, '
+            f'{matrix.nnz} entries, built in '
+            f'{time.perf_counter() - started_at:.1f} s'
+        )
+        for metric in options['metrics']:
+            for block_size in options['block_sizes']:
+                self.measure(
+                    matrix, metric, block_size, options['neighbours']
+                )
@@ -0,0 +1,146 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.models import Recipe, Tag
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Compares the join-based tag filter with the semi-join one on '
+        'a synthetic catalogue. The catalogue is rolled back'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--recipes',
+            type=int,
+            default=100_000,
+            help='Number of recipes in the synthetic catalogue',
+        )
+        parser.add_argument(
+            '--tags', type=int, default=30, help='Number of tags'
+        )
+        parser.add_argument(
+            '--tags-per-recipe',
+            type=int,
+            default=3,
+            help='Number of tags of every recipe',
+        )
+        parser.add_argument(
+            '--queries',
+            type=int,
+            default=50,
+            help='Number of random tag combinations per match mode',
+        )
+        parser.add_argument(
+            '--page-size',
+            type=int,
+            default=6,
+            help='Number of recipes fetched per query',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+
+    def seed(self, rng, recipes_count, tags_count, tags_per_recipe):
+        author = User.objects.create_user(
+            username='benchmark-tag-filter',
+            email='benchmark-tag-filter@example.com',
+            password='benchmark',
+        )
+        tags = Tag.objects.bulk_create(
+            Tag(
+                name=f'тег {number}',
+                color=f'#{number:06X}',
+                slug=f'benchmark-tag-{number}',
+            )
+            for number in range(tags_count)
+        )
+        tag_ids = [tag.pk for tag in tags]
+        batch_size = 5000
+        for start in range(0, recipes_count, batch_size):
+            recipes = Recipe.objects.bulk_create(
+                Recipe(
+                    author=author,
+                    name=f'benchmark recipe {number}',
+                    image='recipes/benchmark.png',
+                    text='benchmark',
+                    cooking_time=10,
+                )
+                for number in range(
+                    start, min(start + batch_size, recipes_count)
+                )
+            )
+            Recipe.tags.through.objects.bulk_create(
+                Recipe.tags.through(recipe_id=recipe.pk, tag_id=tag_id)
+                for recipe in recipes
+                for tag_id in rng.sample(tag_ids, tags_per_recipe)
+            )
+        return {tag.slug: tag.pk for tag in tags}
+
+    def join_filter(self, slugs, match_all):
+        queryset = Recipe.objects.all()
+        if match_all:
+            for slug in slugs:
+                queryset = queryset.filter(tags__slug=slug)
+            return queryset
+        return queryset.filter(tags__slug__in=slugs).distinct()
+
+    def semi_join_filter(self, slugs, match_all):
+        return Recipe.objects.tagged(
+            [self.tag_map[slug] for slug in slugs], match_all=match_all
+        )
+
+    def measure(self, build, combinations, match_all, page_size):
+        timings = []
+        for slugs in combinations:
+            started = time.perf_counter()
+            queryset = build(slugs, match_all)
+            queryset.count()
+            list(queryset.order_by('name', 'id')[:page_size])
+            timings.append(time.perf_counter() - started)
+        timings.sort()
+        return (
+            statistics.mean(timings) * 1000,
+            timings[int(len(timings) * 0.95) - 1] * 1000,
+        )
+
+    def handle(self, *args, **options):
+        tags_per_recipe = min(options['tags_per_recipe'], options['tags'])
+        rng = random.Random(options['seed'])
+        with transaction.atomic():
+            started = time.perf_counter()
+            # The same slug map as `get_tag_map`, which can't see the
+            # uncommitted tags.
+            self.tag_map = self.seed(
+                rng, options['recipes'], options['tags'], tags_per_recipe
+            )
+            slugs = list(self.tag_map)
+            self.stdout.write(
+                f'Seeded {options["recipes"]} recipes with '
+                f'{tags_per_recipe} of {len(slugs)} tags in '
+                f'{time.perf_counter() - started:.1f} s'
+            )
+            combinations = [
+                rng.sample(slugs, rng.randint(1, min(3, len(slugs))))
+                for _ in range(options['queries'])
+            ]
+            for match_all in (False, True):
+                for label, build in (
+                    ('join', self.join_filter),
+                    ('semi-join', self.semi_join_filter),
+                ):
+                    mean, p95 = self.measure(
+                        build, combinations, match_all, options['page_size']
+                    )
+                    self.stdout.write(
+                        self.style.SUCCESS(
+                            f'{"all" if match_all else "any":>3} '
+                            f'{label:>9}: mean {mean:.2f} ms, '
+                            f'p95 {p95:.2f} ms per query'
+                        )
+                    )
+            transaction.set_rollback(True)
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from recipes.models import ExportJob
+
+
+class Command(BaseCommand):
+    help = 'Deletes the expired shopping cart export jobs and their files'
+
+    def handle(self, *args, **options):
+        deleted = ExportJob.objects.expired().delete_with_files()
+        self.stdout.write(
+            self.style.SUCCESS(f'Deleted {deleted} expired export jobs')
+        )
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+
+from recipes.images import generate_renditions, needs_renditions
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = (
+        'Generates the missing renditions of the recipe images. Recipes '
+        'whose renditions are up to date are skipped, so an interrupted '
+        'run can be resumed by running the command again'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=500,
+            help='Number of recipes read from the database at a time',
+        )
+
+    def handle(self, *args, **options):
+        recipes = (
+            Recipe.objects.only('pk', 'image', 'image_renditions')
+            .order_by('pk')
+            .iterator(chunk_size=options['chunk_size'])
+        )
+        generated = skipped = failed = 0
+        for recipe in recipes:
+            if not needs_renditions(recipe):
+                skipped += 1
+                continue
+            try:
+                generate_renditions(recipe.pk)
+            except Exception as error:
+                failed += 1
+                self.stderr.write(
+                    self.style.WARNING(f'Recipe {recipe.pk}: {error}')
+                )
+                continue
+            generated += 1
+            if generated % 100 == 0:
+                self.stdout.write(f'{generated} recipes processed')
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Generated renditions for {generated} recipes, '
+                f'{skipped} up to date, {failed} failed'
+            )
+        )
@@ -1,35 +1,111 @@
-import csv
+import os
+import time
 
 from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
 
+from backend.cache import bump_version
+from recipes.ingredient_import import (READERS, clean_rows, copy_rows,
+                                       insert_batches)
 from recipes.models import Ingredient
 
+MAX_REPORTED_ERRORS = 10
+
 
 class Command(BaseCommand):
-    help = 'Imports ingredients from a CSV file'
+    help = (
+        'Imports ingredients from a CSV or JSON file, skipping the '
+        'ingredients that already exist'
+    )
 
     def add_arguments(self, parser):
         parser.add_argument(
-            'csv_file', nargs=1, type=str, help='Path to the CSV file'
+            'file', type=str, help='Path to the CSV or JSON file'
+        )
+        parser.add_argument(
+            '--format',
+            choices=READERS,
+            help='Format of the file, detected by its extension by default',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Number of rows inserted per statement',
+        )
+        parser.add_argument(
+            '--copy',
+            action='store_true',
+            help='Load the rows with COPY through a staging table '
+            '(PostgreSQL only)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Import in a transaction that is rolled back',
+        )
+
+    def get_format(self, file_path, file_format):
+        if file_format:
+            return file_format
+        extension = os.path.splitext(file_path)[1].lstrip('.').lower()
+        if extension not in READERS:
+            raise CommandError(
+                f'Unknown format of {file_path}, use --format'
+            )
+        return extension
+
+    def report_error(self, error):
+        self.errors += 1
+        if self.errors <= MAX_REPORTED_ERRORS:
+            self.stderr.write(self.style.WARNING(f'Skipped: {error}'))
+
+    def report_progress(self, processed):
+        now = time.perf_counter()
+        if now - self.reported_at < 1:
+            return
+        self.reported_at = now
+        self.stdout.write(
+            f'{processed} rows, '
+            f'{processed / (now - self.started_at):.0f} rows/s'
         )
 
     def handle(self, *args, **options):
-        file_path = options['csv_file'][0]
+        file_path = options['file']
+        read = READERS[self.get_format(file_path, options['format'])]
+        if options['copy'] and connection.vendor != 'postgresql':
+            raise CommandError('--copy requires PostgreSQL')
+        load = copy_rows if options['copy'] else insert_batches
+        self.errors = 0
+        self.started_at = self.reported_at = time.perf_counter()
 
         try:
-            with open(file_path, newline='', encoding='utf-8') as csvfile:
-                reader = csv.reader(csvfile)
-                for row in reader:
-                    ingredient_name, measurement_unit = row
-                    Ingredient.objects.create(
-                        name=ingredient_name, measurement_unit=measurement_unit
-                    )
-                    self.stdout.write(
-                        self.style.SUCCESS(
-                            f'Successfully '
-                            f'imported "'
-                            f'{ingredient_name}"'
-                        )
+            with open(file_path, newline='', encoding='utf-8') as file:
+                with transaction.atomic():
+                    existing = Ingredient.objects.count()
+                    processed = load(
+                        clean_rows(read(file), self.report_error),
+                        options['batch_size'],
+                        self.report_progress,
                     )
+                    inserted = Ingredient.objects.count() - existing
+                    if options['dry_run']:
+                        transaction.set_rollback(True)
+                    elif inserted:
+                        bump_version('ingredients')
         except FileNotFoundError:
             raise CommandError(f'File {file_path} does not exist')
+        except (UnicodeDecodeError, ValueError) as error:
+            raise CommandError(f'Failed to read {file_path}: {error}')
+
+        elapsed = time.perf_counter() - self.started_at
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'{"Would import" if options["dry_run"] else "Imported"} '
+                f'{inserted} new ingredients out of {processed} rows, '
+                f'{processed - inserted} duplicates or existing, '
+                f'{self.errors} invalid rows skipped, '
+                f'in {elapsed:.1f} s '
+                f'({processed / max(elapsed, 1e-9):.0f} rows/s)'
+            )
+        )
@@ -0,0 +1,94 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.models import ShoppingCartIngredient
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuilds the aggregated shopping cart ingredients from the '
+        'shopping carts, or verifies them with --verify'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Only report the users whose aggregate has drifted',
+        )
+        parser.add_argument(
+            '--user',
+            type=int,
+            help='Id of the only user to process',
+        )
+
+    def get_stored(self, user):
+        rows = ShoppingCartIngredient.objects.all()
+        if user is not None:
+            rows = rows.filter(user=user)
+        return {
+            (user_id, ingredient_id): (total_amount, recipe_count)
+            for user_id, ingredient_id, total_amount, recipe_count in (
+                rows.values_list(
+                    'user_id', 'ingredient_id', 'total_amount', 'recipe_count'
+                )
+            )
+        }
+
+    def get_live(self, user):
+        return {
+            (row['user'], row['ingredient']): (
+                row['total_amount'],
+                row['recipe_count'],
+            )
+            for row in ShoppingCartIngredient.objects.live_totals(user)
+        }
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user'] is not None:
+            user = User.objects.get(pk=options['user'])
+        if options['verify']:
+            stored, live = self.get_stored(user), self.get_live(user)
+            drifted = sorted(
+                {
+                    user_id
+                    for user_id, ingredient_id in stored.keys() | live.keys()
+                    if stored.get((user_id, ingredient_id))
+                    != live.get((user_id, ingredient_id))
+                }
+            )
+            if drifted:
+                self.stdout.write(
+                    self.style.ERROR(
+                        f'Drifted aggregates of {len(drifted)} users: '
+                        + ', '.join(map(str, drifted))
+                    )
+                )
+            else:
+                self.stdout.write(self.style.SUCCESS('Aggregates are in sync'))
+            return
+        with transaction.atomic():
+            rows = ShoppingCartIngredient.objects.all()
+            if user is not None:
+                rows = rows.filter(user=user)
+            rows.delete()
+            created = ShoppingCartIngredient.objects.bulk_create(
+                (
+                    ShoppingCartIngredient(
+                        user_id=user_id,
+                        ingredient_id=ingredient_id,
+                        total_amount=total_amount,
+                        recipe_count=recipe_count,
+                    )
+                    for (user_id, ingredient_id), (
+                        total_amount,
+                        recipe_count,
+                    ) in self.get_live(user).items()
+                ),
+                batch_size=1000,
+            )
+        self.stdout.write(
+            self.style.SUCCESS(f'Rebuilt {len(created)} aggregate rows')
+        )
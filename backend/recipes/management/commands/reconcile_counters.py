@@ -0,0 +1,76 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.models import Favorite, Recipe, ShoppingList
+from users.models import Subscription, User
+
+COUNTERS = (
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'followers_count', Subscription, 'following'),
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (Recipe, 'in_carts_count', ShoppingList, 'recipe'),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Recounts the denormalized counters of the users and the recipes '
+        'and fixes the drifted ones, or only reports them with --verify'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Only report the number of drifted counters',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of drifted rows fixed per statement',
+        )
+
+    def get_live_count(self, counted_model, field):
+        return Coalesce(
+            Subquery(
+                counted_model.objects.filter(**{field: OuterRef('pk')})
+                .order_by()
+                .values(field)
+                .annotate(count=Count('pk'))
+                .values('count')
+            ),
+            0,
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        drifted_total = 0
+        for model, counter, counted_model, field in COUNTERS:
+            live_count = self.get_live_count(counted_model, field)
+            drifted = list(
+                model.objects.annotate(live_count=live_count)
+                .exclude(**{counter: F('live_count')})
+                .order_by()
+                .values_list('pk', flat=True)
+            )
+            drifted_total += len(drifted)
+            if not options['verify']:
+                for start in range(0, len(drifted), batch_size):
+                    model.objects.filter(
+                        pk__in=drifted[start: start + batch_size]
+                    ).update(**{counter: live_count})
+            self.stdout.write(
+                f'{model.__name__}.{counter}: {len(drifted)} drifted'
+            )
+        if options['verify'] and drifted_total:
+            self.stdout.write(
+                self.style.ERROR(f'{drifted_total} counters have drifted')
+            )
+        elif options['verify']:
+            self.stdout.write(self.style.SUCCESS('Counters are in sync'))
+        else:
+            self.stdout.write(
+                self.style.SUCCESS(f'Fixed {drifted_total} counters')
+            )
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from recipes.popularity import update_popularity_scores
+
+
+class Command(BaseCommand):
+    help = (
+        'Recomputes the time-decayed popularity scores of the recipes '
+        'from the recent favorites and shopping cart additions'
+    )
+
+    def handle(self, *args, **options):
+        updated = update_popularity_scores()
+        self.stdout.write(
+            self.style.SUCCESS(f'Updated the scores of {updated} recipes')
+        )
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from recipes.models import Recipe
+from recipes.search import is_full_text_search_supported, update_search_vectors
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the full-text search vectors of the recipes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of recipes updated per statement',
+        )
+
+    def handle(self, *args, **options):
+        if not is_full_text_search_supported():
+            self.stdout.write(
+                self.style.WARNING(
+                    'Full-text search requires PostgreSQL, nothing to do'
+                )
+            )
+            return
+        batch_size = options['batch_size']
+        ids = list(Recipe.objects.order_by('pk').values_list('pk', flat=True))
+        updated = 0
+        for start in range(0, len(ids), batch_size):
+            updated += update_search_vectors(
+                Recipe.objects.filter(pk__in=ids[start:start + batch_size])
+            )
+        self.stdout.write(
+            self.style.SUCCESS(f'Updated {updated} search vectors')
+        )
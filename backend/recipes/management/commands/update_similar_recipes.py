@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipes.similarity import update_similar_recipes
+
+
+class Command(BaseCommand):
+    help = (
+        'Recomputes the similar recipes of the recipes whose ingredients '
+        'have changed, or of all the recipes with --full'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Recompute all the recipes',
+        )
+        parser.add_argument(
+            '--block-size',
+            type=int,
+            default=1000,
+            help='Number of recipes compared to all the others at a time',
+        )
+
+    def report_progress(self, computed):
+        self.stdout.write(f'{computed} recipes computed')
+
+    def handle(self, *args, **options):
+        started_at = time.perf_counter()
+        updated = update_similar_recipes(
+            options['full'], options['block_size'], self.report_progress
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Recomputed similar recipes for {updated} recipes '
+                f'in {time.perf_counter() - started_at:.1f} s'
+            )
+        )
@@ -0,0 +1,48 @@
+"""
+PostgreSQL-only indexes of the recipe search.
+
+The GIN indexes of the search vector and of the name trigrams (which
+need the `pg_trgm` extension) only exist on PostgreSQL, so they are not
+declared in `Recipe.Meta.indexes`, which must not depend on the database
+the migrations are generated against, and are created here instead.
+"""
+from django.db import migrations
+
+INDEXES = (
+    (
+        'recipe_search_vector_idx',
+        'CREATE INDEX IF NOT EXISTS recipe_search_vector_idx '
+        'ON recipes_recipe USING gin (search_vector)',
+    ),
+    (
+        'recipe_name_trgm_idx',
+        'CREATE INDEX IF NOT EXISTS recipe_name_trgm_idx '
+        'ON recipes_recipe USING gin (name gin_trgm_ops)',
+    ),
+)
+
+
+def create_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for _, sql in INDEXES:
+        schema_editor.execute(sql)
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, _ in INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0004_recipe_search_vector'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
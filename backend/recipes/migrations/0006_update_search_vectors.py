@@ -0,0 +1,32 @@
+"""
+Fill the search vectors of the recipes saved before they were
+maintained.
+"""
+from django.conf import settings
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+
+
+def update_search_vectors(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Recipe.objects.using(schema_editor.connection.alias).filter(
+        search_vector=None
+    ).update(
+        search_vector=SearchVector(
+            'name', weight='A', config=settings.SEARCH_CONFIG
+        )
+        + SearchVector('text', weight='B', config=settings.SEARCH_CONFIG)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_search_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(update_search_vectors, migrations.RunPython.noop),
+    ]
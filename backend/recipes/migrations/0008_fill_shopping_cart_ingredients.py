@@ -0,0 +1,50 @@
+"""
+Fill the aggregated shopping cart ingredients of the shopping carts
+filled before the aggregate was maintained.
+"""
+from django.db import migrations
+from django.db.models import Count, F, Sum
+
+
+def fill_shopping_cart_ingredients(apps, schema_editor):
+    alias = schema_editor.connection.alias
+    ShoppingList = apps.get_model('recipes', 'ShoppingList')
+    ShoppingCartIngredient = apps.get_model(
+        'recipes', 'ShoppingCartIngredient'
+    )
+    ShoppingCartIngredient.objects.using(alias).all().delete()
+    totals = (
+        ShoppingList.objects.using(alias)
+        .filter(recipe__recipes__isnull=False)
+        .values('user', ingredient=F('recipe__recipes__ingredient'))
+        .annotate(
+            total_amount=Sum('recipe__recipes__amount'),
+            recipe_count=Count('recipe', distinct=True),
+        )
+        .order_by()
+    )
+    ShoppingCartIngredient.objects.using(alias).bulk_create(
+        (
+            ShoppingCartIngredient(
+                user_id=row['user'],
+                ingredient_id=row['ingredient'],
+                total_amount=row['total_amount'],
+                recipe_count=row['recipe_count'],
+            )
+            for row in totals.iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_shoppingcartingredient'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            fill_shopping_cart_ingredients, migrations.RunPython.noop
+        ),
+    ]
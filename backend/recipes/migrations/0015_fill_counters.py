@@ -0,0 +1,50 @@
+"""
+Fill the denormalized counters of the users and the recipes created
+before they were maintained.
+"""
+from django.db import migrations
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+COUNTERS = (
+    ('users', 'User', 'recipes_count', 'recipes', 'Recipe', 'author'),
+    ('users', 'User', 'followers_count', 'users', 'Subscription', 'following'),
+    ('recipes', 'Recipe', 'favorites_count', 'recipes', 'Favorite', 'recipe'),
+    ('recipes', 'Recipe', 'in_carts_count', 'recipes', 'ShoppingList',
+     'recipe'),
+)
+
+
+def fill_counters(apps, schema_editor):
+    alias = schema_editor.connection.alias
+    for app_label, model_name, counter, *counted, field in COUNTERS:
+        model = apps.get_model(app_label, model_name)
+        counted_model = apps.get_model(*counted)
+        model.objects.using(alias).update(
+            **{
+                counter: Coalesce(
+                    Subquery(
+                        counted_model.objects.filter(
+                            **{field: OuterRef('pk')}
+                        )
+                        .order_by()
+                        .values(field)
+                        .annotate(count=Count('pk'))
+                        .values('count')
+                    ),
+                    0,
+                )
+            }
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0014_recipe_counters'),
+        ('users', '0003_user_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,14 @@
+from datetime import timedelta
+
 from django.conf import settings
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MaxValueValidator, MinValueValidator
-from django.db import models
+from django.db import connections, models, transaction
+from django.db.models import (Count, Exists, F, OuterRef, Prefetch, Q, Sum,
+                              Value)
+from django.utils import timezone
+
+from users.models import User
 
 
 class Ingredient(models.Model):
@@ -63,6 +71,94 @@ class Tag(models.Model):
         return self.name
 
 
+class RecipeQuerySet(models.QuerySet):
+    """
+    QuerySet for the Recipe model.
+
+    Provides helpers that load everything the recipe serializers need
+    in a fixed number of queries, independent of the page size.
+    """
+
+    def with_user_flags(self, user):
+        """
+        Annotate the queryset with per-user ``is_favorited`` and
+        ``is_in_shopping_cart`` flags.
+
+        Args:
+            user (User): The user making the request.
+
+        Returns:
+            QuerySet: The annotated queryset.
+        """
+        if user.is_anonymous:
+            return self.annotate(
+                is_favorited=Value(False),
+                is_in_shopping_cart=Value(False),
+            )
+        return self.annotate(
+            is_favorited=Exists(
+                Favorite.objects.filter(user=user, recipe=OuterRef('pk'))
+            ),
+            is_in_shopping_cart=Exists(
+                ShoppingList.objects.filter(user=user, recipe=OuterRef('pk'))
+            ),
+        )
+
+    def tagged(self, tag_ids, match_all=False):
+        """
+        Filter the recipes by tags.
+
+        Every condition is a semi-join (``id IN (SELECT recipe_id ...)``)
+        on the recipe tags table, looked up by its ``tag_id`` index, so no
+        join multiplies the rows and no ``DISTINCT`` is needed. The
+        subqueries don't depend on the outer row, which lets the planner
+        start from the tagged recipes instead of probing every recipe.
+
+        Args:
+            tag_ids (list): The ids of the tags.
+            match_all (bool): Whether the recipes must have all the tags
+            instead of any of them.
+
+        Returns:
+            QuerySet: The filtered queryset.
+        """
+        recipe_tags = Recipe.tags.through.objects.values('recipe_id')
+        if match_all:
+            return self.filter(
+                *(
+                    Q(pk__in=recipe_tags.filter(tag_id=tag_id))
+                    for tag_id in tag_ids
+                )
+            )
+        return self.filter(pk__in=recipe_tags.filter(tag_id__in=tag_ids))
+
+    def for_user(self, user):
+        """
+        Prepare the queryset for full recipe serialization.
+
+        Annotates the user flags and prefetches the author (with the
+        ``is_subscribed`` flag), tags and ingredients.
+
+        Args:
+            user (User): The user making the request.
+
+        Returns:
+            QuerySet: The prepared queryset.
+        """
+        return self.with_user_flags(user).prefetch_related(
+            Prefetch(
+                'author', queryset=User.objects.with_is_subscribed(user)
+            ),
+            'tags',
+            Prefetch(
+                'recipes',
+                queryset=RecipeIngredient.objects.select_related(
+                    'ingredient'
+                ),
+            ),
+        )
+
+
 class Recipe(models.Model):
     """
     Model representing a recipe.
@@ -75,6 +171,20 @@ class Recipe(models.Model):
         ingredients (ManyToManyField): The ingredients used in the recipe.
         tags (ManyToManyField): The tags associated with the recipe.
         cooking_time (int): The cooking time of the recipe in minutes.
+        created_at (datetime): The publication time of the recipe.
+        updated_at (datetime): The time of the last change of the recipe.
+        search_vector (SearchVectorField): The full-text search vector
+        of the name and the description (PostgreSQL only).
+        image_renditions (dict): The storage names of the image renditions
+        and of the image they were generated from.
+        similar_recipes_stale (bool): Whether the ingredients have changed
+        since the similar recipes were computed.
+        popularity_score (float): The time-decayed number of recent
+        additions to favorites and shopping carts.
+        favorites_count (int): The number of users who have favorited
+        the recipe.
+        in_carts_count (int): The number of shopping carts containing
+        the recipe.
     """
 
     author = models.ForeignKey(
@@ -113,12 +223,63 @@ class Recipe(models.Model):
             ),
         ],
     )
+    created_at = models.DateTimeField(
+        default=timezone.now,
+        db_index=True,
+        verbose_name='Дата публикации',
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения',
+    )
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False,
+        verbose_name='Поисковый вектор',
+    )
+    image_renditions = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name='Варианты изображения',
+    )
+    similar_recipes_stale = models.BooleanField(
+        default=True,
+        editable=False,
+        db_index=True,
+        verbose_name='Похожие рецепты устарели',
+    )
+    popularity_score = models.FloatField(
+        default=0,
+        editable=False,
+        verbose_name='Популярность',
+    )
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='В избранном',
+    )
+    in_carts_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='В списках покупок',
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         default_related_name = 'recipes'
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ('name',)
+        # The GIN indexes of the search are PostgreSQL-only and are
+        # created by the `0003_search_indexes` migration.
+        indexes = [
+            models.Index(
+                fields=('-popularity_score', '-id'),
+                name='recipe_popularity_idx',
+            ),
+        ]
 
     def __str__(self):
         return f'{self.name} - {self.author}'
@@ -171,6 +332,96 @@ class RecipeIngredient(models.Model):
         )
 
 
+class UserRelatedManager(models.Manager):
+    """
+    Manager that adds and removes many recipes of a user at once, each
+    with a single statement reporting the rows it has changed, and keeps
+    the counters of the recipes in sync in the same transaction.
+    """
+
+    def update_counters(self, recipe_ids, delta):
+        """
+        Add a delta to the counter of the model (`counter_field`) of
+        the recipes. Counters that have drifted below the delta are not
+        decremented.
+
+        Args:
+            recipe_ids (set): The ids of the recipes.
+            delta (int): The change of the counters.
+        """
+        if recipe_ids:
+            field = self.model.counter_field
+            Recipe.objects.filter(
+                pk__in=recipe_ids, **{f'{field}__gte': -delta}
+            ).update(**{field: F(field) + delta})
+
+    def add_recipes(self, user, recipe_ids):
+        """
+        Add recipes for a user, skipping the ones already added.
+
+        Args:
+            user (User): The user.
+            recipe_ids (list): The ids of existing recipes.
+
+        Returns:
+            set: The ids of the recipes that have been added.
+        """
+        if not recipe_ids:
+            return set()
+        quote_name = connections[self.db].ops.quote_name
+        table = quote_name(self.model._meta.db_table)
+        recipes = quote_name(Recipe._meta.db_table)
+        placeholders = ', '.join(['%s'] * len(recipe_ids))
+        with transaction.atomic(using=self.db):
+            with connections[self.db].cursor() as cursor:
+                cursor.execute(
+                    f'INSERT INTO {table} (user_id, recipe_id, created_at) '
+                    f'SELECT %s, id, %s FROM {recipes} '
+                    f'WHERE id IN ({placeholders}) '
+                    f'ON CONFLICT (user_id, recipe_id) DO NOTHING '
+                    f'RETURNING recipe_id',
+                    [
+                        user.pk,
+                        connections[self.db].ops.adapt_datetimefield_value(
+                            timezone.now()
+                        ),
+                        *recipe_ids,
+                    ],
+                )
+                added = {recipe_id for recipe_id, in cursor.fetchall()}
+            self.update_counters(added, 1)
+        return added
+
+    def remove_recipes(self, user, recipe_ids):
+        """
+        Remove recipes of a user.
+
+        Args:
+            user (User): The user.
+            recipe_ids (list): The ids of the recipes.
+
+        Returns:
+            set: The ids of the recipes that have been removed.
+        """
+        if not recipe_ids:
+            return set()
+        table = connections[self.db].ops.quote_name(
+            self.model._meta.db_table
+        )
+        placeholders = ', '.join(['%s'] * len(recipe_ids))
+        with transaction.atomic(using=self.db):
+            with connections[self.db].cursor() as cursor:
+                cursor.execute(
+                    f'DELETE FROM {table} '
+                    f'WHERE user_id = %s AND recipe_id IN ({placeholders}) '
+                    f'RETURNING recipe_id',
+                    [user.pk, *recipe_ids],
+                )
+                removed = {recipe_id for recipe_id, in cursor.fetchall()}
+            self.update_counters(removed, -1)
+        return removed
+
+
 class UserRelatedModel(models.Model):
     """
     Abstract base model representing a user-related model.
@@ -178,6 +429,10 @@ class UserRelatedModel(models.Model):
     Attributes:
         user (User): The user associated with the model instance.
         recipe (Recipe): The related recipe instance.
+        created_at (datetime): The time the recipe has been added.
+        counter_target (str): The foreign key to the recipe whose counter
+        the instances are counted in.
+        counter_field (str): The counter field of the recipe.
     """
 
     user = models.ForeignKey(
@@ -188,6 +443,16 @@ class UserRelatedModel(models.Model):
         Recipe,
         on_delete=models.CASCADE,
     )
+    created_at = models.DateTimeField(
+        default=timezone.now,
+        db_index=True,
+        verbose_name='Дата добавления',
+    )
+
+    objects = UserRelatedManager()
+
+    counter_target = 'recipe'
+    counter_field = None
 
     class Meta:
         abstract = True
@@ -209,6 +474,8 @@ class Favorite(UserRelatedModel):
     Inherits from UserRelatedModel.
     """
 
+    counter_field = 'favorites_count'
+
     class Meta(UserRelatedModel.Meta):
         verbose_name = 'избранное'
         verbose_name_plural = 'избранные'
@@ -221,6 +488,464 @@ class ShoppingList(UserRelatedModel):
     Inherits from UserRelatedModel.
     """
 
+    counter_field = 'in_carts_count'
+
     class Meta(UserRelatedModel.Meta):
         verbose_name = 'список покупок'
         verbose_name_plural = 'списки покупок'
+
+
+class ShoppingCartIngredientManager(models.Manager):
+    """
+    Manager that keeps the aggregated shopping cart ingredients in sync
+    with the shopping carts and the recipe ingredients.
+
+    Changes are merged with a single `INSERT ... ON CONFLICT DO UPDATE`
+    statement that adds the (possibly negative) deltas to the existing
+    rows, followed by the removal of the rows no recipe contributes to.
+    """
+
+    def _merge(self, select_sql, params, users_sql, users_params):
+        """
+        Merge the rows returned by a SELECT into the aggregate.
+
+        Args:
+            select_sql (str): A SELECT returning (user_id, ingredient_id,
+            amount delta, recipe count delta) rows.
+            params (list): The parameters of the SELECT.
+            users_sql (str): A subquery returning the ids of the users
+            whose rows may have been emptied.
+            users_params (list): The parameters of the subquery.
+        """
+        connection = connections[self.db]
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} '
+                f'(user_id, ingredient_id, total_amount, recipe_count) '
+                f'{select_sql} '
+                f'ON CONFLICT (user_id, ingredient_id) DO UPDATE SET '
+                f'total_amount = {table}.total_amount '
+                f'+ EXCLUDED.total_amount, '
+                f'recipe_count = {table}.recipe_count '
+                f'+ EXCLUDED.recipe_count',
+                params,
+            )
+            cursor.execute(
+                f'DELETE FROM {table} '
+                f'WHERE recipe_count <= 0 AND user_id IN ({users_sql})',
+                users_params,
+            )
+
+    def _change_recipes(self, user, recipe_ids, sign):
+        recipe_ids = list(recipe_ids)
+        if not recipe_ids:
+            return
+        placeholders = ', '.join(['%s'] * len(recipe_ids))
+        recipe_ingredients = connections[self.db].ops.quote_name(
+            RecipeIngredient._meta.db_table
+        )
+        self._merge(
+            f'SELECT %s, ingredient_id, SUM(amount) * %s, '
+            f'COUNT(DISTINCT recipe_id) * %s '
+            f'FROM {recipe_ingredients} '
+            f'WHERE recipe_id IN ({placeholders}) '
+            f'GROUP BY ingredient_id',
+            [user.pk, sign, sign, *recipe_ids],
+            '%s',
+            [user.pk],
+        )
+
+    def add_recipes(self, user, recipe_ids):
+        """
+        Add the ingredients of recipes put into a user's shopping cart.
+
+        Args:
+            user (User): The owner of the shopping cart.
+            recipe_ids (iterable): The ids of the added recipes.
+        """
+        self._change_recipes(user, recipe_ids, 1)
+
+    def remove_recipes(self, user, recipe_ids):
+        """
+        Subtract the ingredients of recipes removed from a user's
+        shopping cart.
+
+        Args:
+            user (User): The owner of the shopping cart.
+            recipe_ids (iterable): The ids of the removed recipes.
+        """
+        self._change_recipes(user, recipe_ids, -1)
+
+    def change_recipe_ingredients(self, recipe, old_amounts, new_amounts):
+        """
+        Apply a change of a recipe's ingredients to every shopping cart
+        containing the recipe.
+
+        Args:
+            recipe (Recipe): The changed recipe.
+            old_amounts (dict): The previous amounts by ingredient id.
+            new_amounts (dict): The new amounts by ingredient id.
+        """
+        deltas = []
+        for ingredient_id in old_amounts.keys() | new_amounts.keys():
+            amount = new_amounts.get(ingredient_id, 0) - old_amounts.get(
+                ingredient_id, 0
+            )
+            count = (ingredient_id in new_amounts) - (
+                ingredient_id in old_amounts
+            )
+            if amount or count:
+                deltas.append((ingredient_id, amount, count))
+        if not deltas:
+            return
+        shopping_lists = connections[self.db].ops.quote_name(
+            ShoppingList._meta.db_table
+        )
+        values = ', '.join(['(%s, %s, %s)'] * len(deltas))
+        self._merge(
+            f'SELECT s.user_id, d.column1, d.column2, d.column3 '
+            f'FROM {shopping_lists} s CROSS JOIN (VALUES {values}) d '
+            f'WHERE s.recipe_id = %s',
+            [value for delta in deltas for value in delta] + [recipe.pk],
+            f'SELECT user_id FROM {shopping_lists} WHERE recipe_id = %s',
+            [recipe.pk],
+        )
+
+    def remove_recipe_everywhere(self, recipe):
+        """
+        Subtract the ingredients of a recipe from every shopping cart
+        containing it, e.g. before the recipe is deleted.
+
+        Args:
+            recipe (Recipe): The recipe.
+        """
+        quote_name = connections[self.db].ops.quote_name
+        shopping_lists = quote_name(ShoppingList._meta.db_table)
+        recipe_ingredients = quote_name(RecipeIngredient._meta.db_table)
+        self._merge(
+            f'SELECT s.user_id, ri.ingredient_id, -SUM(ri.amount), -1 '
+            f'FROM {shopping_lists} s '
+            f'JOIN {recipe_ingredients} ri ON ri.recipe_id = s.recipe_id '
+            f'WHERE s.recipe_id = %s '
+            f'GROUP BY s.user_id, ri.ingredient_id',
+            [recipe.pk],
+            f'SELECT user_id FROM {shopping_lists} WHERE recipe_id = %s',
+            [recipe.pk],
+        )
+
+    def live_totals(self, user=None):
+        """
+        Compute the aggregate from the shopping carts and the recipe
+        ingredients.
+
+        Args:
+            user (User): Limit the computation to one user (optional).
+
+        Returns:
+            QuerySet: Dicts with the `user`, `ingredient`, `total_amount`
+            and `recipe_count` keys.
+        """
+        shopping_lists = ShoppingList.objects.using(self.db)
+        if user is not None:
+            shopping_lists = shopping_lists.filter(user=user)
+        return (
+            shopping_lists.filter(recipe__recipes__isnull=False)
+            .values('user', ingredient=F('recipe__recipes__ingredient'))
+            .annotate(
+                total_amount=Sum('recipe__recipes__amount'),
+                recipe_count=Count('recipe', distinct=True),
+            )
+            .order_by()
+        )
+
+    def shopping_list(self, user):
+        """
+        Get the ingredients of a user's shopping cart for the downloads.
+
+        Args:
+            user (User): The owner of the shopping cart.
+
+        Returns:
+            QuerySet: Tuples of (name, measurement_unit, amount) ordered
+            by the ingredient name.
+        """
+        return (
+            self.filter(user=user)
+            .values_list(
+                'ingredient__name',
+                'ingredient__measurement_unit',
+                'total_amount',
+            )
+            .order_by('ingredient__name')
+        )
+
+
+class ShoppingCartIngredient(models.Model):
+    """
+    Model representing an ingredient of a user's shopping cart, aggregated
+    over all recipes in the cart.
+
+    Attributes:
+        user (User): The owner of the shopping cart.
+        ingredient (Ingredient): The ingredient.
+        total_amount (int): The total amount of the ingredient.
+        recipe_count (int): The number of recipes in the cart using the
+        ingredient.
+    """
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь',
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        verbose_name='Ингредиент',
+    )
+    total_amount = models.IntegerField(verbose_name='Общее количество')
+    recipe_count = models.IntegerField(verbose_name='Число рецептов')
+
+    objects = ShoppingCartIngredientManager()
+
+    class Meta:
+        default_related_name = 'shopping_cart_ingredients'
+        verbose_name = 'ингредиент списка покупок'
+        verbose_name_plural = 'ингредиенты списков покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='unique_shopping_cart_ingredient',
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.user}: {self.ingredient} — {self.total_amount}'
+
+
+class ExportJobQuerySet(models.QuerySet):
+    """QuerySet of the shopping cart export jobs."""
+
+    def expired(self):
+        """
+        Filter the jobs whose time to live has passed.
+
+        Returns:
+            QuerySet: The expired jobs.
+        """
+        return self.filter(expires_at__lte=timezone.now())
+
+    def replaceable(self):
+        """
+        Filter the jobs a new request must not share: the expired and
+        failed ones, and the unfinished ones older than
+        `settings.EXPORT_JOB_TIMEOUT` seconds, whose worker has likely
+        died.
+
+        Returns:
+            QuerySet: The replaceable jobs.
+        """
+        now = timezone.now()
+        return self.filter(
+            Q(expires_at__lte=now)
+            | Q(status=ExportJob.Status.FAILED)
+            | Q(
+                status__in=(
+                    ExportJob.Status.PENDING,
+                    ExportJob.Status.RUNNING,
+                ),
+                created_at__lte=now
+                - timedelta(seconds=settings.EXPORT_JOB_TIMEOUT),
+            )
+        )
+
+    def delete_with_files(self):
+        """
+        Delete the jobs together with their rendered files.
+
+        Returns:
+            int: The number of deleted jobs.
+        """
+        jobs = list(self)
+        for job in jobs:
+            if job.file:
+                job.file.delete(save=False)
+        return self.filter(pk__in=[job.pk for job in jobs]).delete()[0]
+
+
+class ExportJob(models.Model):
+    """
+    Model representing a background render of a user's shopping cart.
+
+    Jobs are deduplicated by the fingerprint of the cart contents and the
+    format, so identical requests share one job and one file.
+
+    Attributes:
+        user (User): The owner of the shopping cart.
+        format (str): The export format.
+        fingerprint (str): The hash of the format and the cart contents.
+        status (str): The state of the job.
+        file (File): The rendered file.
+        created_at (datetime): The creation time of the job.
+        finished_at (datetime): The time the render has finished.
+        expires_at (datetime): The time the job and its file expire.
+    """
+
+    class Status(models.TextChoices):
+        PENDING = 'pending', 'В очереди'
+        RUNNING = 'running', 'Выполняется'
+        DONE = 'done', 'Готово'
+        FAILED = 'failed', 'Ошибка'
+
+    class Format(models.TextChoices):
+        PDF = 'pdf', 'PDF'
+        CSV = 'csv', 'CSV'
+        TXT = 'txt', 'Текст'
+        JSON = 'json', 'JSON'
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь',
+    )
+    format = models.CharField(
+        max_length=4,
+        choices=Format.choices,
+        default=Format.PDF,
+        verbose_name='Формат',
+    )
+    fingerprint = models.CharField(max_length=64, verbose_name='Отпечаток')
+    status = models.CharField(
+        max_length=7,
+        choices=Status.choices,
+        default=Status.PENDING,
+        verbose_name='Статус',
+    )
+    file = models.FileField(
+        upload_to='exports/', blank=True, verbose_name='Файл'
+    )
+    created_at = models.DateTimeField(
+        default=timezone.now, verbose_name='Дата создания'
+    )
+    finished_at = models.DateTimeField(
+        null=True, blank=True, verbose_name='Дата завершения'
+    )
+    expires_at = models.DateTimeField(
+        db_index=True, verbose_name='Дата истечения'
+    )
+
+    objects = ExportJobQuerySet.as_manager()
+
+    class Meta:
+        default_related_name = 'export_jobs'
+        verbose_name = 'выгрузка списка покупок'
+        verbose_name_plural = 'выгрузки списков покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'fingerprint'), name='unique_export_job'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.user}: {self.format} — {self.get_status_display()}'
+
+
+class FeedEntry(models.Model):
+    """
+    Model representing a recipe in the timeline of a follower of its
+    author.
+
+    The entries are written when the recipe is created, so a timeline is
+    read with a single range scan of the user's entries.
+
+    Attributes:
+        user (User): The owner of the timeline.
+        recipe (Recipe): The recipe.
+        author (User): The author of the recipe, to prune the timeline
+        on unsubscribe.
+        created_at (datetime): The publication time of the recipe.
+    """
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь',
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        verbose_name='Рецепт',
+    )
+    author = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='authored_feed_entries',
+        verbose_name='Автор',
+    )
+    created_at = models.DateTimeField(verbose_name='Дата публикации')
+
+    class Meta:
+        default_related_name = 'feed_entries'
+        verbose_name = 'запись ленты'
+        verbose_name_plural = 'записи лент'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'recipe'), name='unique_feed_entry'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=('user', '-created_at', '-id'),
+                name='feed_entry_timeline_idx',
+            ),
+            models.Index(
+                fields=('user', 'author'), name='feed_entry_author_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.user}: {self.recipe}'
+
+
+class SimilarRecipe(models.Model):
+    """
+    Model representing a precomputed neighbour of a recipe by the overlap
+    of their ingredients.
+
+    Attributes:
+        recipe (Recipe): The recipe.
+        similar (Recipe): The similar recipe.
+        score (float): The similarity of the ingredient sets, from 0 to 1.
+    """
+
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similar_recipes',
+        verbose_name='Рецепт',
+    )
+    similar = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Похожий рецепт',
+    )
+    score = models.FloatField(verbose_name='Сходство')
+
+    class Meta:
+        verbose_name = 'похожий рецепт'
+        verbose_name_plural = 'похожие рецепты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('recipe', 'similar'), name='unique_similar_recipe'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=('recipe', '-score'), name='similar_recipe_score_idx'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.recipe} ~ {self.similar}: {self.score:.2f}'
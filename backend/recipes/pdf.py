@@ -0,0 +1,129 @@
+"""
+Shopping list PDF rendering.
+
+The font is registered once per worker process. Long lists are wrapped
+to the page width and split over as many pages as needed, and the
+document is written to a spooled temporary file that is streamed to the
+client in chunks.
+"""
+import os
+import tempfile
+from functools import lru_cache
+
+from django.conf import settings
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import mm
+from reportlab.lib.utils import simpleSplit
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+FONT_NAME = 'Roboto-Medium'
+FONT_PATH = os.path.join(
+    settings.BASE_DIR, 'resources', 'fonts', 'Roboto-Medium.ttf'
+)
+TITLE_FONT_SIZE = 20
+FONT_SIZE = 12
+LEADING = 1.4
+MARGIN = 20 * mm
+SPOOL_MAX_SIZE = 1024 * 1024
+
+
+@lru_cache(maxsize=None)
+def register_fonts():
+    """
+    Register the fonts used in the PDF documents.
+
+    The TrueType file is parsed only on the first call in a process.
+    """
+    pdfmetrics.registerFont(TTFont(FONT_NAME, FONT_PATH))
+
+
+class ShoppingListPDF:
+    """
+    Renders a shopping list as a paginated PDF document.
+
+    Args:
+        title (str): The title printed at the top of the first page.
+        pagesize (tuple): The page width and height in points.
+        font_size (int): The font size of the list items.
+    """
+
+    def __init__(self, title, pagesize=A4, font_size=FONT_SIZE):
+        self.title = title
+        self.pagesize = pagesize
+        self.font_size = font_size
+        self.line_height = font_size * LEADING
+        self.text_width = pagesize[0] - 2 * MARGIN
+
+    def start_page(self, page, number):
+        """
+        Start a new page and return the text object for its lines.
+
+        Args:
+            page (Canvas): The canvas.
+            number (int): The page number.
+
+        Returns:
+            PDFTextObject: The text object positioned at the top margin.
+        """
+        width, height = self.pagesize
+        page.setFont(FONT_NAME, self.font_size * 0.8)
+        page.drawRightString(width - MARGIN, MARGIN / 2, str(number))
+        top = height - MARGIN
+        if number == 1:
+            page.setFont(FONT_NAME, TITLE_FONT_SIZE)
+            page.drawString(MARGIN, top - TITLE_FONT_SIZE, self.title)
+            top -= TITLE_FONT_SIZE * 2
+        text = page.beginText(MARGIN, top - self.font_size)
+        text.setFont(FONT_NAME, self.font_size, self.line_height)
+        return text
+
+    def render(self, items, output):
+        """
+        Render the shopping list into a file object.
+
+        Args:
+            items (iterable): Tuples of (name, measurement_unit, amount).
+            output (file): A binary file object to write the PDF to.
+        """
+        register_fonts()
+        page = canvas.Canvas(output, pagesize=self.pagesize)
+        page.setTitle(self.title)
+        number = 1
+        text = self.start_page(page, number)
+        for name, unit, amount in items:
+            lines = simpleSplit(
+                f'• {name} ({unit}) — {amount}',
+                FONT_NAME,
+                self.font_size,
+                self.text_width,
+            )
+            if text.getY() - len(lines) * self.line_height < MARGIN:
+                page.drawText(text)
+                page.showPage()
+                number += 1
+                text = self.start_page(page, number)
+            for line in lines:
+                text.textLine(line)
+        page.drawText(text)
+        page.showPage()
+        page.save()
+
+    def render_to_file(self, items):
+        """
+        Render the shopping list into a spooled temporary file.
+
+        The file stays in memory up to `SPOOL_MAX_SIZE` bytes and is moved
+        to disk beyond that.
+
+        Args:
+            items (iterable): Tuples of (name, measurement_unit, amount).
+
+        Returns:
+            SpooledTemporaryFile: The file, positioned at its start.
+        """
+        output = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+        self.render(items, output)
+        output.seek(0)
+        return output
@@ -0,0 +1,131 @@
+"""
+Popularity ranking of recipes.
+
+The popularity of a recipe is the number of its recent additions to
+favorites and shopping carts, each weighted by its kind and halved every
+`settings.POPULARITY_HALF_LIFE_DAYS` days. Additions older than
+`settings.POPULARITY_WINDOW_DAYS` contribute next to nothing and are
+ignored.
+
+The scores are stored in `Recipe.popularity_score`, so ordering by
+popularity is an index scan instead of counting the favorites and the
+carts of every recipe. They are recomputed in batches, in the
+background at most once every `settings.POPULARITY_UPDATE_INTERVAL`
+seconds after new additions, or with the `update_popularity_scores`
+command.
+"""
+import datetime
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+from backend.cache import bump_version
+from backend.tasks import run_in_background
+from recipes.models import Favorite, Recipe, ShoppingList
+
+UPDATE_LOCK_KEY = 'popularity:update'
+
+
+def get_weights():
+    """
+    Get the models whose instances count as additions, with their
+    weights.
+
+    Returns:
+        tuple: The (model, weight) pairs.
+    """
+    return (
+        (Favorite, settings.POPULARITY_FAVORITE_WEIGHT),
+        (ShoppingList, settings.POPULARITY_SHOPPING_CART_WEIGHT),
+    )
+
+
+def compute_popularity_scores(now=None):
+    """
+    Compute the popularity scores of the recipes added recently.
+
+    The additions are counted per recipe and hour by the database, and
+    every hour is decayed as a whole.
+
+    Args:
+        now (datetime): The time the scores are computed for
+        (optional, defaults to the current time).
+
+    Returns:
+        dict: The scores by recipe ID.
+    """
+    now = now or timezone.now()
+    since = now - datetime.timedelta(days=settings.POPULARITY_WINDOW_DAYS)
+    half_life = datetime.timedelta(days=settings.POPULARITY_HALF_LIFE_DAYS)
+    scores = defaultdict(float)
+    for model, weight in get_weights():
+        additions = (
+            model.objects.filter(created_at__gte=since)
+            .annotate(hour=TruncHour('created_at'))
+            .values('recipe_id', 'hour')
+            .annotate(count=Count('pk'))
+            .values_list('recipe_id', 'hour', 'count')
+            .order_by()
+        )
+        for recipe_id, hour, count in additions.iterator(
+            chunk_size=settings.POPULARITY_BATCH_SIZE
+        ):
+            age = max(now - hour, datetime.timedelta())
+            scores[recipe_id] += weight * count * 0.5 ** (age / half_life)
+    return scores
+
+
+def update_popularity_scores(now=None):
+    """
+    Recompute and store the popularity scores of all recipes.
+
+    The new scores are written in batches of
+    `settings.POPULARITY_BATCH_SIZE` recipes, each in its own
+    transaction so the rows are not locked for the whole pass, and the
+    recipes that have no recent additions anymore are reset to zero.
+
+    Args:
+        now (datetime): The time the scores are computed for
+        (optional, defaults to the current time).
+
+    Returns:
+        int: The number of recipes whose score has been written.
+    """
+    scores = compute_popularity_scores(now)
+    batch_size = settings.POPULARITY_BATCH_SIZE
+    outdated = [
+        pk
+        for pk in Recipe.objects.filter(popularity_score__gt=0)
+        .values_list('pk', flat=True)
+        .order_by()
+        if pk not in scores
+    ]
+    for start in range(0, len(outdated), batch_size):
+        Recipe.objects.filter(
+            pk__in=outdated[start: start + batch_size]
+        ).update(popularity_score=0)
+    recipes = [
+        Recipe(pk=recipe_id, popularity_score=score)
+        for recipe_id, score in scores.items()
+    ]
+    for start in range(0, len(recipes), batch_size):
+        Recipe.objects.bulk_update(
+            recipes[start: start + batch_size], ('popularity_score',)
+        )
+    if scores or outdated:
+        bump_version('recipes')
+    return len(scores) + len(outdated)
+
+
+def schedule_popularity_update():
+    """
+    Recompute the popularity scores in the background, unless a pass
+    has already been scheduled in the last
+    `settings.POPULARITY_UPDATE_INTERVAL` seconds.
+    """
+    if cache.add(UPDATE_LOCK_KEY, True, settings.POPULARITY_UPDATE_INTERVAL):
+        run_in_background(update_popularity_scores)
@@ -0,0 +1,98 @@
+"""
+Full-text recipe search.
+
+On PostgreSQL recipes are matched against a maintained, weighted
+`search_vector` (name, then description) and, for typo tolerance, by
+trigram similarity of the name. Other databases (SQLite for local runs)
+fall back to a case-insensitive substring match.
+"""
+from django.conf import settings
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector, TrigramSimilarity)
+from django.db import connection
+from django.db.models import Case, F, FloatField, IntegerField, Q, When
+from django.db.models.functions import Cast
+
+
+def is_full_text_search_supported():
+    """
+    Check whether the database supports the full-text search.
+
+    Returns:
+        bool: True for PostgreSQL, False otherwise.
+    """
+    return connection.vendor == 'postgresql'
+
+
+def get_search_vector():
+    """
+    Get the expression of the recipe search vector.
+
+    Returns:
+        SearchVector: The name (weight A) and description (weight B)
+        search vector.
+    """
+    return SearchVector(
+        'name', weight='A', config=settings.SEARCH_CONFIG
+    ) + SearchVector('text', weight='B', config=settings.SEARCH_CONFIG)
+
+
+def update_search_vectors(queryset):
+    """
+    Recompute the search vectors of the recipes in the queryset.
+
+    Args:
+        queryset (QuerySet): The recipes to update.
+
+    Returns:
+        int: The number of updated recipes.
+    """
+    if not is_full_text_search_supported():
+        return 0
+    return queryset.update(search_vector=get_search_vector())
+
+
+def search_recipes(queryset, value):
+    """
+    Filter the recipes matching a search query, best matches first.
+
+    Args:
+        queryset (QuerySet): The recipes to search.
+        value (str): The search query.
+
+    Returns:
+        QuerySet: The matching recipes ordered by rank.
+    """
+    if not is_full_text_search_supported():
+        return (
+            queryset.filter(
+                Q(name__icontains=value) | Q(text__icontains=value)
+            )
+            .annotate(
+                rank=Case(
+                    When(name__icontains=value, then=2),
+                    default=1,
+                    output_field=IntegerField(),
+                )
+            )
+            .order_by('-rank', 'name')
+        )
+    query = SearchQuery(
+        value, config=settings.SEARCH_CONFIG, search_type='websearch'
+    )
+    return (
+        queryset.filter(
+            Q(search_vector=query) | Q(name__trigram_similar=value)
+        )
+        .annotate(
+            # The ranks are single precision; as doubles they survive the
+            # round trip through the cursors and compare equal to
+            # themselves.
+            rank=Cast(
+                SearchRank(F('search_vector'), query)
+                + TrigramSimilarity('name', value),
+                FloatField(),
+            )
+        )
+        .order_by('-rank', 'name')
+    )
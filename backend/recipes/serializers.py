@@ -1,9 +1,14 @@
+from collections.abc import Mapping
+
+from django.conf import settings
 from django.db import transaction
-from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
 from rest_framework.serializers import ModelSerializer
 
-from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+from recipes.fields import RecipeImageField
+from recipes.images import get_rendition_urls, normalize_image
+from recipes.models import (ExportJob, Favorite, Ingredient, Recipe,
+                            RecipeIngredient, ShoppingCartIngredient,
                             ShoppingList, Tag)
 from users.serializers import CustomUserSerializer
 
@@ -60,7 +65,38 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit', 'amount')
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class ImageRenditionsMixin(serializers.Serializer):
+    """
+    Adds the URLs of the recipe image renditions to a recipe serializer.
+
+    Fields:
+        image_renditions (dict): The absolute URLs of the renditions by
+        name, empty until they are generated.
+    """
+
+    image_renditions = serializers.SerializerMethodField()
+
+    def get_image_renditions(self, obj):
+        """
+        Get the 'image_renditions' field value.
+
+        Args:
+            obj (Recipe): The recipe object.
+
+        Returns:
+            dict: The absolute URLs of the renditions by name.
+        """
+        request = self.context.get('request')
+        urls = get_rendition_urls(obj)
+        if request is None:
+            return urls
+        return {
+            name: request.build_absolute_uri(url)
+            for name, url in urls.items()
+        }
+
+
+class RecipeSerializer(ImageRenditionsMixin, serializers.ModelSerializer):
 
     """
     Serializer for the Recipe model.
@@ -75,12 +111,20 @@ class RecipeSerializer(serializers.ModelSerializer):
         user's shopping cart.
         name (str): The name of the recipe.
         image (str): The URL of the recipe image.
+        image_renditions (dict): The URLs of the resized variants of the
+        image.
         text (str): The text of the recipe.
         cooking_time (int): The cooking time of the recipe.
     """
 
+    tags = serializers.ListField(
+        child=serializers.IntegerField(), write_only=True
+    )
     author = CustomUserSerializer(read_only=True)
-    image = Base64ImageField(max_length=None, use_url=True)
+    ingredients = RecipeIngredientSerializer(
+        source='recipes', many=True, read_only=True
+    )
+    image = RecipeImageField(max_length=None, use_url=True)
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
 
@@ -95,6 +139,7 @@ class RecipeSerializer(serializers.ModelSerializer):
             'is_in_shopping_cart',
             'name',
             'image',
+            'image_renditions',
             'text',
             'cooking_time',
         )
@@ -103,12 +148,17 @@ class RecipeSerializer(serializers.ModelSerializer):
         """
         Get the 'is_favorited' field value.
 
+        Uses the annotation from `RecipeQuerySet.with_user_flags` when
+        it is present.
+
         Args:
             obj (Recipe): The recipe object.
 
         Returns:
             bool: True if the recipe is favorited by the user, False otherwise.
         """
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         request = self.context.get('request')
         if request.user.is_anonymous:
             return False
@@ -118,6 +168,9 @@ class RecipeSerializer(serializers.ModelSerializer):
         """
         Get the 'is_in_shopping_cart' field value.
 
+        Uses the annotation from `RecipeQuerySet.with_user_flags` when
+        it is present.
+
         Args:
             obj (Recipe): The recipe object.
 
@@ -125,6 +178,8 @@ class RecipeSerializer(serializers.ModelSerializer):
             bool: True if the recipe is in the user's shopping cart,
             False otherwise.
         """
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         request = self.context.get('request')
         if request.user.is_anonymous:
             return False
@@ -132,39 +187,104 @@ class RecipeSerializer(serializers.ModelSerializer):
             user=request.user, recipe=obj
         ).exists()
 
-    def validate(self, data):
+    def validate_image(self, value):
         """
-        Validate the ingredients field.
+        Normalize the uploaded image: apply its EXIF orientation and scale
+        it down to `settings.RECIPE_IMAGE_MAX_SIZE`.
 
         Args:
-            data (dict): The input data.
+            value (File): The uploaded image.
+
+        Returns:
+            ContentFile: The normalized image.
+        """
+        return normalize_image(value)
+
+    def validate_ingredients(self, ingredients):
+        """
+        Validate the submitted ingredients and resolve them with a single
+        query.
+
+        Args:
+            ingredients (list): The submitted `{id, amount}` objects.
 
         Raises:
             serializers.ValidationError: If the ingredients are missing,
-            duplicated, or have an invalid amount.
+            malformed or duplicated, or if any of them doesn't exist or
+            has an invalid amount. Every invalid id is reported.
 
         Returns:
-            dict: The validated data.
+            list: The (Ingredient, amount) pairs.
         """
-        ingredients = self.initial_data.get('ingredients')
-        ingredient_ids = [ingredient['id'] for ingredient in ingredients]
         if not ingredients:
             raise serializers.ValidationError(
                 'Необходимо добавить ингредиенты.'
             )
-        if len(ingredient_ids) != len(set(ingredient_ids)):
+        try:
+            amounts = {
+                int(ingredient['id']): int(ingredient['amount'])
+                for ingredient in ingredients
+            }
+        except (KeyError, TypeError, ValueError):
+            raise serializers.ValidationError(
+                'Ингредиенты должны содержать числовые id и amount.'
+            )
+        if len(amounts) != len(ingredients):
             raise serializers.ValidationError(
                 'Ингредиенты не должны повторяться.'
             )
+        errors = []
+        invalid_amounts = [
+            ingredient_id
+            for ingredient_id, amount in amounts.items()
+            if not settings.MIN_AMOUNT <= amount <= settings.MAX_AMOUNT
+        ]
+        if invalid_amounts:
+            errors.append(
+                f'Количество ингредиента должно быть от '
+                f'{settings.MIN_AMOUNT} до {settings.MAX_AMOUNT}: '
+                + ', '.join(map(str, invalid_amounts))
+                + '.'
+            )
+        found = Ingredient.objects.in_bulk(amounts)
+        missing = sorted(amounts.keys() - found.keys())
+        if missing:
+            errors.append(
+                'Ингредиенты не найдены: ' + ', '.join(map(str, missing)) + '.'
+            )
+        if errors:
+            raise serializers.ValidationError(errors)
+        return [
+            (found[ingredient_id], amount)
+            for ingredient_id, amount in amounts.items()
+        ]
+
+    def validate_tags(self, tags):
+        """
+        Validate the submitted tag ids and resolve them with a single query.
 
-        for ingredient in ingredients:
-            amount = int(ingredient['amount'])
-            if amount <= 0:
-                raise serializers.ValidationError(
-                    'Количество ингредиента ' 'должно быть больше 0.'
-                )
+        Args:
+            tags (list): The submitted tag ids.
 
-        return data
+        Raises:
+            serializers.ValidationError: If the tags are missing or
+            duplicated, or if any of them doesn't exist. Every invalid id
+            is reported.
+
+        Returns:
+            list: The Tag objects.
+        """
+        if not tags:
+            raise serializers.ValidationError('Необходимо добавить теги.')
+        if len(tags) != len(set(tags)):
+            raise serializers.ValidationError('Теги не должны повторяться.')
+        found = Tag.objects.in_bulk(tags)
+        missing = sorted(set(tags) - found.keys())
+        if missing:
+            raise serializers.ValidationError(
+                'Теги не найдены: ' + ', '.join(map(str, missing)) + '.'
+            )
+        return [found[tag] for tag in tags]
 
     def to_representation(self, instance):
         """
@@ -177,9 +297,8 @@ class RecipeSerializer(serializers.ModelSerializer):
             dict: The serialized representation of the recipe.
         """
         representation = super().to_representation(instance)
-        representation['tags'] = TagSerializer(instance.tags, many=True).data
-        representation['ingredients'] = RecipeIngredientSerializer(
-            instance.recipes.all(), many=True
+        representation['tags'] = TagSerializer(
+            instance.tags.all(), many=True
         ).data
         return representation
 
@@ -187,17 +306,40 @@ class RecipeSerializer(serializers.ModelSerializer):
         """
         Convert the external data to internal value.
 
+        The ingredients are validated here alongside the fields, since the
+        `ingredients` field is the read-only representation, so the errors
+        of the fields and of the ingredients are reported together. On
+        partial updates the ingredients may be omitted and are then left
+        unchanged. Data that is not an object is rejected as a whole.
+
         Args:
             data (dict): The external data.
 
+        Raises:
+            serializers.ValidationError: If any field or the ingredients
+            are invalid.
+
         Returns:
-            dict: The internal value.
+            dict: The internal value with the (Ingredient, amount) pairs.
         """
-        internal_value = super().to_internal_value(data)
-        tags = data.get('tags')
-        ingredients = data.get('ingredients')
-        internal_value['tags'] = tags
-        internal_value['ingredients'] = ingredients
+        errors = {}
+        try:
+            internal_value = super().to_internal_value(data)
+        except serializers.ValidationError as error:
+            if not isinstance(data, Mapping):
+                raise
+            errors = error.detail
+        if not self.partial or 'ingredients' in data:
+            try:
+                ingredients = self.validate_ingredients(
+                    data.get('ingredients')
+                )
+            except serializers.ValidationError as error:
+                errors['ingredients'] = error.detail
+        if errors:
+            raise serializers.ValidationError(errors)
+        if not self.partial or 'ingredients' in data:
+            internal_value['ingredients'] = ingredients
         return internal_value
 
     def create_and_update_recipe_ingredients(self, recipe, ingredients):
@@ -206,17 +348,17 @@ class RecipeSerializer(serializers.ModelSerializer):
 
         Args:
             recipe (Recipe): The recipe object.
-            ingredients (list): The ingredients data.
+            ingredients (list): The (Ingredient, amount) pairs.
 
         Returns:
             None
         """
         recipe_ingredients = []
-        for ingredient in ingredients:
+        for ingredient, amount in ingredients:
             recipe_ingredient = RecipeIngredient(
                 recipe=recipe,
-                ingredient_id=ingredient['id'],
-                amount=int(ingredient['amount']),
+                ingredient=ingredient,
+                amount=amount,
             )
             recipe_ingredients.append(recipe_ingredient)
         RecipeIngredient.objects.bulk_create(recipe_ingredients)
@@ -241,11 +383,71 @@ class RecipeSerializer(serializers.ModelSerializer):
         self.create_and_update_recipe_ingredients(recipe, ingredients)
         return recipe
 
+    def update_recipe_ingredients(self, recipe, ingredients):
+        """
+        Bring the recipe ingredients in line with the submitted ones.
+
+        Only the differences are written: the removed ingredients are
+        deleted, the changed amounts are updated and the new ingredients
+        are created, so an unchanged list causes no writes.
+
+        Args:
+            recipe (Recipe): The recipe object.
+            ingredients (list): The (Ingredient, amount) pairs.
+
+        Returns:
+            tuple: The previous and the new amounts by ingredient id.
+        """
+        existing = {
+            recipe_ingredient.ingredient_id: recipe_ingredient
+            for recipe_ingredient in recipe.recipes.all()
+        }
+        old_amounts = {
+            ingredient_id: recipe_ingredient.amount
+            for ingredient_id, recipe_ingredient in existing.items()
+        }
+        new_amounts = {
+            ingredient.pk: amount for ingredient, amount in ingredients
+        }
+        removed = [
+            recipe_ingredient.pk
+            for ingredient_id, recipe_ingredient in existing.items()
+            if ingredient_id not in new_amounts
+        ]
+        changed = []
+        added = []
+        for ingredient, amount in ingredients:
+            recipe_ingredient = existing.get(ingredient.pk)
+            if recipe_ingredient is None:
+                added.append(
+                    RecipeIngredient(
+                        recipe=recipe,
+                        ingredient=ingredient,
+                        amount=amount,
+                    )
+                )
+            elif recipe_ingredient.amount != amount:
+                recipe_ingredient.amount = amount
+                changed.append(recipe_ingredient)
+        if removed:
+            RecipeIngredient.objects.filter(pk__in=removed).delete()
+        if changed:
+            RecipeIngredient.objects.bulk_update(changed, ('amount',))
+        if added:
+            RecipeIngredient.objects.bulk_create(added)
+        return old_amounts, new_amounts
+
     @transaction.atomic
     def update(self, instance, validated_data):
         """
         Update an existing recipe.
 
+        The tags and the ingredients are updated by their differences with
+        the stored ones, and the shopping carts containing the recipe are
+        updated with the change of its ingredients. A change of the set of
+        ingredients marks the similar recipes for recomputation. Tags and
+        ingredients omitted from a partial update are left unchanged.
+
         Args:
             instance (Recipe): The recipe object to update.
             validated_data (dict): The validated data.
@@ -253,26 +455,38 @@ class RecipeSerializer(serializers.ModelSerializer):
         Returns:
             Recipe: The updated recipe object.
         """
-        tags = validated_data.pop('tags', [])
-        ingredients = validated_data.pop('ingredients', [])
-        instance.tags.set(tags)
-        instance.ingredients.clear()
-        self.create_and_update_recipe_ingredients(instance, ingredients)
+        tags = validated_data.pop('tags', None)
+        ingredients = validated_data.pop('ingredients', None)
+        if tags is not None:
+            instance.tags.set(tags)
+        if ingredients is not None:
+            old_amounts, new_amounts = self.update_recipe_ingredients(
+                instance, ingredients
+            )
+            if old_amounts != new_amounts:
+                ShoppingCartIngredient.objects.change_recipe_ingredients(
+                    instance, old_amounts, new_amounts
+                )
+            if old_amounts.keys() != new_amounts.keys():
+                validated_data['similar_recipes_stale'] = True
         return super().update(instance, validated_data)
 
 
-class ShortRecipeSerializer(serializers.ModelSerializer):
+class ShortRecipeSerializer(ImageRenditionsMixin, serializers.ModelSerializer):
     """
     Serializer for the Recipe model (short representation).
 
     Fields:
         id (int): The ID of the recipe.
         name (str): The name of the recipe.
-        image (str): The URL of the recipe image.
+        image (str): The URL of the card rendition of the recipe image,
+        or of the original until the rendition is generated.
+        image_renditions (dict): The URLs of the resized variants of the
+        image.
         cooking_time (int): The cooking time of the recipe.
     """
 
-    image = serializers.ImageField(use_url=True)
+    image = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
@@ -280,9 +494,31 @@ class ShortRecipeSerializer(serializers.ModelSerializer):
             'id',
             'name',
             'image',
+            'image_renditions',
             'cooking_time',
         )
 
+    def get_image(self, obj):
+        """
+        Get the 'image' field value.
+
+        Args:
+            obj (Recipe): The recipe object.
+
+        Returns:
+            str: The absolute URL of the card rendition, or of the
+            original image.
+        """
+        renditions = self.get_image_renditions(obj)
+        if 'card' in renditions:
+            return renditions['card']
+        if not obj.image:
+            return None
+        request = self.context.get('request')
+        if request is None:
+            return obj.image.url
+        return request.build_absolute_uri(obj.image.url)
+
 
 class BaseSerializer(ModelSerializer):
     """
@@ -296,28 +532,18 @@ class BaseSerializer(ModelSerializer):
     class Meta:
         fields = ('user', 'recipe')
 
-    def validate(self, data):
+    @property
+    def unique_error_message(self):
         """
-        Validate the serializer data.
-
-        Args:
-            data (dict): The serializer data.
+        The error reported when the favorite/shopping list already exists.
 
-        Raises:
-            serializers.ValidationError: If the favorite/shopping
-            list already exists.
-
-        Returns:
-            dict: The validated data.
+        The existence is not checked upfront: the unique constraint is
+        enforced by the database when the instance is saved.
         """
-        user = data.get('user')
-        recipe = data.get('recipe')
-        if self.Meta.model.objects.filter(user=user, recipe=recipe).exists():
-            raise serializers.ValidationError(
-                f'Этот рецепт уже добавлен в '
-                f'{self.Meta.model._meta.verbose_name}.'
-            )
-        return data
+        return (
+            f'Этот рецепт уже добавлен в '
+            f'{self.Meta.model._meta.verbose_name}.'
+        )
 
 
 class FavoriteSerializer(BaseSerializer):
@@ -332,3 +558,89 @@ class ShoppingListSerializer(BaseSerializer):
 
     class Meta(BaseSerializer.Meta):
         model = ShoppingList
+
+    @transaction.atomic
+    def create(self, validated_data):
+        """
+        Add a recipe to the shopping cart and its ingredients to the
+        aggregated shopping cart ingredients.
+
+        Args:
+            validated_data (dict): The validated data.
+
+        Returns:
+            ShoppingList: The created shopping list item.
+        """
+        shopping_list = super().create(validated_data)
+        ShoppingCartIngredient.objects.add_recipes(
+            shopping_list.user, [shopping_list.recipe_id]
+        )
+        return shopping_list
+
+
+class RecipeIdsSerializer(serializers.Serializer):
+    """
+    Serializer for the bodies of the bulk favorite and shopping cart
+    requests.
+
+    Fields:
+        recipes (list): The IDs of the recipes, at most
+        `settings.BULK_RECIPES_MAX_SIZE`.
+    """
+
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.BULK_RECIPES_MAX_SIZE,
+        error_messages={
+            'empty': 'Укажите хотя бы один рецепт.',
+            'max_length': 'Можно указать не больше {max_length} рецептов.',
+        },
+    )
+
+    def validate_recipes(self, recipes):
+        """
+        Drop the repeated IDs, keeping the order of the first ones.
+
+        Args:
+            recipes (list): The IDs of the recipes.
+
+        Returns:
+            list: The unique IDs.
+        """
+        return list(dict.fromkeys(recipes))
+
+
+class ExportJobSerializer(serializers.ModelSerializer):
+    """
+    Serializer for the ExportJob model.
+
+    Fields:
+        id (int): The ID of the job.
+        format (str): The export format.
+        status (str): The state of the job.
+        file (str): The URL of the rendered file, once it is ready.
+        created_at (datetime): The creation time of the job.
+        expires_at (datetime): The time the job and its file expire.
+    """
+
+    file = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ExportJob
+        fields = ('id', 'format', 'status', 'file', 'created_at', 'expires_at')
+        read_only_fields = ('status', 'created_at', 'expires_at')
+
+    def get_file(self, obj):
+        """
+        Get the URL of the rendered file.
+
+        Args:
+            obj (ExportJob): The export job.
+
+        Returns:
+            str: The absolute URL of the file, or None until it is ready.
+        """
+        if obj.status != ExportJob.Status.DONE or not obj.file:
+            return None
+        return self.context['request'].build_absolute_uri(obj.file.url)
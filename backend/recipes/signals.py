@@ -0,0 +1,118 @@
+from django.db.models import F
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+
+from backend.cache import bump_version
+from backend.tasks import run_in_background
+from recipes.feeds import fan_out_recipe
+from recipes.images import generate_renditions, needs_renditions
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCartIngredient, ShoppingList, Tag)
+from recipes.popularity import schedule_popularity_update
+from recipes.search import update_search_vectors
+from users.models import User
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def bump_recipes_version(sender, **kwargs):
+    """Invalidate the cached recipe responses."""
+    bump_version('recipes')
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def bump_tags_version(sender, **kwargs):
+    """Invalidate the cached tag responses and the recipes that embed tags."""
+    bump_version('tags')
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def bump_ingredients_version(sender, **kwargs):
+    """
+    Invalidate the cached ingredient responses and the recipes that embed
+    ingredients.
+    """
+    bump_version('ingredients')
+
+
+@receiver(pre_delete, sender=Recipe)
+def remove_recipe_from_shopping_carts(sender, instance, **kwargs):
+    """
+    Subtract the ingredients of a deleted recipe from the aggregated
+    shopping cart ingredients of every cart containing it.
+    """
+    ShoppingCartIngredient.objects.remove_recipe_everywhere(instance)
+
+
+@receiver(post_save, sender=Recipe)
+def increment_recipes_count(sender, instance, created, raw=False, **kwargs):
+    """Count a new recipe in the recipe counter of its author."""
+    if created and not raw:
+        User.objects.filter(pk=instance.author_id).update(
+            recipes_count=F('recipes_count') + 1
+        )
+
+
+@receiver(post_delete, sender=Recipe)
+def decrement_recipes_count(sender, instance, **kwargs):
+    """
+    Uncount a deleted recipe, whether it's deleted by itself or together
+    with its author, from the recipe counter of its author.
+    """
+    User.objects.filter(pk=instance.author_id, recipes_count__gt=0).update(
+        recipes_count=F('recipes_count') - 1
+    )
+
+
+@receiver(pre_delete, sender=User)
+def decrement_recipe_counters(sender, instance, **kwargs):
+    """
+    Decrement the favorite and shopping cart counters of the recipes a
+    deleted user has added, before the user's entries are deleted with
+    the user.
+    """
+    for model in (Favorite, ShoppingList):
+        model.objects.update_counters(
+            set(
+                model.objects.filter(user=instance).values_list(
+                    'recipe_id', flat=True
+                )
+            ),
+            -1,
+        )
+
+
+@receiver(post_save, sender=Recipe)
+def update_recipe_search_vector(sender, instance, raw=False, **kwargs):
+    """Keep the full-text search vector of a saved recipe up to date."""
+    if not raw:
+        update_search_vectors(Recipe.objects.filter(pk=instance.pk))
+
+
+@receiver(post_save, sender=Recipe)
+def schedule_image_renditions(sender, instance, raw=False, **kwargs):
+    """Generate the renditions of a new recipe image in the background."""
+    if not raw and needs_renditions(instance):
+        run_in_background(generate_renditions, instance.pk)
+
+
+@receiver(post_save, sender=Recipe)
+def schedule_feed_fan_out(sender, instance, created, raw=False, **kwargs):
+    """Add a new recipe to the followers' timelines in the background."""
+    if created and not raw:
+        run_in_background(fan_out_recipe, instance.pk)
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingList)
+def schedule_popularity_scores(sender, created, raw=False, **kwargs):
+    """Recompute the popularity scores in the background after additions."""
+    if created and not raw:
+        schedule_popularity_update()
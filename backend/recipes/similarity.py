@@ -0,0 +1,368 @@
+"""
+Similar recipes.
+
+Recipes are compared by the sets of their ingredients. The recipe ×
+ingredient incidence matrix is built as a sparse matrix, and the
+similarity of blocks of recipes to all the others is computed with a
+sparse matrix product, which yields the sizes of the intersections of
+every pair of recipes sharing an ingredient. Only the best
+`settings.SIMILAR_RECIPES_COUNT` neighbours of every recipe are kept in
+SimilarRecipe, so the endpoint reads them with an indexed lookup.
+
+Recipes whose ingredients have changed are flagged and can be recomputed
+incrementally: their own neighbours are computed against all recipes,
+and, as the similarity is symmetric, the same scores update the
+neighbours of the other recipes.
+"""
+from itertools import chain
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from scipy import sparse
+
+from recipes.models import Recipe, RecipeIngredient, SimilarRecipe
+
+METRICS = ('cosine', 'jaccard')
+READ_CHUNK_SIZE = 10000
+WRITE_BATCH_SIZE = 5000
+COMMON_INGREDIENT_MIN_COUNT = 1000
+
+
+def build_matrix(pairs, max_share=None):
+    """
+    Build the binary recipe × ingredient matrix.
+
+    Ingredients found in more than `max_share` of the recipes (and in
+    more than COMMON_INGREDIENT_MIN_COUNT of them), like salt, are left
+    out: they say little about the similarity, and every one of them
+    would make the products denser by the square of its frequency.
+
+    Args:
+        pairs (ndarray): The (recipe_id, ingredient_id) rows.
+        max_share (float): The largest share of the recipes an ingredient
+        is kept for, `settings.SIMILAR_RECIPES_MAX_INGREDIENT_SHARE` by
+        default.
+
+    Returns:
+        tuple: The recipe ids in the order of the matrix rows, and the
+        matrix in CSR format.
+    """
+    if max_share is None:
+        max_share = settings.SIMILAR_RECIPES_MAX_INGREDIENT_SHARE
+    recipe_ids, rows = np.unique(pairs[:, 0], return_inverse=True)
+    ingredient_ids, columns = np.unique(pairs[:, 1], return_inverse=True)
+    matrix = sparse.csr_matrix(
+        (np.ones(len(rows), dtype=np.float32), (rows, columns)),
+        shape=(len(recipe_ids), len(ingredient_ids)),
+    )
+    matrix.sum_duplicates()
+    matrix.data[:] = 1
+    counts = np.asarray(matrix.sum(axis=0)).ravel()
+    common = counts > max(
+        max_share * len(recipe_ids), COMMON_INGREDIENT_MIN_COUNT
+    )
+    if common.any():
+        matrix = matrix @ sparse.diags((~common).astype(np.float32))
+        matrix.eliminate_zeros()
+    return recipe_ids, matrix.tocsr()
+
+
+def get_scores(matrix, transposed, sizes, rows, metric):
+    """
+    Compute the positive similarities of some recipes to all recipes.
+
+    Args:
+        matrix (csr_matrix): The recipe × ingredient matrix.
+        transposed (csr_matrix): The transposed matrix.
+        sizes (ndarray): The number of ingredients of every recipe.
+        rows (ndarray): The matrix rows of the recipes.
+        metric (str): `cosine` or `jaccard`.
+
+    Returns:
+        tuple: The (row, column, score) arrays of the pairs of distinct
+        recipes sharing an ingredient, ordered by row and column.
+    """
+    product = matrix[rows] @ transposed
+    product.sort_indices()
+    product = product.tocoo()
+    pair_rows = rows[product.row]
+    pair_columns = product.col
+    keep = pair_rows != pair_columns
+    pair_rows = pair_rows[keep]
+    pair_columns = pair_columns[keep]
+    intersections = product.data[keep]
+    if metric == 'cosine':
+        scores = intersections / np.sqrt(
+            sizes[pair_rows] * sizes[pair_columns]
+        )
+    else:
+        scores = intersections / (
+            sizes[pair_rows] + sizes[pair_columns] - intersections
+        )
+    return pair_rows, pair_columns, scores.astype(np.float32)
+
+
+def top_k(rows, columns, scores, k):
+    """
+    Keep the `k` best scores of every row. Equal scores keep the order
+    of the pairs.
+
+    Args:
+        rows (ndarray): The rows of the pairs.
+        columns (ndarray): The columns of the pairs.
+        scores (ndarray): The scores of the pairs.
+        k (int): The number of neighbours kept per row.
+
+    Returns:
+        tuple: The kept (row, column, score) arrays, grouped by row with
+        the best scores first.
+    """
+    # The scores are in (0, 1], so `row - score` orders by row and then
+    # by descending score with a single sort.
+    order = np.argsort(rows - scores.astype(np.float64), kind='stable')
+    rows, columns, scores = rows[order], columns[order], scores[order]
+    ranks = np.arange(len(rows)) - np.searchsorted(rows, rows)
+    keep = ranks < k
+    return rows[keep], columns[keep], scores[keep]
+
+
+def compute_neighbours(matrix, rows, k, metric, block_size):
+    """
+    Compute the best neighbours of some recipes in blocks of rows.
+
+    Args:
+        matrix (csr_matrix): The recipe × ingredient matrix.
+        rows (ndarray): The matrix rows of the recipes.
+        k (int): The number of neighbours kept per recipe.
+        metric (str): `cosine` or `jaccard`.
+        block_size (int): The number of recipes compared at a time.
+
+    Yields:
+        tuple: The (row, column, score) arrays of all the pairs of a
+        block, and of the best neighbours among them.
+    """
+    transposed = matrix.T.tocsr()
+    sizes = np.asarray(matrix.sum(axis=1)).ravel()
+    for start in range(0, len(rows), block_size):
+        pairs = get_scores(
+            matrix, transposed, sizes, rows[start:start + block_size], metric
+        )
+        yield pairs, top_k(*pairs, k)
+
+
+def concatenate(blocks):
+    """
+    Concatenate blocks of (row, column, score) arrays.
+
+    Args:
+        blocks (list): The blocks.
+
+    Returns:
+        tuple: The (row, column, score) arrays.
+    """
+    if not blocks:
+        return (
+            np.empty(0, dtype=np.int64),
+            np.empty(0, dtype=np.int64),
+            np.empty(0, dtype=np.float32),
+        )
+    return tuple(np.concatenate(arrays) for arrays in zip(*blocks))
+
+
+def load_pairs():
+    """
+    Load the (recipe_id, ingredient_id) pairs of all recipes.
+
+    Returns:
+        ndarray: The pairs, one per row.
+    """
+    rows = RecipeIngredient.objects.order_by().values_list(
+        'recipe_id', 'ingredient_id'
+    )
+    return np.fromiter(
+        chain.from_iterable(rows.iterator(chunk_size=READ_CHUNK_SIZE)),
+        dtype=np.int64,
+    ).reshape(-1, 2)
+
+
+def load_neighbours(recipe_ids, stale_rows):
+    """
+    Load the stored neighbours of the recipes that are not stale.
+
+    Args:
+        recipe_ids (ndarray): The recipe ids by matrix row.
+        stale_rows (ndarray): The matrix rows of the stale recipes.
+
+    Returns:
+        tuple: The (row, column, score) arrays of the neighbours, limited
+        to the recipes present in the matrix.
+    """
+    stored = np.fromiter(
+        chain.from_iterable(
+            SimilarRecipe.objects.values_list(
+                'recipe_id', 'similar_id', 'score'
+            ).iterator(chunk_size=READ_CHUNK_SIZE)
+        ),
+        dtype=np.float64,
+    ).reshape(-1, 3)
+    if not len(recipe_ids) or not len(stored):
+        return concatenate([])
+    ids = stored[:, :2].astype(np.int64)
+    positions = np.searchsorted(recipe_ids, ids).clip(max=len(recipe_ids) - 1)
+    present = (recipe_ids[positions] == ids).all(axis=1)
+    present &= ~np.isin(positions[:, 0], stale_rows)
+    return (
+        positions[present, 0],
+        positions[present, 1],
+        stored[present, 2].astype(np.float32),
+    )
+
+
+def merge_reverse(matrix, recipe_ids, stale_rows, pairs, k, metric,
+                  block_size):
+    """
+    Update the neighbours of the other recipes with the scores of the
+    stale recipes.
+
+    The scores of a stale recipe are merged into the stored neighbours of
+    the recipes it is similar to, which is exact as long as those don't
+    contain stale recipes; the recipes that do are recomputed against all
+    recipes.
+
+    Args:
+        matrix (csr_matrix): The recipe × ingredient matrix.
+        recipe_ids (ndarray): The recipe ids by matrix row.
+        stale_rows (ndarray): The matrix rows of the stale recipes.
+        pairs (tuple): The (row, column, score) arrays of all the pairs
+        of the stale recipes.
+        k (int): The number of neighbours kept per recipe.
+        metric (str): `cosine` or `jaccard`.
+        block_size (int): The number of recipes compared at a time.
+
+    Returns:
+        tuple: The rows of the recipes whose neighbours have changed, and
+        the (row, column, score) arrays of their new neighbours.
+    """
+    rows, columns, scores = pairs
+    stored = load_neighbours(recipe_ids, stale_rows)
+    recomputed = np.unique(stored[0][np.isin(stored[1], stale_rows)])
+    fresh = ~np.isin(columns, stale_rows) & ~np.isin(columns, recomputed)
+    candidates = (columns[fresh], rows[fresh], scores[fresh])
+    kept = np.isin(stored[0], candidates[0])
+    merged = concatenate([candidates, tuple(array[kept] for array in stored)])
+    order = np.lexsort((merged[1], merged[0]))
+    neighbours = [top_k(*(array[order] for array in merged), k)]
+    neighbours.extend(
+        block_neighbours
+        for _, block_neighbours in compute_neighbours(
+            matrix, recomputed, k, metric, block_size
+        )
+    )
+    return np.union1d(candidates[0], recomputed), concatenate(neighbours)
+
+
+def store_neighbours(recipe_ids, rows, columns, scores):
+    """
+    Insert the neighbours in batches.
+
+    Args:
+        recipe_ids (ndarray): The recipe ids by matrix row.
+        rows (ndarray): The rows of the recipes.
+        columns (ndarray): The rows of their neighbours.
+        scores (ndarray): The scores.
+    """
+    for start in range(0, len(rows), WRITE_BATCH_SIZE):
+        stop = start + WRITE_BATCH_SIZE
+        SimilarRecipe.objects.bulk_create(
+            [
+                SimilarRecipe(
+                    recipe_id=recipe_id, similar_id=similar_id, score=score
+                )
+                for recipe_id, similar_id, score in zip(
+                    recipe_ids[rows[start:stop]].tolist(),
+                    recipe_ids[columns[start:stop]].tolist(),
+                    scores[start:stop].tolist(),
+                )
+            ]
+        )
+
+
+def delete_neighbours(recipe_ids):
+    """
+    Delete the stored neighbours of some recipes in batches.
+
+    Args:
+        recipe_ids (list): The ids of the recipes.
+    """
+    for start in range(0, len(recipe_ids), WRITE_BATCH_SIZE):
+        SimilarRecipe.objects.filter(
+            recipe_id__in=recipe_ids[start:start + WRITE_BATCH_SIZE]
+        ).delete()
+
+
+def update_similar_recipes(full=False, block_size=1000, progress=None):
+    """
+    Recompute the similar recipes.
+
+    Without `full`, only the recipes flagged as stale are recomputed
+    against all recipes, and their scores are merged into the stored
+    neighbours of the other recipes; when most of the recipes are stale,
+    everything is recomputed. The flags raised while the command runs are
+    kept for the next run.
+
+    Args:
+        full (bool): Recompute all the recipes.
+        block_size (int): The number of recipes compared at a time.
+        progress (callable): Called with the number of recipes computed
+        after every block (optional).
+
+    Returns:
+        int: The number of recomputed recipes.
+    """
+    k = settings.SIMILAR_RECIPES_COUNT
+    metric = settings.SIMILAR_RECIPES_METRIC
+    started_at = timezone.now()
+    stale = Recipe.objects.all()
+    if not full:
+        stale = stale.filter(similar_recipes_stale=True)
+    stale_ids = list(stale.values_list('pk', flat=True))
+    if not stale_ids:
+        return 0
+    if not full and len(stale_ids) * 2 > Recipe.objects.count():
+        return update_similar_recipes(True, block_size, progress)
+    recipe_ids, matrix = build_matrix(load_pairs())
+    stale_rows = np.flatnonzero(np.isin(recipe_ids, stale_ids))
+
+    pairs, neighbours = [], []
+    for number, (block_pairs, block_neighbours) in enumerate(
+        compute_neighbours(matrix, stale_rows, k, metric, block_size), 1
+    ):
+        neighbours.append(block_neighbours)
+        if not full:
+            pairs.append(block_pairs)
+        if progress is not None:
+            progress(min(number * block_size, len(stale_rows)))
+    neighbours = concatenate(neighbours)
+
+    with transaction.atomic():
+        if full:
+            SimilarRecipe.objects.all().delete()
+        else:
+            affected, reverse = merge_reverse(
+                matrix,
+                recipe_ids,
+                stale_rows,
+                concatenate(pairs),
+                k,
+                metric,
+                block_size,
+            )
+            delete_neighbours(stale_ids + recipe_ids[affected].tolist())
+            neighbours = concatenate([neighbours, reverse])
+        store_neighbours(recipe_ids, *neighbours)
+        stale.filter(updated_at__lte=started_at).update(
+            similar_recipes_stale=False
+        )
+    return len(stale_ids)
@@ -0,0 +1,46 @@
+"""
+In-memory map of the tag slugs to their ids.
+
+Tags are few and rarely change, so the recipe filter resolves the
+requested slugs from this map instead of querying the tags on every
+request. The map is kept per process and is rebuilt when the version
+of the `tags` cache namespace changes, which happens on every tag
+write.
+"""
+import threading
+
+from backend.cache import get_versions
+from recipes.models import Tag
+
+_lock = threading.Lock()
+_map = None
+_map_version = None
+
+
+def get_tag_map():
+    """
+    Get the tag map of the process, building it on first use and
+    rebuilding it after tag writes.
+
+    Returns:
+        dict: The tag ids by slug.
+    """
+    global _map, _map_version
+    version = get_versions('tags')[0]
+    if _map is not None and _map_version == version:
+        return _map
+    with _lock:
+        if _map is None or _map_version != version:
+            _map = dict(Tag.objects.values_list('slug', 'id'))
+            _map_version = version
+    return _map
+
+
+def get_tag_choices():
+    """
+    Get the tag slugs as form choices.
+
+    Returns:
+        list: The (slug, slug) pairs.
+    """
+    return [(slug, slug) for slug in get_tag_map()]
@@ -0,0 +1,1617 @@
+import base64
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+from collections import Counter
+from unittest import mock, skipUnless
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib import admin
+from django.core.cache import cache, caches
+from django.core.files.storage import default_storage
+from django.core.management import CommandError, call_command
+from django.core.paginator import EmptyPage
+from django.db import connection, connections
+from django.test import (RequestFactory, TestCase, TransactionTestCase,
+                         override_settings, skipUnlessDBFeature)
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework import status
+from rest_framework.test import APIClient, APITestCase
+
+from backend.cache import (PROCESS_LOCAL_CACHE_BACKENDS, VERSIONS_CACHE_ALIAS,
+                           check_versions_cache, get_version_key)
+from backend.pagination import ApproximateCountPaginator
+from recipes.exports import render_export_job, start_export_job
+from recipes.images import generate_renditions
+from recipes.ingredient_index import IngredientIndex, get_ingredient_index
+from recipes.models import (ExportJob, Favorite, FeedEntry, Ingredient, Recipe,
+                            RecipeIngredient, ShoppingCartIngredient,
+                            ShoppingList, Tag)
+from recipes.search import update_search_vectors
+from recipes.serializers import FavoriteSerializer
+from users.models import Subscription, User
+
+
+class RecipeSerializerTests(APITestCase):
+    """Tests of the recipe input validation."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='author',
+            email='author@example.com',
+            password='password',
+            first_name='Имя',
+            last_name='Фамилия',
+        )
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def test_non_object_body_is_rejected(self):
+        """A body that is not an object is a validation error."""
+        for body in ([1, 2], 'рецепт', 1):
+            with self.subTest(body=body):
+                response = self.client.post(
+                    '/api/recipes/', body, format='json'
+                )
+                self.assertEqual(
+                    response.status_code, status.HTTP_400_BAD_REQUEST
+                )
+                self.assertIn('non_field_errors', response.data)
+
+
+class ConditionalGetTests(APITestCase):
+    """Tests of the response validators."""
+
+    @classmethod
+    def setUpTestData(cls):
+        Ingredient.objects.create(name='соль', measurement_unit='г')
+
+    def test_encodings_share_weak_etag(self):
+        """Every encoding of a snapshot gets the same weak ETag."""
+        etags = set()
+        for encoding in ('identity', 'gzip', 'br'):
+            with self.subTest(encoding=encoding):
+                response = self.client.get(
+                    '/api/ingredients/', HTTP_ACCEPT_ENCODING=encoding
+                )
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertTrue(response['ETag'].startswith('W/"'))
+                etags.add(response['ETag'])
+                response = self.client.get(
+                    '/api/ingredients/',
+                    HTTP_ACCEPT_ENCODING=encoding,
+                    HTTP_IF_NONE_MATCH=response['ETag'],
+                )
+                self.assertEqual(
+                    response.status_code, status.HTTP_304_NOT_MODIFIED
+                )
+        self.assertEqual(len(etags), 1)
+
+
+class MultiPartRecipeTests(APITestCase):
+    """Tests of the recipes sent as multipart forms."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='author',
+            email='author@example.com',
+            password='password',
+            first_name='Имя',
+            last_name='Фамилия',
+        )
+        cls.tag = Tag.objects.create(
+            name='Завтрак', color='#E26C2D', slug='breakfast'
+        )
+        cls.ingredient = Ingredient.objects.create(
+            name='соль', measurement_unit='г'
+        )
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client.force_authenticate(self.user)
+
+    def get_image(self):
+        image = io.BytesIO()
+        Image.new('RGB', (30, 20), 'green').save(image, 'JPEG')
+        image.seek(0)
+        image.name = 'recipe.jpg'
+        return image
+
+    def test_single_parts_of_list_fields(self):
+        """A single tag or ingredient part is taken as a list of one."""
+        response = self.client.post(
+            '/api/recipes/',
+            {
+                'name': 'Омлет',
+                'text': 'Взбить и пожарить.',
+                'cooking_time': 10,
+                'tags': self.tag.pk,
+                'ingredients': json.dumps(
+                    {'id': self.ingredient.pk, 'amount': 5}
+                ),
+                'image': self.get_image(),
+            },
+            format='multipart',
+        )
+        self.assertEqual(
+            response.status_code, status.HTTP_201_CREATED, response.data
+        )
+        self.assertEqual(
+            [tag['id'] for tag in response.data['tags']], [self.tag.pk]
+        )
+        self.assertEqual(len(response.data['ingredients']), 1)
+
+    @mock.patch('recipes.signals.run_in_background')
+    def test_image_renditions(self, run_in_background):
+        """Uploaded images are scaled down and get resized renditions."""
+        image = io.BytesIO()
+        Image.new('RGB', (3000, 1500), 'green').save(image, 'JPEG')
+        image.seek(0)
+        image.name = 'recipe.jpg'
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                '/api/recipes/',
+                {
+                    'name': 'Омлет',
+                    'text': 'Взбить и пожарить.',
+                    'cooking_time': 10,
+                    'tags': self.tag.pk,
+                    'ingredients': json.dumps(
+                        {'id': self.ingredient.pk, 'amount': 5}
+                    ),
+                    'image': image,
+                },
+                format='multipart',
+            )
+        self.assertEqual(
+            response.status_code, status.HTTP_201_CREATED, response.data
+        )
+        self.assertEqual(response.data['image_renditions'], {})
+        recipe = Recipe.objects.get(pk=response.data['id'])
+        with Image.open(recipe.image) as stored:
+            self.assertEqual(stored.size, (2048, 1024))
+        run_in_background.assert_any_call(generate_renditions, recipe.pk)
+
+        self.assertTrue(generate_renditions(recipe.pk))
+        self.assertFalse(generate_renditions(recipe.pk))
+        response = self.client.get(f'/api/recipes/{recipe.pk}/')
+        renditions = response.data['image_renditions']
+        self.assertEqual(
+            set(renditions), {'card', 'card_webp', 'detail', 'detail_webp'}
+        )
+        recipe.refresh_from_db()
+        for name, size, image_format in (
+            ('card', (480, 240), 'JPEG'),
+            ('card_webp', (480, 240), 'WEBP'),
+            ('detail', (1280, 640), 'JPEG'),
+            ('detail_webp', (1280, 640), 'WEBP'),
+        ):
+            with self.subTest(name):
+                path = recipe.image_renditions[name]
+                self.assertTrue(renditions[name].endswith(path))
+                with default_storage.open(path) as file:
+                    rendition = Image.open(file)
+                    self.assertEqual(rendition.size, size)
+                    self.assertEqual(rendition.format, image_format)
+
+
+class ApproximateCountPaginatorTests(TestCase):
+    """Tests of the pagination with an estimated count."""
+
+    @classmethod
+    def setUpTestData(cls):
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'ингредиент {number}', measurement_unit='г')
+            for number in range(5)
+        )
+
+    def get_paginator(self, estimated_count):
+        paginator = ApproximateCountPaginator(
+            Ingredient.objects.order_by('id'), 2
+        )
+        patcher = mock.patch.object(
+            paginator, 'get_estimated_count', return_value=estimated_count
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return paginator
+
+    def test_underestimated_count(self):
+        """The pages past the estimate are served and linked."""
+        paginator = self.get_paginator(1)
+        self.assertEqual(paginator.count, 1)
+        self.assertTrue(paginator.count_is_approximate)
+        self.assertTrue(paginator.page(1).has_next())
+        self.assertTrue(paginator.page(2).has_next())
+        page = paginator.page(3)
+        self.assertEqual(len(page), 1)
+        self.assertFalse(page.has_next())
+        self.assertEqual(page.end_index(), 5)
+        with self.assertRaises(EmptyPage):
+            paginator.page(4)
+
+    def test_overestimated_count(self):
+        """The last page is found from the rows, not from the estimate."""
+        paginator = self.get_paginator(100)
+        self.assertEqual(paginator.count, 100)
+        self.assertFalse(paginator.page(3).has_next())
+        with self.assertRaises(EmptyPage):
+            paginator.page(4)
+
+    def test_exact_count(self):
+        """Small querysets are counted and paginated as usual."""
+        paginator = self.get_paginator(None)
+        self.assertEqual(paginator.count, 5)
+        self.assertFalse(paginator.count_is_approximate)
+        self.assertEqual(paginator.num_pages, 3)
+        with self.assertRaises(EmptyPage):
+            paginator.page(4)
+
+
+class CursorPaginationTests(APITestCase):
+    """Tests of the keyset cursor pagination."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='author',
+            email='author@example.com',
+            password='password',
+            first_name='Имя',
+            last_name='Фамилия',
+        )
+        cls.recipes = Recipe.objects.bulk_create(
+            Recipe(
+                author=cls.user,
+                name=f'Рецепт {number}',
+                image='recipes/recipe.png',
+                text='Описание.',
+                cooking_time=10,
+            )
+            for number in range(1150)
+        )
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def get_pages(self, url, link, max_pages=20):
+        ids = []
+        while url:
+            self.assertLess(len(ids), max_pages, 'The pages never end.')
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            ids.append([recipe['id'] for recipe in response.data['results']])
+            url = response.data[link]
+        return ids
+
+    def test_popular_ties_past_offset_cutoff(self):
+        """Pages through more than 1000 recipes of the same popularity."""
+        pages = self.get_pages(
+            '/api/recipes/?ordering=popular&pagination=cursor&limit=100',
+            'next',
+        )
+        expected = sorted((recipe.pk for recipe in self.recipes), reverse=True)
+        self.assertEqual(len(pages), 12)
+        self.assertEqual(sum(pages, []), expected)
+        response = self.client.get(
+            '/api/recipes/?ordering=popular&pagination=cursor&limit=100'
+        )
+        for _ in range(11):
+            response = self.client.get(response.data['next'])
+        self.assertIsNone(response.data['next'])
+        backwards = self.get_pages(response.data['previous'], 'previous')
+        self.assertEqual(sum(reversed(backwards), []), expected[:1100])
+
+    def test_timeline_ties_past_offset_cutoff(self):
+        """Pages through more than 1000 timeline entries of one time."""
+        follower = User.objects.create_user(
+            username='follower',
+            email='follower@example.com',
+            password='password',
+            first_name='Имя',
+            last_name='Фамилия',
+        )
+        created_at = timezone.now()
+        FeedEntry.objects.bulk_create(
+            FeedEntry(
+                user=follower,
+                recipe=recipe,
+                author=self.user,
+                created_at=created_at,
+            )
+            for recipe in self.recipes
+        )
+        self.client.force_authenticate(follower)
+        pages = self.get_pages('/api/recipes/timeline/?limit=100', 'next')
+        self.assertEqual(len(pages), 12)
+        self.assertCountEqual(
+            sum(pages, []), [recipe.pk for recipe in self.recipes]
+        )
+
+    def test_search_ranked_pages(self):
+        """Cursor pages of a search are ordered by rank like the others."""
+        Recipe.objects.bulk_create(
+            Recipe(
+                author=self.user,
+                name=name,
+                image='recipes/recipe.png',
+                text=text,
+                cooking_time=10,
+            )
+            for name, text in [
+                ('Аджика', 'Суп из неё не сварить.'),
+                *((f'Суп {number}', 'Сварить.') for number in range(12)),
+            ]
+        )
+        update_search_vectors(Recipe.objects.all())
+        query = urlencode({'search': 'Суп'})
+        response = self.client.get(f'/api/recipes/?{query}&limit=100')
+        expected = [recipe['id'] for recipe in response.data['results']]
+        self.assertGreater(len(expected), 10)
+        pages = self.get_pages(
+            f'/api/recipes/?{query}&pagination=cursor&limit=5', 'next'
+        )
+        self.assertEqual(sum(pages, []), expected)
+
+    def test_invalid_cursor(self):
+        """A malformed cursor position is a 404, not a server error."""
+        for position in ('1', '["x", "y"]', '[1]'):
+            with self.subTest(position=position):
+                cursor = base64.b64encode(
+                    urlencode({'p': position}).encode()
+                ).decode()
+                response = self.client.get(
+                    f'/api/recipes/?ordering=popular&cursor={cursor}'
+                )
+                self.assertEqual(
+                    response.status_code, status.HTTP_404_NOT_FOUND
+                )
+
+
+class ConcurrentWriteTests(TransactionTestCase):
+    """Tests of the concurrent favorite, cart and subscription requests."""
+
+    threads = 8
+
+    def setUp(self):
+        for target in ('recipes.signals', 'recipes.popularity'):
+            patcher = mock.patch(f'{target}.run_in_background')
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.user, self.author = (
+            User.objects.create_user(
+                username=username,
+                email=f'{username}@example.com',
+                password='password',
+                first_name='Имя',
+                last_name='Фамилия',
+            )
+            for username in ('user', 'author')
+        )
+        self.recipe = Recipe.objects.create(
+            author=self.author,
+            name='Омлет',
+            image='recipes/recipe.png',
+            text='Взбить и пожарить.',
+            cooking_time=10,
+        )
+        RecipeIngredient.objects.create(
+            recipe=self.recipe,
+            ingredient=Ingredient.objects.create(
+                name='яйца', measurement_unit='шт'
+            ),
+            amount=2,
+        )
+
+    def send_concurrently(self, method, url):
+        barrier = threading.Barrier(self.threads)
+        status_codes = []
+
+        def send():
+            client = APIClient()
+            client.force_authenticate(self.user)
+            try:
+                barrier.wait()
+                status_codes.append(getattr(client, method)(url).status_code)
+            finally:
+                connections.close_all()
+
+        threads = [
+            threading.Thread(target=send) for _ in range(self.threads)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return status_codes
+
+    def assert_single_success(self, status_codes, success, failure):
+        self.assertEqual(len(status_codes), self.threads)
+        self.assertEqual(status_codes.count(success), 1, status_codes)
+        self.assertEqual(
+            status_codes.count(failure), self.threads - 1, status_codes
+        )
+
+    @skipUnlessDBFeature('test_db_allows_multiple_connections')
+    def test_concurrent_requests(self):
+        """Only one of the duplicate requests succeeds, none fails."""
+        for url, model, counted, counter_field in (
+            (
+                f'/api/recipes/{self.recipe.pk}/favorite/',
+                Favorite,
+                self.recipe,
+                'favorites_count',
+            ),
+            (
+                f'/api/recipes/{self.recipe.pk}/shopping_cart/',
+                ShoppingList,
+                self.recipe,
+                'in_carts_count',
+            ),
+            (
+                f'/api/users/{self.author.pk}/subscribe/',
+                Subscription,
+                self.author,
+                'followers_count',
+            ),
+        ):
+            with self.subTest(url=url):
+                self.assert_single_success(
+                    self.send_concurrently('post', url),
+                    status.HTTP_201_CREATED,
+                    status.HTTP_400_BAD_REQUEST,
+                )
+                counted.refresh_from_db()
+                self.assertEqual(getattr(counted, counter_field), 1)
+                self.assert_single_success(
+                    self.send_concurrently('delete', url),
+                    status.HTTP_204_NO_CONTENT,
+                    status.HTTP_404_NOT_FOUND,
+                )
+                counted.refresh_from_db()
+                self.assertEqual(getattr(counted, counter_field), 0)
+                self.assertFalse(model.objects.exists())
+        self.assertFalse(ShoppingCartIngredient.objects.exists())
+
+    def test_recipe_deleted_after_validation(self):
+        """A recipe deleted before the insert is not reported as added."""
+        client = APIClient()
+        client.force_authenticate(self.user)
+        is_valid = FavoriteSerializer.is_valid
+
+        def delete_recipe(serializer, **kwargs):
+            valid = is_valid(serializer, **kwargs)
+            Recipe.objects.filter(pk=self.recipe.pk).delete()
+            return valid
+
+        with mock.patch.object(FavoriteSerializer, 'is_valid', delete_recipe):
+            response = client.post(f'/api/recipes/{self.recipe.pk}/favorite/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertFalse(Favorite.objects.exists())
+
+
+class RecipeIngredientWriteTests(APITestCase):
+    """Tests of the writes of a recipe update to its tags and ingredients."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='author',
+            email='author@example.com',
+            password='password',
+            first_name='Имя',
+            last_name='Фамилия',
+        )
+        cls.tags = Tag.objects.bulk_create(
+            Tag(name=name, color=color, slug=slug)
+            for name, color, slug in (
+                ('Завтрак', '#E26C2D', 'breakfast'),
+                ('Обед', '#49B64E', 'lunch'),
+                ('Ужин', '#8775D2', 'dinner'),
+            )
+        )
+        cls.ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=name, measurement_unit='г')
+            for name in ('соль', 'сахар', 'мука', 'масло')
+        )
+        cls.recipe = Recipe.objects.create(
+            author=cls.user,
+            name='Блины',
+            image='recipes/recipe.png',
+            text='Смешать и пожарить.',
+            cooking_time=30,
+        )
+        cls.recipe.tags.set(cls.tags[:2])
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                recipe=cls.recipe, ingredient=ingredient, amount=5
+            )
+            for ingredient in cls.ingredients[:3]
+        )
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def get_payload(self, tags=None, amounts=None):
+        if tags is None:
+            tags = self.tags[:2]
+        if amounts is None:
+            amounts = {ingredient: 5 for ingredient in self.ingredients[:3]}
+        return {
+            'name': self.recipe.name,
+            'text': self.recipe.text,
+            'cooking_time': self.recipe.cooking_time,
+            'tags': [tag.pk for tag in tags],
+            'ingredients': [
+                {'id': ingredient.pk, 'amount': amount}
+                for ingredient, amount in amounts.items()
+            ],
+        }
+
+    def get_child_writes(self, payload):
+        """
+        Update the recipe and count the writes to its tags and
+        ingredients.
+
+        Returns:
+            Counter: The numbers of statements by (verb, table).
+        """
+        tables = (
+            RecipeIngredient._meta.db_table,
+            Recipe.tags.through._meta.db_table,
+        )
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.patch(
+                f'/api/recipes/{self.recipe.pk}/', payload, format='json'
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        writes = Counter()
+        for query in context.captured_queries:
+            verb = query['sql'].split(None, 1)[0].upper()
+            if verb not in ('INSERT', 'UPDATE', 'DELETE'):
+                continue
+            for table in tables:
+                if f'"{table}"' in query['sql']:
+                    writes[verb, table] += 1
+        return writes
+
+    def test_unchanged(self):
+        """An update that changes nothing writes no children."""
+        self.assertEqual(self.get_child_writes(self.get_payload()), Counter())
+
+    def test_changed_amount(self):
+        """A changed amount is a single update."""
+        amounts = {ingredient: 5 for ingredient in self.ingredients[:3]}
+        amounts[self.ingredients[0]] = 7
+        self.assertEqual(
+            self.get_child_writes(self.get_payload(amounts=amounts)),
+            Counter({('UPDATE', RecipeIngredient._meta.db_table): 1}),
+        )
+        self.assertEqual(
+            self.recipe.recipes.get(ingredient=self.ingredients[0]).amount, 7
+        )
+
+    def test_added_and_removed_ingredients(self):
+        """A replaced ingredient is a single delete and a single insert."""
+        amounts = {ingredient: 5 for ingredient in self.ingredients[1:]}
+        self.assertEqual(
+            self.get_child_writes(self.get_payload(amounts=amounts)),
+            Counter(
+                {
+                    ('DELETE', RecipeIngredient._meta.db_table): 1,
+                    ('INSERT', RecipeIngredient._meta.db_table): 1,
+                }
+            ),
+        )
+        self.assertCountEqual(
+            self.recipe.recipes.values_list('ingredient', flat=True),
+            [ingredient.pk for ingredient in self.ingredients[1:]],
+        )
+
+    def test_changed_tags(self):
+        """A replaced tag is a single delete and a single insert."""
+        tags_table = Recipe.tags.through._meta.db_table
+        self.assertEqual(
+            self.get_child_writes(self.get_payload(tags=self.tags[1:])),
+            Counter({('DELETE', tags_table): 1, ('INSERT', tags_table): 1}),
+        )
+        self.assertCountEqual(self.recipe.tags.all(), self.tags[1:])
+
+
+class ShoppingCartAdminTests(TestCase):
+    """Tests of the shopping cart aggregate kept in sync by the admin."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser(
+            username='admin',
+            email='admin@example.com',
+            password='password',
+            first_name='Имя',
+            last_name='Фамилия',
+        )
+        cls.recipe = Recipe.objects.create(
+            author=cls.user,
+            name='Блины',
+            image='recipes/recipe.png',
+            text='Смешать и пожарить.',
+            cooking_time=30,
+        )
+        cls.flour, cls.milk = Ingredient.objects.bulk_create(
+            Ingredient(name=name, measurement_unit='г')
+            for name in ('мука', 'молоко')
+        )
+        cls.recipe_ingredient = RecipeIngredient.objects.create(
+            recipe=cls.recipe, ingredient=cls.flour, amount=200
+        )
+
+    def setUp(self):
+        self.request = RequestFactory().post('/admin/')
+        self.request.user = self.user
+
+    def get_totals(self):
+        return dict(
+            ShoppingCartIngredient.objects.filter(user=self.user).values_list(
+                'ingredient', 'total_amount'
+            )
+        )
+
+    def test_shopping_list_admin(self):
+        """Shopping cart entries added and deleted in the admin count."""
+        model_admin = admin.site._registry[ShoppingList]
+        shopping_list = ShoppingList(user=self.user, recipe=self.recipe)
+        model_admin.save_model(self.request, shopping_list, None, False)
+        self.assertEqual(self.get_totals(), {self.flour.pk: 200})
+        model_admin.delete_queryset(
+            self.request, ShoppingList.objects.filter(pk=shopping_list.pk)
+        )
+        self.assertEqual(self.get_totals(), {})
+
+    def test_recipe_ingredient_admin(self):
+        """Recipe ingredients changed in the admin update the carts."""
+        ShoppingList.objects.create(user=self.user, recipe=self.recipe)
+        ShoppingCartIngredient.objects.add_recipes(
+            self.user, [self.recipe.pk]
+        )
+        model_admin = admin.site._registry[RecipeIngredient]
+        self.recipe_ingredient.amount = 250
+        model_admin.save_model(
+            self.request, self.recipe_ingredient, None, True
+        )
+        model_admin.save_model(
+            self.request,
+            RecipeIngredient(
+                recipe=self.recipe, ingredient=self.milk, amount=500
+            ),
+            None,
+            False,
+        )
+        self.assertEqual(
+            self.get_totals(), {self.flour.pk: 250, self.milk.pk: 500}
+        )
+        model_admin.delete_model(self.request, self.recipe_ingredient)
+        self.assertEqual(self.get_totals(), {self.milk.pk: 500})
+
+
+class CounterTests(TestCase):
+    """Tests of the denormalized counters kept outside of the API."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author, cls.user = (
+            User.objects.create_user(
+                username=username,
+                email=f'{username}@example.com',
+                password='password',
+                first_name='Имя',
+                last_name='Фамилия',
+            )
+            for username in ('author', 'user')
+        )
+        cls.recipes = [
+            Recipe.objects.create(
+                author=cls.author,
+                name=name,
+                image='recipes/recipe.png',
+                text='Смешать и пожарить.',
+                cooking_time=30,
+            )
+            for name in ('Блины', 'Оладьи')
+        ]
+
+    def setUp(self):
+        self.request = RequestFactory().post('/admin/')
+        self.request.user = self.author
+
+    def get_counters(self):
+        self.author.refresh_from_db()
+        counters = {
+            'recipes_count': self.author.recipes_count,
+            'followers_count': self.author.followers_count,
+        }
+        for recipe in Recipe.objects.order_by('name'):
+            counters[f'{recipe.name}.favorites_count'] = recipe.favorites_count
+            counters[f'{recipe.name}.in_carts_count'] = recipe.in_carts_count
+        return counters
+
+    def test_recipes_count(self):
+        """Recipes created and deleted outside of the API are counted."""
+        self.assertEqual(self.get_counters()['recipes_count'], 2)
+        self.recipes[0].delete()
+        self.assertEqual(self.get_counters()['recipes_count'], 1)
+
+    def test_user_deleted(self):
+        """Entries deleted with their user are uncounted."""
+        first, second = self.recipes
+        Favorite.objects.add_recipes(self.user, [first.pk, second.pk])
+        ShoppingList.objects.add_recipes(self.user, [first.pk])
+        Subscription.objects.create(follower=self.user, following=self.author)
+        Recipe.objects.filter(pk=first.pk).update(favorites_count=2)
+        self.author.followers_count = 1
+        self.author.save(update_fields=['followers_count'])
+        self.user.delete()
+        self.assertEqual(
+            self.get_counters(),
+            {
+                'recipes_count': 2,
+                'followers_count': 0,
+                'Блины.favorites_count': 1,
+                'Блины.in_carts_count': 0,
+                'Оладьи.favorites_count': 0,
+                'Оладьи.in_carts_count': 0,
+            },
+        )
+
+    def test_author_deleted(self):
+        """Deleting an author with recipes deletes everything."""
+        Favorite.objects.add_recipes(self.user, [self.recipes[0].pk])
+        self.author.delete()
+        self.assertFalse(Recipe.objects.exists())
+        self.assertFalse(Favorite.objects.exists())
+
+    def test_user_related_admin(self):
+        """Favorites and cart entries changed in the admin are counted."""
+        first, second = self.recipes
+        for model, counter in (
+            (Favorite, 'favorites_count'),
+            (ShoppingList, 'in_carts_count'),
+        ):
+            with self.subTest(model=model.__name__):
+                model_admin = admin.site._registry[model]
+                entry = model(user=self.user, recipe=first)
+                model_admin.save_model(self.request, entry, None, False)
+                self.assertEqual(
+                    self.get_counters()[f'Блины.{counter}'], 1
+                )
+                entry.recipe = second
+                model_admin.save_model(self.request, entry, None, True)
+                counters = self.get_counters()
+                self.assertEqual(counters[f'Блины.{counter}'], 0)
+                self.assertEqual(counters[f'Оладьи.{counter}'], 1)
+                other = model.objects.create(user=self.author, recipe=second)
+                Recipe.objects.filter(pk=second.pk).update(**{counter: 2})
+                model_admin.delete_model(self.request, other)
+                self.assertEqual(
+                    self.get_counters()[f'Оладьи.{counter}'], 1
+                )
+                model_admin.delete_queryset(
+                    self.request, model.objects.filter(pk=entry.pk)
+                )
+                self.assertEqual(
+                    self.get_counters()[f'Оладьи.{counter}'], 0
+                )
+
+    def test_subscription_admin(self):
+        """Subscriptions added and deleted in the admin are counted."""
+        model_admin = admin.site._registry[Subscription]
+        subscription = Subscription(follower=self.user, following=self.author)
+        model_admin.save_model(self.request, subscription, None, False)
+        self.assertEqual(self.get_counters()['followers_count'], 1)
+        model_admin.delete_queryset(
+            self.request, Subscription.objects.filter(pk=subscription.pk)
+        )
+        self.assertEqual(self.get_counters()['followers_count'], 0)
+
+
+class SharedVersionTests(APITestCase):
+    """Tests of the cache versions shared by the processes."""
+
+    def test_bump_from_other_process(self):
+        """Versions bumped elsewhere rebuild the per-process structures."""
+        Ingredient.objects.create(name='мука', measurement_unit='г')
+        Tag.objects.create(name='Завтрак', color='#E26C2D', slug='breakfast')
+        self.assertEqual(len(get_ingredient_index().search('соль', 10)), 0)
+        self.assertEqual(len(self.client.get('/api/tags/').json()), 1)
+        Ingredient.objects.bulk_create(
+            [Ingredient(name='соль', measurement_unit='г')]
+        )
+        Tag.objects.bulk_create(
+            [Tag(name='Обед', color='#49B64E', slug='lunch')]
+        )
+        self.assertEqual(len(get_ingredient_index().search('соль', 10)), 0)
+        self.assertEqual(len(self.client.get('/api/tags/').json()), 1)
+        other_process_cache = caches.create_connection(VERSIONS_CACHE_ALIAS)
+        for namespace in ('ingredients', 'tags'):
+            other_process_cache.incr(get_version_key(namespace))
+        self.assertEqual(len(get_ingredient_index().search('соль', 10)), 1)
+        self.assertEqual(len(self.client.get('/api/tags/').json()), 2)
+
+    def test_process_local_cache_rejected(self):
+        """A versions cache local to the process fails the checks."""
+        self.assertEqual(check_versions_cache(None), [])
+        for backend in PROCESS_LOCAL_CACHE_BACKENDS:
+            with self.subTest(backend=backend), override_settings(
+                CACHES={
+                    'default': {'BACKEND': backend},
+                    VERSIONS_CACHE_ALIAS: {'BACKEND': backend},
+                }
+            ):
+                self.assertEqual(
+                    [error.id for error in check_versions_cache(None)],
+                    ['backend.E002'],
+                )
+
+
+class RecipeQueryCountTests(APITestCase):
+    """Tests of the number of queries of the recipe list and detail."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='author',
+            email='author@example.com',
+            password='password',
+            first_name='Имя',
+            last_name='Фамилия',
+        )
+        cls.tags = Tag.objects.bulk_create(
+            Tag(name=name, color=color, slug=slug)
+            for name, color, slug in (
+                ('Завтрак', '#E26C2D', 'breakfast'),
+                ('Обед', '#49B64E', 'lunch'),
+                ('Ужин', '#8775D2', 'dinner'),
+            )
+        )
+        cls.ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=name, measurement_unit='г')
+            for name in ('мука', 'молоко', 'яйца', 'соль')
+        )
+
+    def create_recipes(self, count):
+        for _ in range(count):
+            recipe = Recipe.objects.create(
+                author=self.user,
+                name=f'Рецепт {Recipe.objects.count()}',
+                image='recipes/recipe.png',
+                text='Смешать и пожарить.',
+                cooking_time=30,
+            )
+            recipe.tags.set(self.tags)
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(
+                    recipe=recipe, ingredient=ingredient, amount=100
+                )
+                for ingredient in self.ingredients
+            )
+            Favorite.objects.create(user=self.user, recipe=recipe)
+            ShoppingList.objects.create(user=self.user, recipe=recipe)
+
+    def get_clients(self):
+        authenticated = APIClient()
+        authenticated.force_authenticate(self.user)
+        return {'anonymous': APIClient(), 'authenticated': authenticated}
+
+    def get(self, client, url):
+        # Anonymous responses would be served from the response cache.
+        cache.clear()
+        response = client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response
+
+    def test_query_counts(self):
+        """The queries don't depend on the number of recipes."""
+        self.create_recipes(1)
+        recipe = Recipe.objects.get()
+        urls = ('/api/recipes/?limit=20', f'/api/recipes/{recipe.pk}/')
+        query_counts = {}
+        for name, client in self.get_clients().items():
+            for url in urls:
+                # The first request seeds the versions and the tag map.
+                self.get(client, url)
+                with CaptureQueriesContext(connection) as context:
+                    self.get(client, url)
+                query_counts[name, url] = len(context)
+        self.create_recipes(19)
+        for name, client in self.get_clients().items():
+            for url in urls:
+                with self.subTest(client=name, url=url):
+                    with self.assertNumQueries(query_counts[name, url]):
+                        response = self.get(client, url)
+                    if 'limit' in url:
+                        self.assertEqual(len(response.data['results']), 20)
+                    else:
+                        self.assertEqual(len(response.data['tags']), 3)
+                        self.assertEqual(
+                            len(response.data['ingredients']), 4
+                        )
+
+
+class IngredientIndexTests(APITestCase):
+    """Tests of the in-memory ingredient index."""
+
+    def get_names(self, index, query, limit=10):
+        return [entry['name'] for entry in index.search(query, limit)]
+
+    def test_search(self):
+        """Names starting with the query come before inner words."""
+        index = IngredientIndex(
+            (pk, name, unit)
+            for pk, (name, unit) in enumerate(
+                (
+                    ('соль морская', 'г'),
+                    ('Соль', 'г'),
+                    ('черный перец', 'г'),
+                    ('Перец черный', 'г'),
+                    ('Сахар', 'г'),
+                    ('Масло (сливочное)', 'мл'),
+                ),
+                start=1,
+            )
+        )
+        self.assertEqual(len(index), 6)
+        self.assertEqual(
+            self.get_names(index, ' СОЛ '), ['Соль', 'соль морская']
+        )
+        self.assertEqual(
+            self.get_names(index, 'перец'), ['Перец черный', 'черный перец']
+        )
+        self.assertEqual(
+            self.get_names(index, 'черн'), ['черный перец', 'Перец черный']
+        )
+        self.assertEqual(
+            self.get_names(index, 'слив'), ['Масло (сливочное)']
+        )
+        self.assertEqual(
+            self.get_names(index, 'с', limit=2), ['Сахар', 'Соль']
+        )
+        self.assertEqual(self.get_names(index, 'мор'), ['соль морская'])
+        self.assertEqual(self.get_names(index, 'хлеб'), [])
+        self.assertEqual(self.get_names(index, ''), [])
+        self.assertEqual(
+            index.search('мас', 10),
+            [
+                {
+                    'id': 6,
+                    'name': 'Масло (сливочное)',
+                    'measurement_unit': 'мл',
+                }
+            ],
+        )
+
+    def get_found_names(self, name):
+        response = self.client.get('/api/ingredients/', {'name': name})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [ingredient['name'] for ingredient in response.data]
+
+    def test_rebuilt_after_writes(self):
+        """Created and renamed ingredients are found."""
+        ingredient = Ingredient.objects.create(
+            name='мука пшеничная', measurement_unit='г'
+        )
+        self.assertEqual(self.get_found_names('мука'), ['мука пшеничная'])
+        with self.captureOnCommitCallbacks(execute=True):
+            Ingredient.objects.create(name='Мука ржаная', measurement_unit='г')
+        self.assertEqual(
+            self.get_found_names('мука'), ['мука пшеничная', 'Мука ржаная']
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            ingredient.name = 'крупа манная'
+            ingredient.save()
+        self.assertEqual(self.get_found_names('мука'), ['Мука ржаная'])
+        self.assertEqual(self.get_found_names('ман'), ['крупа манная'])
+
+
+class TagFilterTests(APITestCase):
+    """Tests of the recipe tag filter."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='author',
+            email='author@example.com',
+            password='password',
+            first_name='Имя',
+            last_name='Фамилия',
+        )
+        cls.breakfast, cls.lunch = Tag.objects.bulk_create(
+            Tag(name=name, color=color, slug=slug)
+            for name, color, slug in (
+                ('Завтрак', '#E26C2D', 'breakfast'),
+                ('Обед', '#49B64E', 'lunch'),
+            )
+        )
+        cls.recipes = {}
+        for name, tags in (
+            ('Блины', [cls.breakfast]),
+            ('Борщ', [cls.breakfast, cls.lunch]),
+            ('Плов', [cls.lunch]),
+            ('Чай', []),
+        ):
+            cls.recipes[name] = Recipe.objects.create(
+                author=cls.user,
+                name=name,
+                image='recipes/recipe.png',
+                text='Приготовить.',
+                cooking_time=30,
+            )
+            cls.recipes[name].tags.set(tags)
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def get_names(self, **params):
+        response = self.client.get('/api/recipes/', params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [recipe['name'] for recipe in response.data['results']]
+
+    def test_tagged(self):
+        """Recipes are matched by any or all of the tags, once each."""
+        both = [self.breakfast.pk, self.lunch.pk]
+        for tag_ids, match_all, names in (
+            ([self.breakfast.pk], False, ['Блины', 'Борщ']),
+            (both, False, ['Блины', 'Борщ', 'Плов']),
+            (both, True, ['Борщ']),
+            ([self.lunch.pk], True, ['Борщ', 'Плов']),
+        ):
+            with self.subTest(tag_ids=tag_ids, match_all=match_all):
+                self.assertEqual(
+                    list(
+                        Recipe.objects.tagged(tag_ids, match_all)
+                        .order_by('name')
+                        .values_list('name', flat=True)
+                    ),
+                    names,
+                )
+
+    def test_filter(self):
+        """The `tags` filter matches any tag, or all with `tags_match`."""
+        self.assertEqual(
+            self.get_names(tags='breakfast'), ['Блины', 'Борщ']
+        )
+        self.assertEqual(
+            self.get_names(tags=['breakfast', 'lunch']),
+            ['Блины', 'Борщ', 'Плов'],
+        )
+        self.assertEqual(
+            self.get_names(tags=['breakfast', 'lunch'], tags_match='any'),
+            ['Блины', 'Борщ', 'Плов'],
+        )
+        self.assertEqual(
+            self.get_names(tags=['breakfast', 'lunch'], tags_match='all'),
+            ['Борщ'],
+        )
+        self.assertEqual(
+            self.get_names(), ['Блины', 'Борщ', 'Плов', 'Чай']
+        )
+
+    def test_tag_map_invalidation(self):
+        """Added and renamed tags are filtered by their new slugs."""
+        response = self.client.get('/api/recipes/', {'tags': 'dinner'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        with self.captureOnCommitCallbacks(execute=True):
+            dinner = Tag.objects.create(
+                name='Ужин', color='#8775D2', slug='dinner'
+            )
+        self.recipes['Чай'].tags.add(dinner)
+        self.assertEqual(self.get_names(tags='dinner'), ['Чай'])
+        with self.captureOnCommitCallbacks(execute=True):
+            dinner.slug = 'supper'
+            dinner.save()
+        self.assertEqual(self.get_names(tags='supper'), ['Чай'])
+        response = self.client.get('/api/recipes/', {'tags': 'dinner'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ShoppingCartDownloadTests(APITestCase):
+    """Tests of the shopping cart downloads."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='buyer',
+            email='buyer@example.com',
+            password='password',
+            first_name='Имя',
+            last_name='Фамилия',
+        )
+        recipe = Recipe.objects.create(
+            author=cls.user,
+            name='Блины',
+            image='recipes/recipe.png',
+            text='Смешать и пожарить.',
+            cooking_time=30,
+        )
+        flour, milk = Ingredient.objects.bulk_create(
+            (
+                Ingredient(name='мука', measurement_unit='г'),
+                Ingredient(name='молоко', measurement_unit='мл'),
+            )
+        )
+        RecipeIngredient.objects.bulk_create(
+            (
+                RecipeIngredient(recipe=recipe, ingredient=flour, amount=200),
+                RecipeIngredient(recipe=recipe, ingredient=milk, amount=500),
+            )
+        )
+        ShoppingList.objects.create(user=cls.user, recipe=recipe)
+        ShoppingCartIngredient.objects.add_recipes(cls.user, [recipe.pk])
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def download(self, **params):
+        return self.client.get('/api/recipes/download_shopping_cart/', params)
+
+    def test_pdf(self):
+        """The shopping cart is downloaded as a PDF file by default."""
+        response = self.download()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertIn('attachment', response['Content-Disposition'])
+        content = b''.join(response.streaming_content)
+        self.assertTrue(content.startswith(b'%PDF'))
+
+    def test_text_formats(self):
+        """The text formats are streamed as attachments."""
+        expected = {
+            'csv': (
+                'text/csv; charset=utf-8',
+                'name,measurement_unit,amount\r\n'
+                'молоко,мл,500\r\nмука,г,200\r\n',
+            ),
+            'txt': (
+                'text/plain; charset=utf-8',
+                '• молоко (мл) — 500\n• мука (г) — 200\n',
+            ),
+            'json': (
+                'application/json',
+                '[{"name": "молоко", "measurement_unit": "мл", '
+                '"amount": 500},'
+                '{"name": "мука", "measurement_unit": "г", "amount": 200}]',
+            ),
+        }
+        for export_format, (content_type, content) in expected.items():
+            with self.subTest(export_format):
+                response = self.download(format=export_format)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertTrue(response.streaming)
+                self.assertEqual(response['Content-Type'], content_type)
+                self.assertIn(
+                    f'.{export_format}', response['Content-Disposition']
+                )
+                self.assertEqual(
+                    b''.join(response.streaming_content).decode(), content
+                )
+
+    def test_unknown_format(self):
+        """An unknown format is rejected."""
+        response = self.download(format='xml')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('format', response.data)
+
+    def test_anonymous(self):
+        """Anonymous users cannot download a shopping cart."""
+        self.client.force_authenticate(None)
+        response = self.download(format='csv')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class ExportJobTests(APITestCase):
+    """Tests of the background shopping cart exports."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='buyer',
+            email='buyer@example.com',
+            password='password',
+            first_name='Имя',
+            last_name='Фамилия',
+        )
+        recipe = Recipe.objects.create(
+            author=cls.user,
+            name='Блины',
+            image='recipes/recipe.png',
+            text='Смешать и пожарить.',
+            cooking_time=30,
+        )
+        RecipeIngredient.objects.create(
+            recipe=recipe,
+            ingredient=Ingredient.objects.create(
+                name='мука', measurement_unit='г'
+            ),
+            amount=200,
+        )
+        ShoppingList.objects.create(user=cls.user, recipe=recipe)
+        ShoppingCartIngredient.objects.add_recipes(cls.user, [recipe.pk])
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        patcher = mock.patch('recipes.exports.run_in_background')
+        self.run_in_background = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client.force_authenticate(self.user)
+
+    def test_export_job(self):
+        """A job is shared until rendered, then redirects to its file."""
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/exports/', {'format': 'csv'})
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['status'], ExportJob.Status.PENDING)
+        self.assertIsNone(response.data['file'])
+        location = response['Location']
+        self.assertTrue(
+            location.endswith(f'/api/exports/{response.data["id"]}/')
+        )
+        self.run_in_background.assert_called_once_with(
+            render_export_job, response.data['id']
+        )
+
+        response = self.client.post('/api/exports/', {'format': 'csv'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Location'], location)
+        self.run_in_background.assert_called_once()
+
+        response = self.client.get(location)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['status'], ExportJob.Status.PENDING)
+
+        render_export_job(response.data['id'])
+        response = self.client.get(location)
+        self.assertEqual(response.status_code, status.HTTP_303_SEE_OTHER)
+        job = ExportJob.objects.get()
+        self.assertEqual(job.status, ExportJob.Status.DONE)
+        self.assertTrue(response['Location'].endswith(job.file.url))
+        with job.file.open('rb') as file:
+            self.assertEqual(
+                file.read().decode(),
+                'name,measurement_unit,amount\r\nмука,г,200\r\n',
+            )
+
+    def test_other_user(self):
+        """The jobs of other users are not found."""
+        job, _ = start_export_job(self.user, ExportJob.Format.PDF)
+        other = User.objects.create_user(
+            username='other',
+            email='other@example.com',
+            password='password',
+            first_name='Имя',
+            last_name='Фамилия',
+        )
+        self.client.force_authenticate(other)
+        response = self.client.get(f'/api/exports/{job.pk}/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_unknown_format(self):
+        """An unknown format is rejected."""
+        response = self.client.post('/api/exports/', {'format': 'xml'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(ExportJob.objects.exists())
+
+
+class IngredientImportTests(TestCase):
+    """Tests of the `import_ingredients` command."""
+
+    @classmethod
+    def setUpTestData(cls):
+        Ingredient.objects.create(name='соль', measurement_unit='г')
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.csv_path = os.path.join(directory, 'ingredients.csv')
+        with open(self.csv_path, 'w', encoding='utf-8') as file:
+            file.write(
+                'соль,г\n'
+                'мука, г \n'
+                'мука,г\n'
+                'молоко\n'
+                'сахар,\n'
+                'молоко,мл\n'
+            )
+        self.json_path = os.path.join(directory, 'ingredients.json')
+        with open(self.json_path, 'w', encoding='utf-8') as file:
+            json.dump(
+                [
+                    {'name': 'соль', 'measurement_unit': 'г'},
+                    {'name': 'перец', 'measurement_unit': 'г'},
+                    {'name': 'перец', 'measurement_unit': 'шт.'},
+                ],
+                file,
+                ensure_ascii=False,
+            )
+
+    def import_ingredients(self, *args, **options):
+        stdout, stderr = io.StringIO(), io.StringIO()
+        call_command(
+            'import_ingredients', *args, stdout=stdout, stderr=stderr,
+            **options,
+        )
+        return stdout.getvalue(), stderr.getvalue()
+
+    def get_ingredients(self):
+        return set(
+            Ingredient.objects.values_list('name', 'measurement_unit')
+        )
+
+    def test_csv(self):
+        """New rows are imported once, the invalid ones are reported."""
+        stdout, stderr = self.import_ingredients(
+            self.csv_path, batch_size=2
+        )
+        self.assertEqual(
+            self.get_ingredients(),
+            {('соль', 'г'), ('мука', 'г'), ('молоко', 'мл')},
+        )
+        self.assertIn('Imported 2 new ingredients out of 4 rows', stdout)
+        self.assertIn('2 invalid rows skipped', stdout)
+        self.assertEqual(stderr.count('Skipped:'), 2)
+
+        stdout, _ = self.import_ingredients(self.csv_path)
+        self.assertIn('Imported 0 new ingredients', stdout)
+        self.assertEqual(Ingredient.objects.count(), 3)
+
+    def test_json(self):
+        """JSON arrays are imported."""
+        stdout, _ = self.import_ingredients(self.json_path)
+        self.assertEqual(
+            self.get_ingredients(),
+            {('соль', 'г'), ('перец', 'г'), ('перец', 'шт.')},
+        )
+        self.assertIn('Imported 2 new ingredients out of 3 rows', stdout)
+
+    @skipUnless(connection.vendor == 'postgresql', 'requires PostgreSQL')
+    def test_copy(self):
+        """The rows are loaded with COPY on PostgreSQL."""
+        self.import_ingredients(self.csv_path, copy=True)
+        self.assertEqual(
+            self.get_ingredients(),
+            {('соль', 'г'), ('мука', 'г'), ('молоко', 'мл')},
+        )
+
+    def test_dry_run(self):
+        """A dry run reports the import without storing it."""
+        stdout, _ = self.import_ingredients(self.json_path, dry_run=True)
+        self.assertIn('Would import 2 new ingredients', stdout)
+        self.assertEqual(self.get_ingredients(), {('соль', 'г')})
+
+    def test_errors(self):
+        """Missing files and unknown formats are reported."""
+        with self.assertRaisesMessage(CommandError, 'does not exist'):
+            self.import_ingredients('missing.csv')
+        with self.assertRaisesMessage(CommandError, 'Unknown format'):
+            self.import_ingredients(self.csv_path + '.xml')
+
+
+class BulkRecipesTests(APITestCase):
+    """Tests of the bulk favorite and shopping cart endpoints."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='buyer',
+            email='buyer@example.com',
+            password='password',
+            first_name='Имя',
+            last_name='Фамилия',
+        )
+        cls.flour = Ingredient.objects.create(
+            name='мука', measurement_unit='г'
+        )
+        cls.pancakes, cls.pie = (
+            Recipe.objects.create(
+                author=cls.user,
+                name=name,
+                image='recipes/recipe.png',
+                text='Смешать и испечь.',
+                cooking_time=30,
+            )
+            for name in ('Блины', 'Пирог')
+        )
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                recipe=recipe, ingredient=cls.flour, amount=amount
+            )
+            for recipe, amount in ((cls.pancakes, 200), (cls.pie, 300))
+        )
+        cls.missing_id = cls.pie.pk + 100
+
+    def setUp(self):
+        patcher = mock.patch('recipes.popularity.run_in_background')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client.force_authenticate(self.user)
+
+    def send(self, method, url, recipe_ids):
+        response = getattr(self.client, method)(
+            url, {'recipes': recipe_ids}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [
+            (outcome['id'], outcome['status'])
+            for outcome in response.data['recipes']
+        ]
+
+    def get_counts(self, field):
+        return list(
+            Recipe.objects.order_by('name').values_list(field, flat=True)
+        )
+
+    def test_favorites(self):
+        """Recipes are favorited and unfavorited in bulk."""
+        url = '/api/recipes/favorite/'
+        Favorite.objects.add_recipes(self.user, [self.pancakes.pk])
+        self.assertEqual(
+            self.send(
+                'post', url, [self.pie.pk, self.pancakes.pk, self.missing_id]
+            ),
+            [
+                (self.pie.pk, 'added'),
+                (self.pancakes.pk, 'exists'),
+                (self.missing_id, 'not_found'),
+            ],
+        )
+        self.assertEqual(self.get_counts('favorites_count'), [1, 1])
+        self.assertEqual(
+            self.send('delete', url, [self.pie.pk, self.missing_id]),
+            [(self.pie.pk, 'removed'), (self.missing_id, 'not_found')],
+        )
+        self.assertEqual(self.get_counts('favorites_count'), [1, 0])
+        self.assertEqual(
+            list(Favorite.objects.values_list('recipe', flat=True)),
+            [self.pancakes.pk],
+        )
+
+    def test_shopping_cart(self):
+        """Recipes and their ingredients are added to the cart in bulk."""
+        url = '/api/recipes/shopping_cart/'
+        self.assertEqual(
+            self.send('post', url, [self.pancakes.pk, self.pie.pk]),
+            [(self.pancakes.pk, 'added'), (self.pie.pk, 'added')],
+        )
+        self.assertEqual(self.get_counts('in_carts_count'), [1, 1])
+        cart = ShoppingCartIngredient.objects.get(user=self.user)
+        self.assertEqual(
+            (cart.ingredient_id, cart.total_amount), (self.flour.pk, 500)
+        )
+        self.assertEqual(
+            self.send('delete', url, [self.pancakes.pk]),
+            [(self.pancakes.pk, 'removed')],
+        )
+        self.assertEqual(self.get_counts('in_carts_count'), [0, 1])
+        cart.refresh_from_db()
+        self.assertEqual(cart.total_amount, 300)
+
+    def test_invalid(self):
+        """Empty and oversized lists are rejected."""
+        for recipe_ids in (
+            [],
+            list(range(1, settings.BULK_RECIPES_MAX_SIZE + 2)),
+        ):
+            with self.subTest(size=len(recipe_ids)):
+                response = self.client.post(
+                    '/api/recipes/favorite/',
+                    {'recipes': recipe_ids},
+                    format='json',
+                )
+                self.assertEqual(
+                    response.status_code, status.HTTP_400_BAD_REQUEST
+                )
+                self.assertIn('recipes', response.data)
+
+
+class SimilarRecipeTests(APITestCase):
+    """Tests of the precomputed similar recipes."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='author',
+            email='author@example.com',
+            password='password',
+            first_name='Имя',
+            last_name='Фамилия',
+        )
+        cls.ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=name, measurement_unit='г')
+            for name in ('мука', 'молоко', 'яйца', 'сахар', 'соль', 'рис')
+        )
+        cls.recipes = {}
+        for name, ingredients in (
+            ('Блины', (0, 1, 2)),
+            ('Пирог', (0, 1, 2, 3)),
+            ('Хлеб', (0, 4)),
+            ('Плов', (5,)),
+        ):
+            cls.recipes[name] = Recipe.objects.create(
+                author=cls.user,
+                name=name,
+                image='recipes/recipe.png',
+                text='Приготовить.',
+                cooking_time=30,
+            )
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(
+                    recipe=cls.recipes[name],
+                    ingredient=cls.ingredients[index],
+                    amount=100,
+                )
+                for index in ingredients
+            )
+
+    def get_similar(self, name):
+        response = self.client.get(
+            f'/api/recipes/{self.recipes[name].pk}/similar/'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [recipe['name'] for recipe in response.data]
+
+    def test_similar(self):
+        """Recipes sharing ingredients are listed, most similar first."""
+        self.assertEqual(self.get_similar('Блины'), [])
+        call_command('update_similar_recipes', stdout=io.StringIO())
+        self.assertEqual(self.get_similar('Блины'), ['Пирог', 'Хлеб'])
+        self.assertEqual(self.get_similar('Хлеб'), ['Блины', 'Пирог'])
+        self.assertEqual(self.get_similar('Плов'), [])
+        self.assertFalse(
+            Recipe.objects.filter(similar_recipes_stale=True).exists()
+        )
+
+    def test_updated_ingredients(self):
+        """Changed ingredients update the neighbours of every recipe."""
+        call_command('update_similar_recipes', stdout=io.StringIO())
+        self.client.force_authenticate(self.user)
+        response = self.client.patch(
+            f'/api/recipes/{self.recipes["Плов"].pk}/',
+            {
+                'ingredients': [
+                    {'id': self.ingredients[index].pk, 'amount': 100}
+                    for index in (0, 1, 2)
+                ],
+            },
+            format='json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        stdout = io.StringIO()
+        call_command('update_similar_recipes', stdout=stdout)
+        self.assertIn('for 1 recipes', stdout.getvalue())
+        self.assertEqual(
+            self.get_similar('Плов'), ['Блины', 'Пирог', 'Хлеб']
+        )
+        self.assertEqual(
+            self.get_similar('Блины'), ['Плов', 'Пирог', 'Хлеб']
+        )
+
+    def test_unknown_recipe(self):
+        """The similar recipes of an unknown recipe are not found."""
+        response = self.client.get(
+            f'/api/recipes/{self.recipes["Плов"].pk + 100}/similar/'
+        )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
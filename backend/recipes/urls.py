@@ -1,11 +1,13 @@
 from django.urls import include, path
 from rest_framework import routers
 
-from recipes.views import IngredientViewSet, RecipeViewSet, TagViewSet
+from recipes.views import (ExportJobViewSet, IngredientViewSet, RecipeViewSet,
+                           TagViewSet)
 
 router = routers.DefaultRouter()
 router.register('recipes', RecipeViewSet, basename='recipes')
 router.register('ingredients', IngredientViewSet, basename='ingredients')
 router.register('tags', TagViewSet, basename='tags')
+router.register('exports', ExportJobViewSet, basename='exports')
 
 urlpatterns = [path('', include(router.urls))]
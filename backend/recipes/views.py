@@ -1,30 +1,54 @@
 import datetime
-import os
-from io import BytesIO
 
 from django.conf import settings
-from django.db.models import Sum
-from django.http import FileResponse
+from django.db import transaction
+from django.http import (FileResponse, HttpResponseRedirect,
+                         StreamingHttpResponse)
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.http import content_disposition_header
 from django_filters.rest_framework import DjangoFilterBackend
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.pdfgen import canvas
+from rest_framework import mixins, status
 from rest_framework.decorators import action
-from rest_framework.permissions import IsAuthenticatedOrReadOnly
-from rest_framework.viewsets import ModelViewSet
-
-from backend.mixins import CreateDeleteMixin
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import JSONParser
+from rest_framework.permissions import (IsAuthenticated,
+                                        IsAuthenticatedOrReadOnly)
+from rest_framework.response import Response
+from rest_framework.reverse import reverse
+from rest_framework.viewsets import GenericViewSet, ModelViewSet
+
+from backend.cache import bump_version, get_user_namespace
+from backend.mixins import (AnonymousCacheMixin, ConditionalGetMixin,
+                            CreateDeleteMixin, CursorPaginationMixin,
+                            SnapshotListMixin)
+from backend.pagination import (FeedCursorPagination,
+                                PopularRecipeCursorPagination,
+                                RecipeCursorPagination,
+                                SearchRecipeCursorPagination)
+from backend.parsers import MultiPartJSONParser
+from recipes.exports import EXPORT_FORMATS, start_export_job
 from recipes.filters import IngredientFilter, RecipeFilter
-from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
-                            ShoppingList, Tag)
+from recipes.ingredient_index import get_ingredient_index
+from recipes.models import (ExportJob, Favorite, FeedEntry, Ingredient, Recipe,
+                            ShoppingCartIngredient, ShoppingList,
+                            SimilarRecipe, Tag)
+from recipes.pdf import ShoppingListPDF
 from recipes.permissions import IsAuthorOrStaffOrReadOnly
-from recipes.serializers import (FavoriteSerializer, IngredientSerializer,
+from recipes.popularity import schedule_popularity_update
+from recipes.serializers import (ExportJobSerializer, FavoriteSerializer,
+                                 IngredientSerializer, RecipeIdsSerializer,
                                  RecipeSerializer, ShoppingListSerializer,
-                                 TagSerializer)
+                                 ShortRecipeSerializer, TagSerializer)
 
 
-class RecipeViewSet(CreateDeleteMixin, ModelViewSet):
+class RecipeViewSet(
+    ConditionalGetMixin,
+    AnonymousCacheMixin,
+    CreateDeleteMixin,
+    CursorPaginationMixin,
+    ModelViewSet,
+):
     """
     API endpoint that allows recipes to be viewed, created,
     updated, and deleted.
@@ -34,9 +58,15 @@ class RecipeViewSet(CreateDeleteMixin, ModelViewSet):
     shopping cart.
 
     Inherits:
+        ConditionalGetMixin: adds ETag/Last-Modified validators and
+        answers conditional requests with 304.
+        AnonymousCacheMixin: caches the list and detail responses served
+        to anonymous users.
         CreateDeleteMixin: provides "create_item" and "delete_item" methods
         for
         handling 'favorite' and 'add_to_cart' actions.
+        CursorPaginationMixin: lets clients opt in to cursor pagination
+        with `?pagination=cursor`.
         ModelViewSet: Django Rest Framework's ModelViewSet for basic CRUD
         operations.
 
@@ -49,55 +79,161 @@ class RecipeViewSet(CreateDeleteMixin, ModelViewSet):
         filterset_class (FilterSet): The filterset class for Recipe
         filtering.
         filter_backends (tuple): The filter backends applied to the view.
+        cursor_pagination_class (Pagination): The pagination class used
+        when cursor pagination is requested.
+        cache_namespaces (tuple): The cache namespaces the responses
+        depend on.
+        parser_classes (tuple): The parsers of the request bodies: JSON
+        with a base64 image, or multipart with a binary image.
+        multipart_list_fields (tuple): The fields kept as lists when sent
+        as a single multipart part.
     """
 
-    queryset = Recipe.objects.all()
     serializer_class = RecipeSerializer
     permission_classes = (IsAuthorOrStaffOrReadOnly, IsAuthenticatedOrReadOnly)
     filterset_class = RecipeFilter
     filter_backends = (DjangoFilterBackend,)
+    cursor_pagination_class = RecipeCursorPagination
+    cache_namespaces = ('recipes', 'tags', 'ingredients', 'users')
+    parser_classes = (JSONParser, MultiPartJSONParser)
+    multipart_list_fields = ('tags', 'ingredients')
 
-    @staticmethod
-    def generate_pdf(user):
+    def get_queryset(self):
         """
-        Generate a PDF file for the user's shopping cart.
+        Get the queryset of recipes prepared for serialization.
 
-        Args:
-            user (User): The user object.
+        The per-user flags are annotated and the related objects are
+        prefetched, so the number of queries does not depend on the
+        page size.
 
         Returns:
-            BytesIO: The generated PDF file.
+            QuerySet: The queryset of Recipe objects.
+        """
+        return Recipe.objects.for_user(self.request.user)
+
+    def get_pagination_class(self):
+        """
+        Get the pagination class requested by the client, keying the
+        cursors on the popularity when the recipes are ordered by it, or
+        on the search rank when they are searched.
+
+        Returns:
+            type: The pagination class, or None if pagination is disabled.
+        """
+        pagination_class = super().get_pagination_class()
+        if pagination_class is not self.cursor_pagination_class:
+            return pagination_class
+        query_params = self.request.query_params
+        if query_params.get('ordering') == 'popular':
+            return PopularRecipeCursorPagination
+        if query_params.get('search', '').strip():
+            return SearchRecipeCursorPagination
+        return pagination_class
+
+    def reload_instance(self, serializer):
         """
-        font_path = os.path.join(
-            settings.BASE_DIR, 'resources', 'fonts', 'Roboto-Medium.ttf'
+        Replace the saved instance of a serializer with one loaded through
+        `get_queryset`, so the response is rendered in a fixed number of
+        queries however many ingredients the recipe has.
+
+        Args:
+            serializer (Serializer): The serializer that saved the recipe.
+        """
+        serializer.instance = self.get_queryset().get(
+            pk=serializer.instance.pk
         )
 
-        pdfmetrics.registerFont(TTFont('Roboto-Medium', font_path))
+    def perform_create(self, serializer):
+        serializer.save()
+        self.reload_instance(serializer)
+
+    def perform_update(self, serializer):
+        serializer.save()
+        self.reload_instance(serializer)
+
+    def get_validator_namespaces(self, request):
+        """
+        Get the namespaces the validators of the response depend on.
+
+        A single recipe is tracked by its `updated_at` instead of the
+        version of the whole `recipes` namespace, so edits of other
+        recipes don't invalidate it.
+
+        Args:
+            request (Request): The HTTP request object.
+
+        Returns:
+            list: The namespace names.
+        """
+        namespaces = super().get_validator_namespaces(request)
+        if self.action == 'retrieve':
+            namespaces.remove('recipes')
+        return namespaces
+
+    def get_validator_state(self, request, *args, **kwargs):
+        """
+        Get the state the validators are computed from, adding the
+        `updated_at` of the requested recipe for the detail view.
+
+        Args:
+            request (Request): The HTTP request object.
 
-        ingredients = (
-            RecipeIngredient.objects.filter(recipe__shoppinglist__user=user)
-            .values('ingredient__name', 'ingredient__measurement_unit')
-            .annotate(total_amount=Sum('amount'))
+        Returns:
+            tuple: The list of versions and the last modification time,
+            or None if the recipe doesn't exist.
+        """
+        state = super().get_validator_state(request, *args, **kwargs)
+        if self.action != 'retrieve':
+            return state
+        try:
+            updated_at = (
+                Recipe.objects.filter(pk=kwargs[self.lookup_field])
+                .values_list('updated_at', flat=True)
+                .first()
+            )
+        except (TypeError, ValueError):
+            return None
+        if updated_at is None:
+            return None
+        versions, last_modified = state
+        return (
+            versions + [updated_at.isoformat()],
+            max(last_modified, updated_at.timestamp()),
         )
 
-        buffer = BytesIO()
-        page = canvas.Canvas(buffer, pagesize=letter)
+    def perform_content_negotiation(self, request, force=False):
+        """
+        Select the renderer for the response.
 
-        text = page.beginText(70, 700)
-        text.setFont('Roboto-Medium', 24)
+        The shopping cart download uses the `format` query parameter to
+        pick the export format and builds its response itself, so the
+        negotiation must not fail for the formats no renderer handles.
 
-        for ingredient in ingredients:
-            name = ingredient['ingredient__name']
-            unit = ingredient['ingredient__measurement_unit']
-            total = ingredient['total_amount']
-            text.textLine(f'{name} ({unit}) — {total}')
+        Args:
+            request (Request): The HTTP request object.
+            force (bool): Fall back to the first renderer on failure.
 
-        page.drawText(text)
-        page.showPage()
-        page.save()
+        Returns:
+            tuple: The renderer and the accepted media type.
+        """
+        return super().perform_content_negotiation(
+            request, force or self.action == 'download_shopping_cart'
+        )
 
-        buffer.seek(0)
-        return buffer
+    @staticmethod
+    def generate_pdf(user):
+        """
+        Generate a PDF file for the user's shopping cart.
+
+        Args:
+            user (User): The user object.
+
+        Returns:
+            SpooledTemporaryFile: The generated PDF file.
+        """
+        return ShoppingListPDF('Список покупок').render_to_file(
+            ShoppingCartIngredient.objects.shopping_list(user)
+        )
 
     @action(detail=True, methods=['post'])
     def favorite(self, request, pk):
@@ -135,25 +271,127 @@ class RecipeViewSet(CreateDeleteMixin, ModelViewSet):
         """
         return self.delete_item(Favorite, user=request.user, recipe=pk)
 
-    @action(detail=False, methods=['get'], url_path='download_shopping_cart')
+    @action(
+        detail=False,
+        methods=['get'],
+        url_path='download_shopping_cart',
+        permission_classes=(IsAuthenticated,),
+    )
     def download_shopping_cart(self, request):
         """
-        Download the user's shopping cart as a PDF file.
+        Download the user's shopping cart.
+
+        The `format` query parameter selects the format: `pdf` (the
+        default), `csv`, `txt` or `json`. The text formats are streamed
+        from a server-side cursor as they are generated.
 
         Args:
             request (HttpRequest): The HTTP request.
 
         Returns:
-            FileResponse: The HTTP response containing the PDF file.
+            FileResponse: The HTTP response containing the PDF file, or
+            StreamingHttpResponse: the response streaming a text format.
         """
         time_format = '%d/%m - %H:%M'
         date = datetime.datetime.now().strftime(time_format)
+        export_format = request.query_params.get('format', 'pdf')
+
+        if export_format == 'pdf':
+            pdf = self.generate_pdf(request.user)
+            return FileResponse(
+                pdf,
+                as_attachment=True,
+                filename=f'Список покупок от {date}.pdf',
+                content_type='application/pdf',
+            )
+
+        if export_format not in EXPORT_FORMATS:
+            raise ValidationError(
+                {
+                    'format': 'Доступные форматы: pdf, '
+                    + ', '.join(EXPORT_FORMATS)
+                    + '.'
+                }
+            )
+        export = EXPORT_FORMATS[export_format]
+        rows = ShoppingCartIngredient.objects.shopping_list(
+            request.user
+        ).iterator(chunk_size=settings.EXPORT_CHUNK_SIZE)
+        response = StreamingHttpResponse(
+            export.export(rows),
+            content_type=export.content_type,
+        )
+        response['Content-Disposition'] = content_disposition_header(
+            True, f'Список покупок от {date}.{export.extension}'
+        )
+        return response
+
+    @action(
+        detail=False,
+        methods=['get'],
+        permission_classes=(IsAuthenticated,),
+    )
+    def timeline(self, request):
+        """
+        Get the recipes of the authors the user follows, newest first.
+
+        The page is read from the user's timeline with a single range
+        scan and always paginated with cursors.
 
-        pdf = self.generate_pdf(request.user)
+        Args:
+            request (HttpRequest): The HTTP request.
 
-        return FileResponse(
-            pdf, as_attachment=True, filename=f'Список покупок от {date}.pdf'
+        Returns:
+            Response: The paginated recipes.
+        """
+        paginator = FeedCursorPagination()
+        entries = paginator.paginate_queryset(
+            FeedEntry.objects.filter(user=request.user).only(
+                'recipe_id', 'created_at'
+            ),
+            request,
+            view=self,
+        )
+        recipes = self.get_queryset().in_bulk(
+            [entry.recipe_id for entry in entries]
+        )
+        serializer = self.get_serializer(
+            [
+                recipes[entry.recipe_id]
+                for entry in entries
+                if entry.recipe_id in recipes
+            ],
+            many=True,
+        )
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(detail=True, methods=['get'])
+    def similar(self, request, pk):
+        """
+        Get the recipes with the most similar ingredients, best first.
+
+        The neighbours are precomputed by the `update_similar_recipes`
+        command and read with a single indexed query.
+
+        Args:
+            request (HttpRequest): The HTTP request.
+            pk (int): The primary key of the recipe.
+
+        Returns:
+            Response: The similar recipes.
+        """
+        get_object_or_404(Recipe.objects.only('pk'), pk=pk)
+        neighbours = (
+            SimilarRecipe.objects.filter(recipe_id=pk)
+            .select_related('similar')
+            .order_by('-score', 'similar_id')
+        )
+        serializer = ShortRecipeSerializer(
+            [neighbour.similar for neighbour in neighbours],
+            many=True,
+            context=self.get_serializer_context(),
         )
+        return Response(serializer.data)
 
     @action(detail=True, methods=['post'], url_path='shopping_cart')
     def add_to_cart(self, request, pk):
@@ -179,7 +417,9 @@ class RecipeViewSet(CreateDeleteMixin, ModelViewSet):
         Remove a recipe from the user's shopping cart.
 
         This action uses "delete_item" method from CreateDeleteMixin to delete
-        the ShoppingList instance.
+        the ShoppingList instance, and subtracts the recipe's ingredients
+        from the aggregated shopping cart ingredients in the same
+        transaction.
 
         Args:
             request (HttpRequest): The HTTP request.
@@ -188,10 +428,197 @@ class RecipeViewSet(CreateDeleteMixin, ModelViewSet):
         Returns:
             Response: The HTTP response.
         """
-        return self.delete_item(ShoppingList, user=request.user, recipe=pk)
+        with transaction.atomic():
+            response = self.delete_item(
+                ShoppingList, user=request.user, recipe=pk
+            )
+            ShoppingCartIngredient.objects.remove_recipes(request.user, [pk])
+        return response
+
+    def get_bulk_recipe_ids(self, request):
+        """
+        Get the recipe IDs of a bulk request.
+
+        Args:
+            request (HttpRequest): The HTTP request.
+
+        Returns:
+            list: The unique IDs of the recipes.
+        """
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data['recipes']
+
+    def bulk_response(self, request, outcomes, changed):
+        """
+        Build the response of a bulk request, invalidating the user's
+        cached state if anything changed.
 
+        Args:
+            request (HttpRequest): The HTTP request.
+            outcomes (dict): The outcomes by recipe ID.
+            changed (set): The IDs of the changed recipes.
 
-class IngredientViewSet(ModelViewSet):
+        Returns:
+            Response: The outcomes in the order of the request.
+        """
+        if changed:
+            bump_version(get_user_namespace(request.user))
+        return Response(
+            {
+                'recipes': [
+                    {'id': recipe_id, 'status': outcome}
+                    for recipe_id, outcome in outcomes.items()
+                ]
+            }
+        )
+
+    def bulk_add(self, request, model, on_added=None):
+        """
+        Add many recipes to the user's favorites or shopping cart with
+        a single statement.
+
+        Every recipe gets the `added`, `exists` or `not_found` status.
+
+        Args:
+            request (HttpRequest): The HTTP request.
+            model (Model): Favorite or ShoppingList.
+            on_added (callable): Called with the user and the IDs of
+            the added recipes in the same transaction (optional).
+
+        Returns:
+            Response: The HTTP response.
+        """
+        recipe_ids = self.get_bulk_recipe_ids(request)
+        existing = set(
+            Recipe.objects.filter(pk__in=recipe_ids).values_list(
+                'pk', flat=True
+            )
+        )
+        with transaction.atomic():
+            added = model.objects.add_recipes(
+                request.user,
+                [pk for pk in recipe_ids if pk in existing],
+            )
+            if added and on_added is not None:
+                on_added(request.user, added)
+        if added:
+            schedule_popularity_update()
+        outcomes = {
+            recipe_id: 'added'
+            if recipe_id in added
+            else 'exists'
+            if recipe_id in existing
+            else 'not_found'
+            for recipe_id in recipe_ids
+        }
+        return self.bulk_response(request, outcomes, added)
+
+    def bulk_remove(self, request, model, on_removed=None):
+        """
+        Remove many recipes from the user's favorites or shopping cart
+        with a single statement.
+
+        Every recipe gets the `removed` or `not_found` status.
+
+        Args:
+            request (HttpRequest): The HTTP request.
+            model (Model): Favorite or ShoppingList.
+            on_removed (callable): Called with the user and the IDs of
+            the removed recipes in the same transaction (optional).
+
+        Returns:
+            Response: The HTTP response.
+        """
+        recipe_ids = self.get_bulk_recipe_ids(request)
+        with transaction.atomic():
+            removed = model.objects.remove_recipes(request.user, recipe_ids)
+            if removed and on_removed is not None:
+                on_removed(request.user, removed)
+        outcomes = {
+            recipe_id: 'removed' if recipe_id in removed else 'not_found'
+            for recipe_id in recipe_ids
+        }
+        return self.bulk_response(request, outcomes, removed)
+
+    @action(
+        detail=False,
+        methods=['post'],
+        url_path='favorite',
+        permission_classes=(IsAuthenticated,),
+    )
+    def favorite_many(self, request):
+        """
+        Add the recipes listed in the `recipes` field to the user's
+        favorites.
+
+        Args:
+            request (HttpRequest): The HTTP request.
+
+        Returns:
+            Response: The outcome for every recipe.
+        """
+        return self.bulk_add(request, Favorite)
+
+    @favorite_many.mapping.delete
+    def unfavorite_many(self, request):
+        """
+        Remove the recipes listed in the `recipes` field from the user's
+        favorites.
+
+        Args:
+            request (HttpRequest): The HTTP request.
+
+        Returns:
+            Response: The outcome for every recipe.
+        """
+        return self.bulk_remove(request, Favorite)
+
+    @action(
+        detail=False,
+        methods=['post'],
+        url_path='shopping_cart',
+        permission_classes=(IsAuthenticated,),
+    )
+    def add_many_to_cart(self, request):
+        """
+        Add the recipes listed in the `recipes` field to the user's
+        shopping cart, together with their ingredients.
+
+        Args:
+            request (HttpRequest): The HTTP request.
+
+        Returns:
+            Response: The outcome for every recipe.
+        """
+        return self.bulk_add(
+            request,
+            ShoppingList,
+            ShoppingCartIngredient.objects.add_recipes,
+        )
+
+    @add_many_to_cart.mapping.delete
+    def remove_many_from_cart(self, request):
+        """
+        Remove the recipes listed in the `recipes` field from the user's
+        shopping cart, together with their ingredients.
+
+        Args:
+            request (HttpRequest): The HTTP request.
+
+        Returns:
+            Response: The outcome for every recipe.
+        """
+        return self.bulk_remove(
+            request,
+            ShoppingList,
+            ShoppingCartIngredient.objects.remove_recipes,
+        )
+
+
+class IngredientViewSet(
+    ConditionalGetMixin, SnapshotListMixin, ModelViewSet
+):
     """
     API endpoint that allows ingredients to be viewed, created,
     updated, and deleted.
@@ -203,15 +630,47 @@ class IngredientViewSet(ModelViewSet):
         filterset_class (FilterSet): The filterset class
         for Ingredient filtering.
         pagination_class (None): The pagination class for the view.
+        cache_namespaces (tuple): The cache namespaces the responses
+        depend on.
+        snapshot_namespace (str): The cache namespace of the pre-rendered
+        ingredient list.
     """
 
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     filterset_class = IngredientFilter
     pagination_class = None
+    cache_namespaces = ('ingredients',)
+    snapshot_namespace = 'ingredients'
 
+    def list(self, request, *args, **kwargs):
+        """
+        List the ingredients.
 
-class TagViewSet(ModelViewSet):
+        Searches by `name` (the recipe form autocomplete) are answered
+        from the in-memory ingredient index and return at most
+        `settings.INGREDIENT_SEARCH_LIMIT` results, names starting with
+        the query first.
+
+        Args:
+            request (HttpRequest): The HTTP request.
+
+        Returns:
+            Response: The HTTP response.
+        """
+        name = request.query_params.get('name')
+        if name is None:
+            return super().list(request, *args, **kwargs)
+        return Response(
+            get_ingredient_index().search(
+                name, settings.INGREDIENT_SEARCH_LIMIT
+            )
+        )
+
+
+class TagViewSet(
+    ConditionalGetMixin, SnapshotListMixin, ModelViewSet
+):
     """
     API endpoint that allows tags to be viewed, created, updated, and deleted.
 
@@ -219,8 +678,92 @@ class TagViewSet(ModelViewSet):
         queryset (QuerySet): The queryset of Tag objects.
         serializer_class (Serializer): The serializer class for Tag objects.
         pagination_class (None): The pagination class for the view.
+        cache_namespaces (tuple): The cache namespaces the responses
+        depend on.
+        snapshot_namespace (str): The cache namespace of the pre-rendered
+        tag list.
     """
 
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     pagination_class = None
+    cache_namespaces = ('tags',)
+    snapshot_namespace = 'tags'
+
+
+class ExportJobViewSet(mixins.RetrieveModelMixin, GenericViewSet):
+    """
+    API endpoint for rendering the user's shopping cart in the background.
+
+    POST creates an export job, or returns the job already rendering the
+    same cart contents in the same format. GET answers with the status of
+    the job while it runs and redirects to the rendered file once it is
+    ready.
+
+    Attributes:
+        serializer_class (Serializer): The serializer class for ExportJob
+        objects.
+        permission_classes (tuple): The permission classes applied to the
+        view.
+    """
+
+    serializer_class = ExportJobSerializer
+    permission_classes = (IsAuthenticated,)
+
+    def get_queryset(self):
+        """
+        Get the unexpired export jobs of the user.
+
+        Returns:
+            QuerySet: The queryset of ExportJob objects.
+        """
+        return ExportJob.objects.filter(
+            user=self.request.user, expires_at__gt=timezone.now()
+        )
+
+    def create(self, request):
+        """
+        Start rendering the user's shopping cart.
+
+        Args:
+            request (HttpRequest): The HTTP request.
+
+        Returns:
+            Response: The HTTP response with the job, 202 if it has been
+            created and 200 if an identical job is shared.
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        job, created = start_export_job(
+            request.user,
+            serializer.validated_data.get('format', ExportJob.Format.PDF),
+        )
+        return Response(
+            self.get_serializer(job).data,
+            status=status.HTTP_202_ACCEPTED if created else status.HTTP_200_OK,
+            headers={
+                'Location': reverse(
+                    'exports-detail', args=(job.pk,), request=request
+                )
+            },
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Get the status of an export job.
+
+        Args:
+            request (HttpRequest): The HTTP request.
+
+        Returns:
+            Response: The HTTP response with the job while it isn't ready,
+            or HttpResponseRedirect: the redirect to the rendered file.
+        """
+        job = self.get_object()
+        if job.status == ExportJob.Status.DONE and job.file:
+            response = HttpResponseRedirect(
+                request.build_absolute_uri(job.file.url)
+            )
+            response.status_code = status.HTTP_303_SEE_OTHER
+            return response
+        return Response(self.get_serializer(job).data)
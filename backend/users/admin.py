@@ -1,6 +1,7 @@
 from django.contrib import admin
 from django.contrib.admin import register
 
+from backend.mixins import CounterAdminMixin
 from users.models import Subscription, User
 
 
@@ -31,6 +32,8 @@ class UserAdmin(admin.ModelAdmin):
         'is_active',
         'username',
         'email',
+        'recipes_count',
+        'followers_count',
     )
     search_fields = ('username', 'email')
     list_filter = (
@@ -41,10 +44,13 @@ class UserAdmin(admin.ModelAdmin):
 
 
 @register(Subscription)
-class SubscriptionAdmin(admin.ModelAdmin):
+class SubscriptionAdmin(CounterAdminMixin, admin.ModelAdmin):
     """
     Admin model for Subscription.
 
+    The follower counters of the users are updated with the added,
+    changed and deleted subscriptions.
+
     Attributes:
         list_display (tuple): The fields to display in the list view.
         search_fields (tuple): The fields to search in the admin interface.
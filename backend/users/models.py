@@ -1,10 +1,90 @@
 from django.conf import settings
-from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import AbstractUser, UserManager
 from django.db import models
+from django.db.models import Exists, F, OuterRef, Prefetch, Value, Window
+from django.db.models.functions import RowNumber
 
 from users.validators import validate_username
 
 
+class UserQuerySet(models.QuerySet):
+    """
+    QuerySet for the User model.
+    """
+
+    def with_is_subscribed(self, user):
+        """
+        Annotate the queryset with the ``is_subscribed`` flag, telling
+        whether the given user follows each of the users.
+
+        Args:
+            user (User): The user making the request.
+
+        Returns:
+            QuerySet: The annotated queryset.
+        """
+        if user.is_anonymous:
+            return self.annotate(is_subscribed=Value(False))
+        return self.annotate(
+            is_subscribed=Exists(
+                Subscription.objects.filter(
+                    follower=user, following=OuterRef('pk')
+                )
+            )
+        )
+
+    def subscriptions_of(self, user, recipes_limit=None):
+        """
+        Get the users followed by a user, prepared for
+        `UserSubscriptionSerializer`.
+
+        The users are annotated with ``is_subscribed``, and their
+        recipes are prefetched into
+        ``subscription_recipes`` with a single query. With a limit, only
+        the first recipes of every author are fetched, numbered with
+        ``ROW_NUMBER() OVER (PARTITION BY author_id)``.
+
+        Args:
+            user (User): The follower.
+            recipes_limit (int): The number of recipes fetched per author
+            (optional).
+
+        Returns:
+            QuerySet: The prepared queryset.
+        """
+        from recipes.models import Recipe
+
+        recipes = Recipe.objects.only(
+            'author', 'name', 'image', 'image_renditions', 'cooking_time'
+        )
+        if recipes_limit is not None:
+            recipes = recipes.annotate(
+                row_number=Window(
+                    RowNumber(),
+                    partition_by=F('author'),
+                    order_by=(F('name').asc(), F('id').asc()),
+                )
+            ).filter(row_number__lte=recipes_limit)
+        return (
+            self.filter(following__follower=user)
+            .annotate(is_subscribed=Value(True))
+            .prefetch_related(
+                Prefetch(
+                    'recipes',
+                    queryset=recipes,
+                    to_attr='subscription_recipes',
+                )
+            )
+            .order_by(*self.model._meta.ordering)
+        )
+
+
+class CustomUserManager(UserManager.from_queryset(UserQuerySet)):
+    """
+    Manager for the User model exposing the UserQuerySet helpers.
+    """
+
+
 class User(AbstractUser):
     """
     Custom user model representing a user of the application.
@@ -17,6 +97,8 @@ class User(AbstractUser):
         first_name (CharField): The first name of the user.
         last_name (CharField): The last name of the user.
         password (CharField): The password of the user.
+        recipes_count (int): The number of recipes of the user.
+        followers_count (int): The number of followers of the user.
 
     Meta:
         verbose_name (str): The human-readable name for the model.
@@ -46,6 +128,18 @@ class User(AbstractUser):
         verbose_name='Пароль',
         max_length=settings.MAX_PASSWORD_NAME_LENGTH,
     )
+    recipes_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Число рецептов',
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Число подписчиков',
+    )
+
+    objects = CustomUserManager()
 
     class Meta:
         verbose_name = 'Пользователь'
@@ -63,6 +157,9 @@ class Subscription(models.Model):
     Attributes:
         follower (ForeignKey): The user who is following another user.
         following (ForeignKey): The user being followed by another user.
+        counter_target (str): The foreign key to the user whose counter
+        the subscriptions are counted in.
+        counter_field (str): The counter field of that user.
 
     Meta:
         constraints (tuple): The model's constraints, including uniqueness
@@ -84,6 +181,9 @@ class Subscription(models.Model):
         verbose_name='Автор',
     )
 
+    counter_target = 'following'
+    counter_field = 'followers_count'
+
     class Meta:
         constraints = (
             models.UniqueConstraint(
@@ -1,7 +1,9 @@
 from django.contrib.auth import get_user_model
+from django.db import transaction
 from djoser.serializers import UserCreateSerializer, UserSerializer
 from rest_framework import serializers
 
+from recipes.feeds import backfill_feed
 from users.models import Subscription
 
 User = get_user_model()
@@ -35,15 +37,16 @@ class CustomUserSerializer(UserSerializer):
         )
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         user = self.context.get('request').user
-        if user.is_anonymous:
+        if user.is_anonymous or user == obj:
             return False
         return user.follower.filter(following=obj).exists()
 
 
 class UserSubscriptionSerializer(CustomUserSerializer):
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
 
     class Meta(CustomUserSerializer.Meta):
         fields = CustomUserSerializer.Meta.fields + (
@@ -54,18 +57,18 @@ class UserSubscriptionSerializer(CustomUserSerializer):
     def get_recipes(self, obj):
         from recipes.serializers import ShortRecipeSerializer
 
-        limit = self.context['request'].query_params.get('limit')
-        recipes = obj.recipes.all()
-        if limit:
-            recipes = recipes[: int(limit)]
+        if hasattr(obj, 'subscription_recipes'):
+            recipes = obj.subscription_recipes
+        else:
+            recipes = obj.recipes.all()
+            limit = self.context.get('recipes_limit')
+            if limit is not None:
+                recipes = recipes[:limit]
 
         return ShortRecipeSerializer(
             recipes, many=True, context=self.context
         ).data
 
-    def get_recipes_count(self, obj):
-        return obj.recipes.count()
-
 
 class SubscriptionSerializer(serializers.ModelSerializer):
     class Meta:
@@ -75,6 +78,24 @@ class SubscriptionSerializer(serializers.ModelSerializer):
             'following',
         )
 
+    unique_error_message = 'Вы уже подписаны на этого пользователя.'
+
+    @transaction.atomic
+    def create(self, validated_data):
+        """
+        Subscribe to a user and add the user's latest recipes to the
+        follower's timeline.
+
+        Args:
+            validated_data (dict): The validated data.
+
+        Returns:
+            Subscription: The created subscription.
+        """
+        subscription = super().create(validated_data)
+        backfill_feed(subscription.follower, subscription.following)
+        return subscription
+
     def validate(self, attrs):
         follower = attrs.get('follower')
         following = attrs.get('following')
@@ -82,10 +103,4 @@ class SubscriptionSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(
                 'Вы не можете подписаться на самого себя.'
             )
-        if Subscription.objects.filter(
-            follower=follower, following=following
-        ).exists():
-            raise serializers.ValidationError(
-                'Вы уже подписаны на этого пользователя.'
-            )
         return attrs
@@ -0,0 +1,33 @@
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from backend.cache import bump_version, get_user_namespace
+from users.models import User
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def bump_users_version(sender, instance, update_fields=None, **kwargs):
+    """
+    Invalidate the cached responses that embed user profiles, including
+    the user's own profile.
+
+    Saves that only touch `last_login` don't change any serialized field
+    and are ignored.
+    """
+    if update_fields is not None and set(update_fields) == {'last_login'}:
+        return
+    bump_version('users')
+    bump_version(get_user_namespace(instance))
+
+
+@receiver(pre_delete, sender=User)
+def decrement_followers_counts(sender, instance, **kwargs):
+    """
+    Decrement the follower counters of the users a deleted user follows,
+    before the subscriptions are deleted with the user.
+    """
+    User.objects.filter(
+        following__follower=instance, followers_count__gt=0
+    ).update(followers_count=F('followers_count') - 1)
@@ -0,0 +1,67 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from recipes.models import Recipe
+from users.models import Subscription, User
+
+
+class SubscriptionListTests(APITestCase):
+    """Tests of the subscriptions page."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = cls.create_user('follower')
+
+    @staticmethod
+    def create_user(username):
+        return User.objects.create_user(
+            username=username,
+            email=f'{username}@example.com',
+            password='password',
+            first_name='Имя',
+            last_name='Фамилия',
+        )
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def follow_authors(self, count, recipes_per_author=4):
+        for _ in range(count):
+            author = self.create_user(f'author{User.objects.count()}')
+            for number in range(recipes_per_author):
+                Recipe.objects.create(
+                    author=author,
+                    name=f'{author.username} {number}',
+                    image='recipes/recipe.png',
+                    text='Смешать и пожарить.',
+                    cooking_time=30,
+                )
+            Subscription.objects.create(follower=self.user, following=author)
+
+    def get_subscriptions(self):
+        response = self.client.get(
+            '/api/users/subscriptions/?recipes_limit=2&limit=10'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data['results']
+
+    def test_query_count(self):
+        """The queries don't depend on the number of authors."""
+        self.follow_authors(2)
+        # The first request seeds the cache versions.
+        self.get_subscriptions()
+        with CaptureQueriesContext(connection) as context:
+            self.get_subscriptions()
+        self.follow_authors(3, recipes_per_author=5)
+        with self.assertNumQueries(len(context)):
+            subscriptions = self.get_subscriptions()
+        self.assertEqual(len(subscriptions), 5)
+        for author in subscriptions:
+            with self.subTest(author=author['username']):
+                self.assertEqual(len(author['recipes']), 2)
+                self.assertEqual(
+                    author['recipes_count'],
+                    Recipe.objects.filter(author=author['id']).count(),
+                )
@@ -1,38 +1,109 @@
 
+from django.db import transaction
 from djoser.views import UserViewSet
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 
-from backend.mixins import CreateDeleteMixin
+from backend.cache import get_user_namespace
+from backend.mixins import (ConditionalGetMixin, CreateDeleteMixin,
+                            CursorPaginationMixin)
+from recipes.feeds import prune_feed
 
-from .models import Subscription
+from .models import Subscription, User
 from .serializers import SubscriptionSerializer, UserSubscriptionSerializer
 
 
-class UserSubscribeView(CreateDeleteMixin, UserViewSet):
+class UserSubscribeView(
+    ConditionalGetMixin, CreateDeleteMixin, CursorPaginationMixin, UserViewSet
+):
     """
     Custom view for user subscriptions.
 
     Extends the UserViewSet from djoser to provide additional
-    subscription-related actions.
+    subscription-related actions. Lists can be paginated with cursors
+    by passing `?pagination=cursor`. The user list, profiles and
+    `users/me` answer conditional requests.
     """
 
+    cache_namespaces = ('users',)
+
+    def get_queryset(self):
+        """
+        Get the queryset of users annotated with the `is_subscribed` flag.
+
+        Returns:
+            QuerySet: The queryset of User objects.
+        """
+        return super().get_queryset().with_is_subscribed(self.request.user)
+
+    def get_validator_namespaces(self, request):
+        """
+        Get the namespaces the validators of the response depend on.
+
+        The current user's profile (`users/me`) only depends on the
+        user's own namespace.
+
+        Args:
+            request (Request): The HTTP request object.
+
+        Returns:
+            list: The namespace names.
+        """
+        if self.action == 'me':
+            return [get_user_namespace(request.user)]
+        return super().get_validator_namespaces(request)
+
+    def get_recipes_limit(self, request):
+        """
+        Get the number of recipes shown per author in the subscriptions.
+
+        Args:
+            request (Request): The HTTP request object.
+
+        Raises:
+            ValidationError: If `recipes_limit` is not a non-negative
+            integer.
+
+        Returns:
+            int or None: The value of the `recipes_limit` query parameter,
+            or None if all the recipes are shown.
+        """
+        recipes_limit = request.query_params.get('recipes_limit')
+        if recipes_limit is None:
+            return None
+        try:
+            recipes_limit = int(recipes_limit)
+        except ValueError:
+            recipes_limit = -1
+        if recipes_limit < 0:
+            raise ValidationError(
+                {'recipes_limit': 'Укажите неотрицательное целое число.'}
+            )
+        return recipes_limit
+
     @action(detail=False)
     def subscriptions(self, request):
         """
         Get the subscriptions of the authenticated user.
 
-        Returns the list of users that the authenticated user is subscribed to.
+        Returns the list of users that the authenticated user is subscribed
+        to, each with the first `recipes_limit` of their recipes. The page
+        is loaded in a fixed number of queries, independent of its size
+        and of the number of recipes.
 
         Returns:
             Response: Paginated response containing the serialized
             user subscriptions.
         """
-        queryset = Subscription.objects.filter(follower=request.user)
+        recipes_limit = self.get_recipes_limit(request)
+        queryset = User.objects.subscriptions_of(
+            request.user, recipes_limit
+        )
         page = self.paginate_queryset(queryset)
         serializer = UserSubscriptionSerializer(
-            [subscription.following for subscription in page],
+            page,
             many=True,
-            context={'request': request},
+            context={'request': request, 'recipes_limit': recipes_limit},
         )
         return self.get_paginated_response(serializer.data)
 
@@ -60,7 +131,8 @@ class UserSubscribeView(CreateDeleteMixin, UserViewSet):
         Unsubscribe from a user.
 
         Deletes the subscription between the authenticated user
-        and the specified user.
+        and the specified user, and removes the user's recipes from the
+        timeline of the authenticated user.
 
         Args:
         request (Request): The HTTP request object.
@@ -70,6 +142,9 @@ class UserSubscribeView(CreateDeleteMixin, UserViewSet):
         Response: Success message indicating that the user has
         been unsubscribed.
         """
-        return self.delete_item(
-            Subscription, follower=request.user, following__id=id
-        )
+        with transaction.atomic():
+            response = self.delete_item(
+                Subscription, follower=request.user, following=id
+            )
+            prune_feed(request.user, id)
+        return response